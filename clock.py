@@ -0,0 +1,109 @@
+"""
+Fixed timestep loop of the GUI. The simulation always advances by whole ticks of 1 / smoothness simulated seconds,
+but the number of ticks per rendered frame follows the wall time and the chosen speed: at 10x ten times as many
+simulated seconds pass as wall seconds, at "max" the engine steps for the whole budget of a frame. If rendering
+falls behind, the next frame simply simulates more ticks (the frames in between are dropped), so slow frames do not
+slow down the simulated time. Only if the simulation itself can not keep up, the backlog is dropped.
+Author: Maximilian Janisch
+"""
+
+__all__ = ("SPEEDS", "Frame_Clock")
+
+import time
+from typing import *  # library for type hints
+
+# label of the speed: simulated seconds per wall second (None steps as fast as possible)
+SPEEDS: Dict[str, Optional[float]] = {"1x": 1, "10x": 10, "100x": 100, "max": None}
+
+
+class Frame_Clock:
+    def __init__(self, smoothness: int, frame_time: float, speed: Optional[float] = 1, budget: float = 0.75,
+                 clock: Callable[[], float] = time.perf_counter):
+        """
+        Initializes the Frame_Clock class
+        :param smoothness: ticks per simulated second
+        :param frame_time: wall time between two rendered frames in seconds
+        :param speed: simulated seconds per wall second, None for as fast as possible
+        :param budget: part of frame_time which may be spent on stepping (the rest is left for rendering)
+        :param clock: source of the wall time in seconds
+        """
+        self.tick = 1 / smoothness
+        self.frame_time = frame_time
+        self.speed = speed
+        self.budget = budget * frame_time
+        self.clock = clock
+        self.backlog = 0.  # simulated seconds which are due but were not simulated yet
+        self.last: Optional[float] = None  # wall time of the last frame
+        self.stepping = False  # True while ticks are simulated (a modal dialog might start another frame)
+        self.dropped = 0  # frame intervals in which no frame was rendered (rendering fell behind)
+
+    def __repr__(self):
+        return f"Frame_Clock at {self.label} | backlog {self.backlog:.3f} seconds"
+
+    @property
+    def label(self) -> str:
+        """
+        Returns the label of the current speed (see SPEEDS)
+        """
+        for label, speed in SPEEDS.items():
+            if speed == self.speed:
+                return label
+        return f"{self.speed}x"
+
+    def set_speed(self, speed: Optional[float]) -> None:
+        """
+        Changes the speed, the backlog of the old speed is dropped
+        :param speed: simulated seconds per wall second, None for as fast as possible
+        """
+        self.speed = speed
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Forgets the wall time which passed since the last frame (e.g. while a dialog was open)
+        """
+        self.backlog = 0.
+        self.last = None
+
+    def due(self) -> int:
+        """
+        Adds the wall time since the last frame to the backlog
+        :return: the number of whole ticks which are due
+        """
+        now = self.clock()
+        if self.last is not None:
+            self.dropped += max(int((now - self.last) / self.frame_time) - 1, 0)
+            if self.speed is not None:
+                self.backlog += (now - self.last) * self.speed
+        self.last = now
+        # the tolerance keeps rounding from postponing a tick to the next frame
+        return int(self.backlog / self.tick + 1e-9)
+
+    def advance(self, step: Callable[[], bool]) -> int:
+        """
+        Simulates the ticks which are due, but at most for the budget of one frame
+        :param step: advances the simulation by one tick, returns False once there is nothing left to simulate
+        :return: the number of simulated ticks (0 if no frame has to be rendered)
+        """
+        if self.stepping:
+            return 0
+        self.stepping = True
+        try:
+            ticks = self.due()
+            deadline = self.clock() + self.budget
+            done = 0
+            while self.speed is None or done < ticks:
+                done += 1
+                if not step():
+                    self.reset()
+                if self.last is None:  # reset during the step (the hunt is over or a dialog was open)
+                    return done
+                if self.clock() >= deadline:
+                    break
+            if self.speed is not None:
+                self.backlog -= done * self.tick
+                if done < ticks:  # the simulation can not keep up, the simulated time slows down
+                    self.backlog %= self.tick
+            return done
+        finally:
+            self.stepping = False
@@ -0,0 +1,209 @@
+"""
+Regression run for the implementations which have to give the same results: the python and the numpy backend of
+the Engine simulate the same hunts for many seeds, and every difference is reported. The default worlds of
+config.ini are small, so a larger world (more deers and kids) is checked as well. The batch predicates of
+geometry.py are compared with the scalar ones on points which lie exactly on the boundary, and an Ensemble of the
+same worlds, as well as the Event_Engine, has to give the hunts of the python backend. If Numba is installed, all of this is repeated with the
+compiled kernels of the Herd.
+Usage: python consistency.py --runs 10 (or --set D=30 --set K=40 for only this world)
+Author: Maximilian Janisch
+"""
+
+__all__ = ("CHECKED_WORLDS", "fingerprint", "compare_backends", "compare_ensemble", "compare_events", "boundary_cases", "compare_predicates")
+
+import argparse
+import ast
+import operator
+import random
+import sys
+from math import *
+from typing import *  # library for type hints
+
+from engine import *
+from ensemble import *
+from event_engine import *
+from geometry import *
+from kernels import *
+from global_variables import *
+from helper_functions import *
+from logs import *
+
+# overrides of the worlds which are checked by default
+CHECKED_WORLDS: List[Dict[str, Any]] = [{}, {"D": 30, "K": 40}]
+
+
+def fingerprint(engine: Engine) -> Tuple:
+    """
+    Returns the outcome of a hunt: the time, the collected resources, the positions of the deers, the kids who
+    received their toy and the number of toys (equal hunts have equal fingerprints)
+    """
+    world = engine.world
+    return (engine.iter_, [resource.collected for resource in world.resources],
+            [tuple(deer.position) for deer in world.deers], [world.kid_table.received[row] for row in world.kids],
+            len(world.toys))
+
+
+def compare_backends(seeds: Iterable[int], overrides: Dict[str, Any] = None, config: str = "config.ini",
+                     backends: Sequence[str] = ("python", "numpy")) -> List[int]:
+    """
+    Simulates the hunt of every seed with every backend
+    :param seeds: seeds of the hunts
+    :param overrides: replaces values of the config file, see World
+    :param config: path to the config file
+    :param backends: the backends to compare
+    :return: the seeds whose hunts differ between the backends
+    """
+    different = []
+    for seed in seeds:
+        fingerprints = []
+        for backend in backends:
+            engine = Engine(World(config, dict(overrides or {}), seed), backend=backend)
+            engine.run()
+            fingerprints.append(fingerprint(engine))
+        if any(fingerprint_ != fingerprints[0] for fingerprint_ in fingerprints):
+            mainlog.error("Seed %s with %s: the backends %s give different hunts", seed, overrides, backends)
+            different.append(seed)
+    return different
+
+
+def compare_ensemble(seeds: Iterable[int], overrides: Dict[str, Any] = None, config: str = "config.ini") -> List[int]:
+    """
+    Simulates the hunts of all seeds in one Ensemble and separately with the python backend (the reference)
+    :param seeds: seeds of the hunts
+    :param overrides: replaces values of the config file, see World
+    :param config: path to the config file
+    :return: the seeds whose hunts differ
+    """
+    seeds = list(seeds)
+    ensemble = Ensemble(World(config, dict(overrides or {}), seed) for seed in seeds)
+    ensemble.run()
+    different = []
+    for seed, engine in zip(seeds, ensemble.engines):
+        reference = Engine(World(config, dict(overrides or {}), seed), backend="python")
+        reference.run()
+        if fingerprint(engine) != fingerprint(reference):
+            mainlog.error("Seed %s with %s: the ensemble and the python backend give different hunts", seed, overrides)
+            different.append(seed)
+    return different
+
+
+def compare_events(seeds: Iterable[int], overrides: Dict[str, Any] = None, config: str = "config.ini") -> List[int]:
+    """
+    Simulates the hunt of every seed with the Event_Engine and with the Engine (python backend)
+    :param seeds: seeds of the hunts
+    :param overrides: replaces values of the config file, see World
+    :param config: path to the config file
+    :return: the seeds whose hunts differ
+    """
+    different = []
+    for seed in seeds:
+        fingerprints = []
+        for engine_class in (Event_Engine, Engine):
+            engine = engine_class(World(config, dict(overrides or {}), seed))
+            engine.run()
+            fingerprints.append(fingerprint(engine))
+        if fingerprints[0] != fingerprints[1]:
+            mainlog.error("Seed %s with %s: the Event_Engine and the Engine give different hunts", seed, overrides)
+            different.append(seed)
+    return different
+
+
+def boundary_cases(count: int, rng: random.Random = random) -> List[Tuple[Tuple[float, float], Tuple[float, float],
+                                                                         float]]:
+    """
+    Returns (point, center, radius) triples whose point lies on the boundary of the circle, or one ulp away from it
+    (and the case of a review in which the batch and the scalar predicate disagreed)
+    :param count: number of random triples
+    :param rng: pseudo-random stream to draw from
+    """
+    cases = [((31.474715505052075, 23.085993970946966), (29.740754596028104, 20.045701293263324), 3.5)]
+    for _ in range(count):
+        point = (rng.uniform(0, 100), rng.uniform(0, 100))
+        center = (rng.uniform(0, 100), rng.uniform(0, 100))
+        radius = euclidean_norm((center[0] - point[0], center[1] - point[1]))
+        cases.append((point, center, rng.choice((radius, nextafter(radius, 0), nextafter(radius, inf)))))
+    return cases
+
+
+def compare_predicates(count: int = 1000, seed: int = 0) -> List[str]:
+    """
+    Compares the batch predicates of geometry.py with the scalar predicates on boundary cases
+    :param count: number of random boundary cases
+    :param seed: seed of the boundary cases
+    :return: the names of the batch predicates which disagree with the scalar ones
+    """
+    cases = boundary_cases(count, random.Random(seed))
+    points = [point for point, _, _ in cases]
+    centers = [center for _, center, _ in cases]
+    radii = [radius for _, _, radius in cases]
+    sizes = [2 * max_norm((center[0] - point[0], center[1] - point[1])) for point, center, _ in cases]
+
+    def diagonal(pairs: Tuple) -> List[bool]:  # the batch result of every case i (pair (i, i))
+        result = [False] * len(cases)
+        for first, second in zip(*(pairs_.tolist() for pairs_ in pairs)):
+            if first == second:
+                result[first] = True
+        return result
+
+    batches = {
+        "points_in_circles": (
+            diagonal(points_in_circles(points, centers, radii)),
+            [Circle(center, radius).point_in_circle(point) for point, center, radius in cases]),
+        "circles_overlap_circles": (  # the circles touch if the point is the center of a circle of radius 0
+            diagonal(circles_overlap_circles(points, [0.] * len(cases), centers, radii)),
+            [Circle(point, 0.).overlap_circle(Circle(center, radius)) for point, center, radius in cases]),
+        "circles_overlap_squares": (  # a square of size 0 is its center
+            diagonal(circles_overlap_squares(centers, radii, points, [0.] * len(cases))),
+            [Circle(center, radius).overlap_square(Square(point, 0.)) for point, center, radius in cases]),
+        "points_in_squares": (
+            diagonal(points_in_squares(points, centers, sizes)),
+            [Square(center, size).point_in_square(point) for point, center, size in zip(points, centers, sizes)]),
+        "squares_overlap_squares": (
+            diagonal(squares_overlap_squares(points, [0.] * len(cases), centers, sizes)),
+            [Square(point, 0.).overlap_square(Square(center, size)) for point, center, size in
+             zip(points, centers, sizes)]),
+    }
+    different = []
+    for name, (batch, scalar) in batches.items():
+        if batch != scalar:
+            mainlog.error("%s disagrees with the scalar predicate in %s of %s boundary cases", name,
+                          sum(map(operator.ne, batch, scalar)), len(cases))
+            different.append(name)
+    return different
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Checks that the backends of the Engine give the same hunts")
+    parser.add_argument("--runs", type=int, default=10, help="number of seeds per world")
+    parser.add_argument("--seed", type=int, default=0, help="first seed")
+    parser.add_argument("--config", default="config.ini", help="path to the config file")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="check only the world with these overrides (values are Python literals)")
+    arguments = parser.parse_args()
+
+    configure_logging(arguments.config)
+    worlds = [{key: ast.literal_eval(value) for key, value in (item.split("=", 1) for item in arguments.set)}] \
+        if arguments.set else CHECKED_WORLDS
+    if numba_available():  # the numpy backend with the compiled kernels
+        worlds += [dict(overrides_, kernels="numba") for overrides_ in worlds if "kernels" not in overrides_]
+    seeds = range(arguments.seed, arguments.seed + arguments.runs)
+    failed = False
+    for overrides_ in worlds:
+        different_ = compare_backends(seeds, overrides_, arguments.config)
+        failed |= bool(different_)
+        print(f"{overrides_ or 'config.ini'}: {len(seeds) - len(different_)} of {len(seeds)} seeds agree"
+              + (f", different seeds: {different_}" if different_ else ""))
+        different_ = compare_ensemble(seeds, overrides_, arguments.config)
+        failed |= bool(different_)
+        print(f"{overrides_ or 'config.ini'} in an ensemble: {len(seeds) - len(different_)} of {len(seeds)} seeds "
+              f"agree" + (f", different seeds: {different_}" if different_ else ""))
+        if "kernels" not in overrides_:  # the Event_Engine has no kernels
+            different_ = compare_events(seeds, overrides_, arguments.config)
+            failed |= bool(different_)
+            print(f"{overrides_ or 'config.ini'} with events: {len(seeds) - len(different_)} of {len(seeds)} seeds "
+                  f"agree" + (f", different seeds: {different_}" if different_ else ""))
+    different_ = compare_predicates()
+    failed |= bool(different_)
+    print(f"batch predicates: " + (f"{different_} disagree with the scalar ones" if different_ else
+                                   "agree with the scalar ones on the boundary"))
+    sys.exit(1 if failed else 0)
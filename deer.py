@@ -12,20 +12,29 @@ from typing import *  # library for type hints
 
 import random
 
+from distribution_classes import *
 from geometry import *
 from helper_functions import *
 from logs import *
+from marker_registry import *
+from scent_field import *
+from tally import *
 
 
 class Deer:
-    def __init__(self, index: int, position: Tuple[float, float], smoothness: int):
+    def __init__(self, index: int, position: Tuple[float, float], smoothness: int, rng: random.Random = random,
+                 tally: Tally = None):
         """
         Initializes the Deer class
         :param index: index of the deer
         :param position: initial position of the deer
         :param smoothness: Integer according to the smoothness of the animation
+        :param rng: pseudo-random stream of this deer (see Random_Streams.deer)
+        :param tally: counters of the world which the deer keeps up to date
         """
         self.index = index
+        self.rng = rng  # every random decision of the deer is drawn from its own stream
+        self.tally = tally if tally is not None else Tally()
 
         self.position = position
         self.old_position = position  # old position for checking marker intersection
@@ -37,6 +46,7 @@ class Deer:
 
         self.is_painting_marker = False
         self.is_erasing_marker = False
+        self.is_scenting = False  # lays scent on the way home (instead of painting a marker)
         self.is_distributing = False
         self.path = None  # used for distribution
 
@@ -50,12 +60,21 @@ class Deer:
         self.distr_log = []  # distribution route log for GUI
 
     def __repr__(self):
+        return f"#{self.index} | {self.state} | current position {self.position} | loaded {self.loaded}"
+
+    @property
+    def state(self) -> str:
+        """
+        Returns what the deer is currently doing
+        """
         state = "Random search"
         if self.resource:
             if self.is_painting_marker:
                 state = "Painting marker"
             elif self.is_erasing_marker:
                 state = "Erasing marker"
+            elif self.is_scenting:
+                state = "Laying scent"
             else:
                 state = "Return to home"
         elif self.marker:
@@ -67,7 +86,13 @@ class Deer:
                 state = "Return to home"
         elif self.inactive:
             state = "Inactive"
-        return f"#{self.index} | {state} | current position {self.position} | loaded {self.loaded}"
+        return state
+
+    def log_state(self) -> Tuple[int, str, Tuple[float, float], int]:
+        """
+        Returns index, state, position and load of the deer (immutable, so the logs only format it later)
+        """
+        return self.index, self.state, tuple(self.position), self.loaded
 
     def move_towards(self, dx: int, destination: Tuple[float, float]):
         """
@@ -75,14 +100,7 @@ class Deer:
         :param dx: speed of the deer
         :param destination: position to move towards
         """
-        euclidean_distance = euclidean_norm((self.position[0] - destination[0], self.position[1] - destination[1]))
-        direction = (destination[0] - self.position[0], destination[1] - self.position[1])
-
-        if euclidean_norm(direction) == 0:  # avoid division by 0 error (if self is already at location)
-            return
-        direction = (min(dx, euclidean_distance) * direction[0] / euclidean_norm(direction),
-                     min(dx, euclidean_distance) * direction[1] / euclidean_norm(direction))
-        self.position = (self.position[0] + direction[0], self.position[1] + direction[1])
+        self.position = step_towards(self.position, destination, dx)
 
     def random_walk(self, dx: int, N: int):  # makes the deer move pseudo-randomly
         """
@@ -90,48 +108,56 @@ class Deer:
         :param dx: speed of the deer
         :param N: edge of the world
         """
-        theta: float = random.uniform(0, 360)  # pseudo-random angle
         if self.random_target and not euclidean_norm((self.position[0] - self.random_target[0],
                                                       self.position[1] - self.random_target[1])) <= 0.001:
             self.move_towards(dx, self.random_target)
         else:
+            # the angle is only drawn when it is needed, so the stream of the deer does not depend on the tick rate
+            theta: float = self.rng.uniform(0, 360)  # pseudo-random angle
             self.random_target = (limit(self.position[0] + dx * cos(theta) * self.smoothness, 0, N),
                                   limit(self.position[1] + dx * sin(theta) * self.smoothness, 0, N)
                                   )
 
-    def move_to_collect(self, dx: int, santa_house: House, N: int, markers: list):
+    def move_to_collect(self, dx: int, santa_house: House, N: int, markers: Marker_Registry,
+                        scent: Scent_Field = None):
         """
         Moves the deer according to the environment (markers, inactivity, etc.)
         :param dx: speed of the deer
         :param santa_house: Santa's house (in order to return and deposit)
         :param N: size of the world
-        :param markers: list of all set markers
+        :param markers: registry of all set markers
+        :param scent: the scent field of the world if the deers coordinate with scent instead of markers
         """
         self.old_position = self.position
 
         if self.inactive:  # deer rests after depositing materials
             # find and attach marker
             self.inactive = (self.inactive + 1) % self.smoothness
-            if not self.marker:  # deer might want to stick to his current marker
+            if not self.inactive:
+                self.tally.inactive_deers -= 1
+            if not self.marker and scent is None:  # deer might want to stick to his current marker
                 # avoid markers that have not reached santa's house
-                valid_markers = [marker for marker in markers if marker.startpoint == santa_house.center]
+                valid_markers = markers.valid()
                 if valid_markers:
                     # if there is at least one marker, pick it
-                    self.marker = random.choice(valid_markers)
+                    self.marker = self.rng.choice(valid_markers)
 
         elif self.resource:  # return to home mechanism
             self.return_to_home(dx, santa_house)
+            if self.is_scenting:  # lay the trail
+                scent.deposit(self.position)
         elif self.marker:  # deer doesn't have a resource but follows a marker
             self.follow_marker(dx, N)
-        else:  # deer has neither a resource nor a marker
-            for marker in markers:  # checks if the deer recently passed any marker
-                if marker.line_touch(self.old_position, self.position):
-                    self.marker = marker
-                    break
-            if self.marker:  # if yes, follow that marker
-                self.follow_marker(dx, N)
-            else:  # if not, move around pseudo-randomly
+        elif scent is not None:  # follow the trail away from home, else move around pseudo-randomly
+            target = scent.uphill(self.position, santa_house.center)
+            if target:
+                self.move_towards(dx, target)
+            else:
                 self.random_walk(dx, N)
+        else:  # deer has neither a resource nor a marker, move around pseudo-randomly
+            self.random_walk(dx, N)
+            # checks if the deer crossed any marker on its way, if yes it follows that marker from the next tick on
+            self.marker = markers.hit(self.old_position, self.position)
 
     def move_to_distribute(self, dx: int, santa_house: House, paths: list):
         """
@@ -140,26 +166,14 @@ class Deer:
         :param santa_house: Santa's house (in order to return and deposit)
         :param paths: list of all distribution paths
         """
-        # cleanup for collecting deers
         if not self.is_distributing:
-            self.is_distributing = True
-            self.is_painting_marker = False
-            self.is_erasing_marker = False
-            if self.marker:
-                self.marker.disable()
-                self.marker = None
+            self.start_distributing()
 
         self.old_position = self.position
         if self.inactive:  # deer rests after returning home
-            # find and attach path
-            # avoid paths that are already picked
-            valid_paths = [path for path in paths if not (path.is_picked() or path.is_finished())]
-            if valid_paths:
-                # if there is at least one marker, pick it
-                self.path = random.choice(valid_paths)
-                self.path.pick()
-                self.inactive = False
-            # else stay inactive in santa's house to rest
+            # paths are shared by all deers, so the Engine lets resting deers pick them one after another
+            # (see pick_path) once all deers have moved
+            pass
 
         # still in collection mode, go home and finish job
         elif self.resource:
@@ -168,11 +182,10 @@ class Deer:
         # deer on the move in distribution mode
         elif self.path:  # if yes, follow that path
             if not self.path.is_finished():
-                target_house = self.path.get_next_house()
-                self.move_towards(dx, target_house.center)
-                if target_house.point_in_square(self.position):
-                    mainlog.debug(f"Deer #{self.index} gave toy to {self.path.get_next_kid().name}")
-                    self.path.get_next_kid().give_toy()
+                self.move_towards(dx, self.path.next_center())
+                if self.path.next_house_contains(self.position):
+                    deerlog.debug("Deer #%s gave toy to %s", self.index, self.path.get_next_kid().name)
+                    self.give_toy()
             else:
                 self.path = None
                 self.return_to_home(dx, santa_house)
@@ -181,28 +194,50 @@ class Deer:
             self.distr_log.append(self.position)
             self.return_to_home(dx, santa_house)
 
-    def load_resource(self, location: Location, amount: int, markers: List[Marker]):
+    def start_distributing(self):
+        """
+        Cleanup for collecting deers once the distribution starts
+        """
+        self.is_distributing = True
+        self.is_painting_marker = False
+        self.is_erasing_marker = False
+        if self.marker:
+            self.marker.disable()
+            self.marker = None
+
+    def pick_path(self, paths: Path_Pool) -> bool:
+        """
+        Lets a resting deer pick one of the paths that have not been picked yet
+        :param paths: pool of the paths which are neither picked nor finished
+        :return: True if a path was picked, else False (the deer stays inactive in santa's house to rest)
+        """
+        if paths:
+            # if there is at least one path, pick it
+            self.path = paths.pick(self.rng, self.position)
+            self.inactive = False
+            self.tally.inactive_deers -= 1
+        return bool(paths)
+
+    def load_resource(self, location: Location, amount: int, markers: Marker_Registry):
         """
         loads amount of resource from location
         :param location: the location with the loot
         :param amount: how many
-        :param markers: Currently set markers in world
+        :param markers: registry of the currently set markers in world
         """
         self.resource = location.resource
         self.loaded = location.pickup_resources(amount)
+        if self.loaded > 0:
+            self.tally.loaded_deers += 1
         self.position = location.center
         # a hack, but this way, the marker is connected to the center of the location and will not disconnect when the location shrinks
-        mainlog.debug(f"picking up {self.loaded} from {location.resource}")
+        deerlog.debug("picking up %s from %s", self.loaded, location.resource)
         if (self.loaded > 0) and (location.amount == 0):  # we just emptied the location
-            existing_marker = None
-            for marker in markers:
-                if not existing_marker:
-                    if marker.location == location:
-                        existing_marker = marker
-            self.marker = existing_marker
+            self.marker = markers.for_location(location)
             if self.marker:
                 self.is_erasing_marker = True
-            mainlog.debug(f"deer #{self.index} erases {self.marker}")
+                self.marker.start_erasing()
+            deerlog.debug("deer #%s erases %s", self.index, self.marker)
 
     def return_to_home(self, dx: int, house: House):
         """
@@ -215,20 +250,25 @@ class Deer:
             # unload resources
             if self.resource:
                 self.resource.deposit(self.loaded)
+                if self.loaded > 0:
+                    self.tally.loaded_deers -= 1
                 self.loaded = 0
                 self.resource = None
+            if not self.inactive:
+                self.tally.inactive_deers += 1
             self.inactive = 1
+            self.is_scenting = False
 
             # finalize marker and disconnect from it
             if self.is_painting_marker:
-                self.marker.startpoint = home
+                self.marker.complete(home)
                 self.is_painting_marker = False
-                mainlog.debug(f"Deer #{self.index} finalized {self.marker}")
+                deerlog.debug("Deer #%s finalized %s", self.index, self.marker)
                 self.marker = None
 
             # finalize marker and disconnect from it
             if self.is_erasing_marker:
-                mainlog.debug(f"deer #{self.index} removed {self.marker}")
+                deerlog.debug("deer #%s removed %s", self.index, self.marker)
                 self.marker.disable()
                 self.is_erasing_marker = False
                 self.marker = None
@@ -238,11 +278,11 @@ class Deer:
 
             # paint the marker
             if self.is_painting_marker:
-                self.marker.startpoint = self.position
+                self.marker.set_startpoint(self.position)
 
             # erase the marker
             if self.is_erasing_marker:
-                self.marker.endpoint = self.position
+                self.marker.set_endpoint(self.position)
 
     def follow_marker(self, dx: int, N: int):  # makes the deer follow a marker
         """
@@ -270,9 +310,17 @@ class Deer:
         """
         self.is_painting_marker = True
         self.marker = Marker(location, (location.center[0] - origin[0], location.center[1] - origin[1]))
-        mainlog.debug(f"deer #{self.index} paints {self.marker}")
+        deerlog.debug("deer #%s paints %s", self.index, self.marker)
         return self.marker
 
+    def give_toy(self):
+        """
+        Gives the toy to the next kid of the path (the deer has to be in its house)
+        """
+        self.path.deliver()
+        if self.path.is_finished():
+            self.tally.finished_paths += 1
+
     def loaded_toys(self) -> int:
         """
         returns the number of toys loaded
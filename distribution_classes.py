@@ -3,26 +3,29 @@ File for classes that are not responsible for geometry, such as Kid and Toy
 Authors: Reetta Välimäki, Maximilian Janisch
 """
 
-__all__ = ("Kid", "Toy", "Toy_Type", "Distribution_Path")
+__all__ = ("Kid", "Toy", "Toy_Type", "Distribution_Path", "Path_Pool", "Path_Scheduler", "lpt_makespan")
 
+import heapq
 import random
 from typing import *  # library for type hints
 
 from geometry import *
+from helper_functions import *
 
 
 class Toy_Type:
     """
     A single toy type
     """
-    def __init__(self, seq: int, resources: List[Resource], toy_name: str):
+    def __init__(self, seq: int, resources: List[Resource], toy_name: str, rng: random.Random = random):
         """
         Initialises the Toy Class
         :param seq: index
         :param resources: list of the resources that the toy type needs in order to be produced
         :param toy_name: the name of the toy, e.g. chocolate
+        :param rng: pseudo-random stream to draw from
         """
-        self.resource_list = [random.choice(resources) for x in range(1, 5)]
+        self.resource_list = [rng.choice(resources) for x in range(1, 5)]
         # random sample of resources for a toy to be produced
         self.toy_name = toy_name
         self.toy_grade = seq
@@ -65,16 +68,19 @@ class Toy:
 
 class Kid:
     """
-    A single kid 
+    A single kid (see tables.Kid_Table for many kids)
     """
-    def __init__(self, index: int, name: str, house: House):
+    __slots__ = ("kid_grade", "name", "house", "received", "index", "toy")
+
+    def __init__(self, index: int, name: str, house: House, rng: random.Random = random):
         """
         Initialises the Kid class
         :param index: numbering of the kids
         :param name: name of the kids
         :param house: the house the kid lives in 
+        :param rng: pseudo-random stream to draw from
         """
-        self.kid_grade = random.randint(1, 6)  # a kid can have been very nasty this year
+        self.kid_grade = rng.randint(1, 6)  # a kid can have been very nasty this year
         self.name = name
         self.house = house
         self.received = False
@@ -127,11 +133,13 @@ class Kid:
 class Distribution_Path:
     """
     A path that a deer can follow to distribute the toys
+    The kids receive their toys in the order of the path, so a cursor on the next kid answers all queries in O(1)
     """
 
     def __init__(self, kids: List[Kid]):
         self.kids: List[Kid] = kids
         self.picked_by_deer = False
+        self.cursor = 0  # index of the next kid without toy
 
     def __repr__(self):
         return f"Path with {self.left_to_distribute()} toys left to distribute to kids {self.kids}"
@@ -147,26 +155,224 @@ class Distribution_Path:
     def is_picked(self)-> bool:
         return self.picked_by_deer
 
+    def advance(self)-> None:
+        """
+        moves the cursor past the kids which already got their toy
+        """
+        while self.cursor < len(self.kids) and self.kids[self.cursor].got_toy():
+            self.cursor += 1
+
     def is_finished(self)-> bool:
-        try:
-            return self.kids[-1].got_toy()
-        except IndexError:
-            return True
+        self.advance()
+        return self.cursor == len(self.kids)
 
     def get_next_kid(self)-> Kid:
-        for k in self.kids:
-            if k.got_toy():
-                continue
-            else:
-                return k
-        raise IndexError("Distribution_Path.get_next_kid, no more unhappy kids:-)")
+        self.advance()
+        if self.cursor == len(self.kids):
+            raise IndexError("Distribution_Path.get_next_kid, no more unhappy kids:-)")
+        return self.kids[self.cursor]
 
     def get_next_house(self) -> House:
         return self.get_next_kid().house
 
+    def get_kids(self, start: int = 0, stop: int = None) -> List[Kid]:
+        """
+        returns the kids of the path from start to stop (the kids of a Kid_Path are rows, see tables.py)
+        """
+        return self.kids[start:stop]
+
+    def first_center(self) -> Tuple[float, float]:
+        """
+        returns the center of the house of the first kid of the path (where a deer flies first)
+        """
+        return self.kids[0].house.center
+
+    def next_center(self) -> Tuple[float, float]:
+        """
+        returns the center of the house of the next kid without toy
+        """
+        return self.get_next_house().center
+
+    def next_house_contains(self, point: Tuple[float, float]) -> bool:
+        """
+        returns True if point is within the house of the next kid without toy
+        """
+        return self.get_next_house().point_in_square(point)
+
     def left_to_distribute(self)-> int:
-        result = 0
-        for k in self.kids:
-            if not k.got_toy():
-                result += 1
+        self.advance()
+        return len(self.kids) - self.cursor
+
+    def length(self, home: Tuple[float, float])-> float:
+        """
+        returns the length of the round trip from home to all kids of the path and back
+        """
+        stops = [home] + [kid.house.center for kid in self.kids] + [home]
+        return sum(euclidean_norm((stops[i + 1][0] - stops[i][0], stops[i + 1][1] - stops[i][1]))
+                   for i in range(len(stops) - 1))
+
+    def deliver(self)-> Kid:
+        """
+        gives the toy to the next kid and returns the kid
+        """
+        kid = self.get_next_kid()
+        kid.give_toy()
+        self.cursor += 1
+        return kid
+
+
+class Path_Pool:
+    """
+    The distribution paths which are neither picked nor finished, in the order of the world's paths.
+    A Fenwick tree over the paths finds the k-th of them, so a deer picks a path in O(log n) instead of
+    filtering all paths.
+    """
+
+    def __init__(self, paths: List[Distribution_Path]):
+        """
+        Initializes the Path_Pool class
+        :param paths: all distribution paths of the world
+        """
+        self.paths = paths
+        self.available = [not (path.is_picked() or path.is_finished()) for path in paths]
+        self.count = sum(self.available)
+
+        self.tree = [0] * (len(paths) + 1)  # Fenwick tree of the available flags (1-based)
+        for index, available in enumerate(self.available, 1):
+            self.tree[index] += available
+            parent = index + (index & -index)
+            if parent <= len(paths):
+                self.tree[parent] += self.tree[index]
+
+    def __len__(self):
+        return self.count
+
+    def __repr__(self):
+        return f"Pool of {self.count} unpicked paths out of {len(self.paths)}"
+
+    def find(self, rank: int) -> int:
+        """
+        Returns the index of the available path with rank rank (0-based, in the order of the paths)
+        """
+        index = 0
+        step = 1 << len(self.paths).bit_length()
+        while step:
+            if index + step <= len(self.paths) and self.tree[index + step] <= rank:
+                index += step
+                rank -= self.tree[index]
+            step >>= 1
+        return index
+
+    def remove(self, index: int) -> None:
+        """
+        Removes the path with index index from the pool
+        """
+        self.available[index] = False
+        self.count -= 1
+        index += 1
+        while index <= len(self.paths):
+            self.tree[index] -= 1
+            index += index & -index
+
+    def pick(self, rng: random.Random = random, position: Tuple[float, float] = None) -> Distribution_Path:
+        """
+        Picks one of the available paths uniformly at random and removes it from the pool. Draws the same number
+        from rng as rng.choice on the list of the available paths (position of the deer is not used).
+        """
+        if not self.count:
+            raise IndexError("Path_Pool.pick: no paths left")
+        index = self.find(rng.choice(range(self.count)))
+        self.remove(index)
+        path = self.paths[index]
+        path.pick()
+        return path
+
+
+def lpt_makespan(costs: Iterable[float], free_at: Sequence[float]) -> float:
+    """
+    Assigns the jobs longest first to the deer which is free first (longest processing time first)
+    :param costs: durations of the jobs
+    :param free_at: times at which the deers are free for their first job
+    :return: the time at which the last job is done
+    """
+    deers = list(free_at)
+    heapq.heapify(deers)
+    result = max(deers, default=0)
+    if not deers:
         return result
+    for cost in sorted(costs, reverse=True):
+        done = heapq.heappop(deers) + cost
+        heapq.heappush(deers, done)
+        result = max(result, done)
+    return result
+
+
+class Path_Scheduler:
+    """
+    Replacement for Path_Pool which hands out the longest available path first, so a deer which becomes free takes
+    the path with the largest estimated cost (longest processing time first). This keeps the long paths from being
+    started just before the deers have to go home. The cost of a path is the round trip from Santa's house, and a
+    deer which picks a path is somewhere in Santa's house: its cost is corrected by the distance of the deer to the
+    first house of the path, so every pick is planned from the current position of the deer.
+    """
+
+    def __init__(self, paths: List[Distribution_Path], home: Tuple[float, float], dx: float):
+        """
+        Initializes the Path_Scheduler class
+        :param paths: all distribution paths of the world
+        :param home: center of Santa's house
+        :param dx: distance a deer flies per tick
+        """
+        self.paths = paths
+        self.home = home
+        self.dx = dx
+        self.costs = [path.length(home) / dx for path in paths]  # estimated ticks for each path
+        self.heap = [(-self.costs[index], index) for index, path in enumerate(paths)
+                     if not (path.is_picked() or path.is_finished())]
+        heapq.heapify(self.heap)
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __repr__(self):
+        return f"Scheduler with {len(self.heap)} unpicked paths out of {len(self.paths)}"
+
+    def cost_from(self, index: int, position: Tuple[float, float]) -> float:
+        """
+        Returns the estimated ticks of the path with index index for a deer at position (instead of home)
+        """
+        (x, y), home = self.paths[index].first_center(), self.home
+        return self.costs[index] + (euclidean_norm((x - position[0], y - position[1]))
+                                    - euclidean_norm((x - home[0], y - home[1]))) / self.dx
+
+    def pick(self, rng: random.Random = random, position: Tuple[float, float] = None) -> Distribution_Path:
+        """
+        Removes the longest available path for a deer at position (home if None) from the scheduler and returns it
+        (rng is not used)
+        """
+        if not self.heap:
+            raise IndexError("Path_Scheduler.pick: no paths left")
+        if position is None:
+            index = heapq.heappop(self.heap)[1]
+        else:
+            # the position changes a cost by at most the distance of the deer to home (triangle inequality), so only
+            # the paths which are at most twice that shorter than the longest one are candidates
+            slack = 2 * euclidean_norm((position[0] - self.home[0], position[1] - self.home[1])) / self.dx
+            candidates = [heapq.heappop(self.heap)]
+            while self.heap and -self.heap[0][0] >= -candidates[0][0] - slack:
+                candidates.append(heapq.heappop(self.heap))
+            best = max(candidates, key=lambda candidate: (self.cost_from(candidate[1], position), -candidate[1]))
+            for candidate in candidates:
+                if candidate is not best:
+                    heapq.heappush(self.heap, candidate)
+            index = best[1]
+        path = self.paths[index]
+        path.pick()
+        return path
+
+    def makespan(self, free_at: Sequence[float]) -> float:
+        """
+        Returns the planned number of ticks until the available paths are done
+        :param free_at: ticks until each deer is free to start a path (e.g. until it is home)
+        """
+        return lpt_makespan((-cost for cost, _ in self.heap), free_at)
@@ -0,0 +1,388 @@
+"""
+Spatial domain decomposition of the collection phase for huge worlds. The world is split into tiles x tiles square
+tiles and every tile is owned by a worker process, which moves the searching deers inside of it (random walk,
+following a marker, looking for crossed markers) and finds the ones which may have reached a resource location.
+The markers and locations near a tile (within one step of a deer) are mirrored into its worker as ghost copies.
+A deer which leaves its tile is handed over to the worker of its new tile, together with its random stream.
+Everything that touches shared state (loading resources, painting markers, resting, the whole distribution) stays
+in the main process and is resolved in the order of the deer indices, so the results are the same as the ones of
+the Engine with the python backend.
+Author: Maximilian Janisch
+"""
+
+__all__ = ("Tiling", "Ghost_Marker", "Domain_Engine")
+
+import multiprocessing
+import random
+from math import *
+from typing import *  # library for type hints
+
+from deer import *
+from engine import *
+from geometry import *
+from global_variables import *
+from helper_functions import *
+from logs import *
+from spatial_index import *
+
+
+class Tiling:
+    """
+    Split of the N x N world into tiles x tiles square tiles. The tiles are numbered row by row, points outside of
+    the world belong to the nearest tile.
+    """
+
+    def __init__(self, N: float, tiles: int, halo: float):
+        """
+        Initializes the Tiling class
+        :param N: edge of the world
+        :param tiles: number of tiles per edge
+        :param halo: width of the border around every tile whose objects are mirrored into the tile
+        """
+        if tiles < 1:
+            raise ValueError(f"A tiling needs at least one tile per edge, not {tiles}")
+        self.N = N
+        self.tiles = tiles
+        self.size = N / tiles
+        self.halo = halo
+
+    def __repr__(self):
+        return f"Tiling of {self.tiles}x{self.tiles} tiles of size {self.size} (halo {self.halo})"
+
+    def __len__(self):
+        return self.tiles ** 2
+
+    def column(self, coordinate: float) -> int:
+        """
+        Returns the index of the column (or row) of the tiles which contains coordinate
+        """
+        return min(max(floor(coordinate / self.size), 0), self.tiles - 1)
+
+    def tile(self, point: Tuple[float, float]) -> int:
+        """
+        Returns the number of the tile which contains point
+        """
+        return self.column(point[0]) * self.tiles + self.column(point[1])
+
+    def near(self, left: float, bottom: float, right: float, top: float) -> List[int]:
+        """
+        Returns the tiles whose area including the halo overlaps the rectangle [left, right] x [bottom, top]
+        """
+        return [column * self.tiles + row
+                for column in range(self.column(left - self.halo), self.column(right + self.halo) + 1)
+                for row in range(self.column(bottom - self.halo), self.column(top + self.halo) + 1)]
+
+
+class Ghost_Marker:
+    """
+    Copy of a marker in a worker, with what the searching deers read of it (the committed segment)
+    """
+    __slots__ = ("id", "startpoint", "endpoint", "direction")
+
+    def __init__(self, id_: int, direction: Tuple[float, float]):
+        """
+        Initializes the Ghost_Marker class
+        :param id_: number of the marker in the Domain_Engine
+        :param direction: direction of the marker
+        """
+        self.id = id_
+        self.direction = direction
+        self.startpoint = self.endpoint = None
+
+    def __repr__(self):
+        return f"Ghost of marker {self.id} from {self.startpoint} to {self.endpoint}"
+
+    line_touch = Marker.line_touch
+
+
+def _tile_worker(connection, tiling: Tiling, tile: int, dx: float, N: float, smoothness: int,
+                 cell_size: float) -> None:
+    """
+    Main loop of the worker process of a tile. Every message of the Domain_Engine contains
+    (releases, markers, dropped, locations, adoptions, move):
+    releases: indices of the deers which the worker hands back
+    markers: (id, startpoint, endpoint, direction, order) of new or changed ghosts, order is None for ghosts which
+             are only followed (their marker is not on the grid anymore)
+    dropped: ids of the ghosts which are not needed anymore
+    locations: (center, radius) of the locations near the tile, None if they did not change
+    adoptions: (index, position, random_target, marker id, state of the random stream) of the new deers
+    move: False if the deers are not moved (see Domain_Engine.gather)
+    The answer is (released, moved, candidates):
+    released: (index, state of the random stream) of the released deers and of the deers which left the tile
+    moved: (index, position, old_position, random_target, marker id) of the moved deers
+    candidates: indices of the moved deers which lie inside of a location
+    """
+    deers: Dict[int, Deer] = {}
+    ghosts: Dict[int, Ghost_Marker] = {}
+    grid = Marker_Grid(cell_size)
+    locations: List[Tuple[Tuple[float, float], float]] = []
+
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        releases, markers, dropped, new_locations, adoptions, move = message
+
+        released = [(index, deers.pop(index).rng.getstate()) for index in releases]
+        for id_ in dropped:
+            ghost = ghosts.pop(id_)
+            if ghost in grid:
+                grid.remove(ghost)
+        for id_, startpoint, endpoint, direction, order in markers:
+            ghost = ghosts.get(id_)
+            if ghost is None:
+                ghost = ghosts[id_] = Ghost_Marker(id_, direction)
+            ghost.startpoint, ghost.endpoint = startpoint, endpoint
+            if order is None:
+                if ghost in grid:
+                    grid.remove(ghost)
+            else:
+                if ghost in grid:
+                    grid.update(ghost)
+                else:
+                    grid.add(ghost)
+                grid.order[ghost] = order  # hits are reported in the order of the main process
+        if new_locations is not None:
+            locations = new_locations
+        for index, position, random_target, marker, state in adoptions:
+            deer = deers[index] = Deer(index, position, smoothness, random.Random())
+            deer.rng.setstate(state)
+            deer.random_target = random_target
+            deer.marker = ghosts[marker] if marker is not None else None
+
+        moved, candidates = [], []
+        if move:
+            for index, deer in deers.items():
+                deer.move_to_collect(dx, None, N, grid)  # searching deers only read the markers
+                moved.append((index, deer.position, deer.old_position, deer.random_target,
+                              deer.marker.id if deer.marker else None))
+                x, y = deer.position
+                if any(euclidean_norm((center[0] - x, center[1] - y)) <= radius for center, radius in locations):
+                    candidates.append(index)
+            for index in [index for index, deer in deers.items() if tiling.tile(deer.position) != tile]:
+                released.append((index, deers.pop(index).rng.getstate()))
+        connection.send((released, moved, candidates))
+
+
+class Domain_Engine(Engine):
+    """
+    Engine which moves the searching deers of the collection phase in one worker process per tile (see the
+    description of the module). The workers are started with the first tick and stopped at the end of the
+    collection (or with close).
+    """
+
+    def __init__(self, world: World, stats=None, backend: str = None, tiles: int = None):
+        """
+        Initializes the Domain_Engine class
+        :param world: the world which gets simulated
+        :param stats: optional Statistics instance which gets updated after every step
+        :param backend: only "python" (the deers are moved as Python objects)
+        :param tiles: number of tiles per edge of the world (tiles ** 2 worker processes), by default the one from
+                      the config file
+        """
+        if backend not in (None, "python"):
+            raise ValueError(f"The Domain_Engine only supports the python backend, not {backend}")
+        super().__init__(world, stats, "python")
+        if world.scent is not None:
+            raise ValueError("The Domain_Engine only supports the coordination with markers")
+
+        # the objects within one step of a tile are mirrored into it, as the deers of the tile move at most that far
+        self.tiling = Tiling(world.N, tiles or world.tiles, world.dx * (1 + 1e-6) + 1e-9 * world.N)
+        self.workers: List[Tuple[multiprocessing.Process, Any]] = []  # process and connection of every tile
+        self.owner: Dict[Deer, int] = {}  # tile of every deer which is moved by a worker
+        self.marker_ids: Dict[Marker, int] = {}
+        self.markers_by_id: Dict[int, Marker] = {}
+        self.covering: Dict[Marker, Tuple[list, Set[int]]] = {}  # tiles near the grid cells of every marker
+        self.mirrored: List[Dict[Marker, tuple]] = []  # ghost markers of every worker
+        self.mirrored_locations: List[list] = []  # ghost locations of every worker
+
+    def __repr__(self):
+        return f"Domain_Engine with {len(self.tiling)} tiles in state {self.state_.name} at time {self.iter_:.2f}"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def start(self) -> None:
+        """
+        Starts the worker processes (if they are not running yet)
+        """
+        if self.workers:
+            return
+        world = self.world
+        for tile in range(len(self.tiling)):
+            connection, worker_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_tile_worker, daemon=True,
+                                              args=(worker_connection, self.tiling, tile, world.dx, world.N,
+                                                    world.animation_smoothness, world.markers.grid.cell_size))
+            process.start()
+            self.workers.append((process, connection))
+        self.mirrored = [{} for _ in self.workers]
+        self.mirrored_locations = [[] for _ in self.workers]
+        enginelog.debug("Started %s tile workers (%s)", len(self.workers), self.tiling)
+
+    def close(self) -> None:
+        """
+        Hands all deers back to the main process and stops the worker processes
+        """
+        if not self.workers:
+            return
+        self.gather()
+        for process, connection in self.workers:
+            connection.send(None)
+            process.join()
+            connection.close()
+        self.workers = []
+        self.marker_ids.clear()
+        self.markers_by_id.clear()
+        self.covering.clear()
+
+    def gather(self) -> None:
+        """
+        Hands all deers back to the main process (with their random streams, e.g. for a snapshot)
+        """
+        if not self.owner:
+            return
+        messages = [([], [], [], None, [], False) for _ in self.workers]
+        for deer, tile in self.owner.items():
+            messages[tile][0].append(deer.index)
+        self.owner.clear()
+        self.exchange(messages)
+
+    def exchange(self, messages: List[tuple]) -> List[tuple]:
+        """
+        Sends a message to every worker and applies their answers
+        :param messages: one message per worker (see _tile_worker)
+        :return: the candidates of every worker
+        """
+        for (process, connection), message in zip(self.workers, messages):
+            connection.send(message)
+        return self.receive()
+
+    def receive(self) -> List[int]:
+        """
+        Applies the answers of all workers (see _tile_worker)
+        :return: the indices of the deers which may have reached a location
+        """
+        deers = self.world.deers
+        candidates = []
+        for process, connection in self.workers:
+            released, moved, candidates_ = connection.recv()
+            for index, state in released:
+                deers[index].rng.setstate(state)
+                self.owner.pop(deers[index], None)
+            for index, position, old_position, random_target, marker in moved:
+                deer = deers[index]
+                deer.position, deer.old_position, deer.random_target = position, old_position, random_target
+                deer.marker = self.markers_by_id[marker] if marker is not None else None
+            candidates.extend(candidates_)
+        return candidates
+
+    def marker_id(self, marker: Marker) -> int:
+        """
+        Returns the number of marker (the same in every worker)
+        """
+        id_ = self.marker_ids.get(marker)
+        if id_ is None:
+            id_ = self.marker_ids[marker] = len(self.marker_ids)
+            self.markers_by_id[id_] = marker
+        return id_
+
+    def tiles_near(self, cells: List[Tuple[int, int]]) -> Set[int]:
+        """
+        Returns the tiles near the cells of the marker grid
+        """
+        size = self.world.markers.grid.cell_size
+        tiles = set()
+        for x, y in cells:
+            tiles.update(self.tiling.near(x * size, y * size, (x + 1) * size, (y + 1) * size))
+        return tiles
+
+    def mirror(self, messages: List[tuple], followed: List[Set[Marker]]) -> None:
+        """
+        Adds the changes of the ghost markers and ghost locations of every worker to its message
+        :param messages: one message per worker
+        :param followed: markers which the deers of every worker follow
+        """
+        world = self.world
+        grid = world.markers.grid
+
+        needed: List[Dict[Marker, tuple]] = [{} for _ in self.workers]
+        for marker in world.markers:
+            covered = grid.covered[marker]
+            cached = self.covering.get(marker)
+            if cached is None or cached[0] is not covered:  # the grid replaces the list when the marker changes
+                cached = self.covering[marker] = (covered, self.tiles_near(covered))
+            ghost = (self.marker_id(marker), marker.startpoint, marker.endpoint, marker.direction, grid.order[marker])
+            for tile in cached[1]:
+                needed[tile][marker] = ghost
+        for tile, markers in enumerate(followed):
+            for marker in markers:
+                if marker not in needed[tile]:
+                    needed[tile][marker] = (self.marker_id(marker), marker.startpoint, marker.endpoint,
+                                            marker.direction, grid.order.get(marker))
+
+        locations: List[list] = [[] for _ in self.workers]
+        for location in world.locations:
+            (x, y), radius = location.center, location.radius
+            for tile in self.tiling.near(x - radius, y - radius, x + radius, y + radius):
+                locations[tile].append((location.center, radius * (1 + 1e-9)))  # margin for rounding
+
+        for tile, message in enumerate(messages):
+            mirrored = self.mirrored[tile]
+            message[1].extend(ghost for marker, ghost in needed[tile].items() if mirrored.get(marker) != ghost)
+            message[2].extend(ghost[0] for marker, ghost in mirrored.items() if marker not in needed[tile])
+            if locations[tile] != self.mirrored_locations[tile]:
+                message[3] = locations[tile]
+        self.mirrored = needed
+        self.mirrored_locations = locations
+
+    def move_to_collect(self) -> None:
+        """
+        Movement phase of the collection: the searching deers are moved by the workers of their tiles,
+        the others by the main process in the meantime
+        """
+        world = self.world
+        self.start()
+
+        messages = [[[], [], [], None, [], True] for _ in self.workers]
+        followed: List[Set[Marker]] = [set() for _ in self.workers]
+        others = []
+        for deer in world.deers:
+            tile = self.owner.get(deer)
+            if deer.inactive or deer.resource:
+                others.append(deer)
+                if tile is not None:  # the deer stopped searching
+                    messages[tile][0].append(deer.index)
+                    del self.owner[deer]
+                continue
+            if tile is None:
+                tile = self.owner[deer] = self.tiling.tile(deer.position)
+                messages[tile][4].append((deer.index, deer.position, deer.random_target,
+                                          self.marker_id(deer.marker) if deer.marker else None,
+                                          deer.rng.getstate()))
+            if deer.marker:
+                followed[tile].add(deer.marker)
+        self.mirror(messages, followed)
+
+        for (process, connection), message in zip(self.workers, messages):
+            connection.send(tuple(message))
+        for deer in others:
+            deer.move_to_collect(world.dx, world.santa_house, world.N, world.markers, world.scent)
+        candidates = self.receive()
+
+        if self.state_ == Process_State.collect:  # only the deers inside of a location are hit tested
+            searching = [world.deers[index] for index in candidates]
+            searching.extend(deer for deer in others if not deer.resource)
+            self.candidates = sorted(searching, key=lambda deer_: deer_.index)
+
+    def resolve(self, movement: Optional[str]) -> Process_State:
+        """
+        Last part of a tick (see Engine.resolve), the workers are stopped at the end of the collection
+        """
+        state = super().resolve(movement)
+        if state != Process_State.start and state != Process_State.collect:
+            self.close()
+        return state
@@ -0,0 +1,370 @@
+"""
+Headless simulation engine of the Santa Hunt project.
+The state machine which used to live in main.py is specified here, so that hunts can be simulated
+without PyQt and without being throttled to real time.
+
+Every tick has two phases: first all deers move (each one only sees the markers as they were at the beginning
+of the tick and draws from its own random stream), then everything that touches shared state (picking up
+resources, starting markers, picking distribution paths) is resolved in the order of the deer indices.
+Thus the outcome does not depend on the order (or the process) in which deers are moved. step is split into
+plan_move, move and resolve accordingly, so an Ensemble can move the deers of many worlds at once.
+Authors: Maximilian Janisch, Robert Scherrer, Atsuhiro Funatsu
+"""
+
+__all__ = ("Process_State", "Engine")
+
+from enum import Enum
+from typing import *  # library for type hints
+
+from deer import *
+from geometry import *
+from global_variables import *
+from herd import *
+from logs import *
+
+# with the numpy backend, worlds with at least this many deers find the deers inside of a location in one batch
+# before the hit tests (for fewer deers the batch costs more than it saves)
+BATCH_HIT_TESTS = 64
+
+
+class Process_State(Enum):
+    start = 0
+    collect = 1
+    produce = 2
+    distribute = 3
+    finished = 4
+
+
+class Engine:
+    def __init__(self, world: World, stats=None, backend: str = None, herd: Herd = None):
+        """
+        Initializes the Engine class
+        :param world: the world which gets simulated
+        :param stats: optional Statistics instance which gets updated after every step
+        :param backend: "python" or "numpy" (see Herd), by default the backend from the config file
+        :param herd: Herd to which the deers are attached with the numpy backend (shared by an Ensemble),
+                     by default a new one
+        """
+        self.world = world
+        self.stats = stats
+        self.recorder = None  # optional Replay_Recorder which records every step (see replay.py)
+
+        self.backend = backend or world.backend
+        self.herd: Herd = None
+        if self.backend == "numpy":
+            self.herd = herd if herd is not None else Herd(world.kernels)
+            self.slots = self.herd.attach(world)
+        elif self.backend != "python":
+            raise ValueError(f"Unknown backend {self.backend}")
+        elif herd is not None:
+            raise ValueError("A herd can only be used with the numpy backend")
+
+        self.iter_ = 0  # simulated time in seconds
+        self.state_ = Process_State.start
+        self.collection_time = None  # time at which the collection ended
+
+        # decisions of plan_move for the current tick
+        self.resting: List[Deer] = []  # deers which pick a path after the move
+        self.all_home = False  # True if every deer was at home before going home
+        self.candidates: List[Deer] = None  # deers which may hit a location in this tick, see collect
+
+        # Optional callbacks (used by the GUI). The engine itself never shows anything.
+        self.on_produced: Callable[[World], None] = None  # called after the toys have been produced
+        self.on_finished: Callable[[float], None] = None  # called with the final time once the hunt is over
+
+    def __repr__(self):
+        return f"Engine in state {self.state_.name} at time {self.iter_:.2f}"
+
+    def is_finished(self) -> bool:
+        """
+        Returns True if the hunt is over, else False
+        """
+        return self.state_ == Process_State.finished
+
+    def step(self) -> Process_State:
+        """
+        Advances the simulation by one tick (1 / animation_smoothness seconds)
+        :return: the state after the tick
+        """
+        movement = self.plan_move()
+        if movement:
+            self.move(movement)
+        return self.resolve(movement)
+
+    def plan_move(self) -> Optional[str]:
+        """
+        First part of a tick: decides how the deers move (before any of them moved)
+        :return: "collect", "distribute" or "home" (see move), None if the deers do not move in this tick
+        """
+        world = self.world
+        self.resting = []
+        if self.state_ == Process_State.start or self.state_ == Process_State.collect:
+            return "collect"
+        if self.state_ == Process_State.distribute:
+            if self.must_go_home():  # go home before the kids wake up
+                self.all_home = all(world.santa_house.point_in_square(deer.position) for deer in world.deers)
+                return "home"
+            self.resting = [deer for deer in self.active_deers() if deer.inactive]
+            return "distribute"
+        return None
+
+    def move(self, movement: str) -> None:
+        """
+        Second part of a tick: moves the deers
+        :param movement: the result of plan_move
+        """
+        if movement == "collect":
+            self.move_to_collect()
+        elif movement == "distribute":
+            self.move_to_distribute()
+        else:
+            self.return_to_home()
+
+    def resolve(self, movement: Optional[str]) -> Process_State:
+        """
+        Last part of a tick: resolves everything that touches shared state and advances the time
+        :param movement: the result of plan_move
+        :return: the state after the tick
+        """
+        world = self.world
+
+        if self.state_ == Process_State.start:  # all deers left Santa's house
+            self.commit_markers()
+            self.state_ = Process_State.collect
+
+        elif self.state_ == Process_State.collect:
+            self.collect()
+
+        elif self.state_ == Process_State.produce:
+            self.produce()
+
+        elif self.state_ == Process_State.distribute:
+            self.distribute(movement)
+
+        self.iter_ += 1 / world.animation_smoothness
+        world.gui_time += 1 / world.animation_smoothness
+
+        if self.stats:
+            self.stats.update(self.iter_)
+        if self.recorder:
+            self.record()
+
+        return self.state_
+
+    def record(self) -> None:
+        """
+        Appends the current tick to the replay, which is closed once the hunt is over
+        """
+        self.recorder.record(self.iter_, self.state_.value)
+        if self.state_ == Process_State.finished:
+            self.recorder.close()
+
+    def run_until(self, state: Process_State) -> Process_State:
+        """
+        Steps as fast as possible until the given state (or the end of the hunt) is reached
+        :param state: state to stop at
+        :return: the state which was reached
+        """
+        while self.state_ != state and self.state_ != Process_State.finished:
+            self.step()
+        return self.state_
+
+    def run(self) -> float:
+        """
+        Runs the whole hunt to completion
+        :return: the time at which the hunt finished
+        """
+        self.run_until(Process_State.finished)
+        return self.iter_
+
+    def active_deers(self) -> List[Deer]:
+        """
+        Returns the deers which have to be moved and tested in the current tick (all of them, see Event_Engine)
+        """
+        return self.world.deers
+
+    def move_to_collect(self) -> None:
+        """
+        Movement phase of the collection
+        """
+        world = self.world
+        if self.herd:
+            self.herd.move_to_collect(self.slots)
+        else:
+            for deer in self.active_deers():
+                deer.move_to_collect(world.dx, world.santa_house, world.N, world.markers, world.scent)
+
+    def move_to_distribute(self) -> None:
+        """
+        Movement phase of the distribution
+        """
+        world = self.world
+        if self.herd:
+            self.herd.move_to_distribute(self.slots)
+        else:
+            for deer in self.active_deers():
+                deer.move_to_distribute(world.dx, world.santa_house, world.distribution_paths)
+
+    def return_to_home(self) -> None:
+        """
+        Sends all deers home
+        """
+        world = self.world
+        if self.herd:
+            self.herd.return_to_home(self.slots)
+        else:
+            for deer in world.deers:
+                deer.return_to_home(world.dx, world.santa_house)
+
+    def commit_markers(self) -> None:
+        """
+        Makes the marker changes of the movement phase visible (see Marker.commit), disabled markers are dropped.
+        The scent field (if any) gets the deposits of the tick, evaporates and diffuses.
+        """
+        self.world.markers.commit()
+        if self.world.scent is not None:
+            self.world.scent.commit()
+
+    def collect(self) -> None:
+        """
+        One tick of the collection phase (after the deers moved)
+        """
+        world = self.world
+
+        self.commit_markers()
+
+        # only the deers inside of a location (found in one batch, by an Ensemble for all of its worlds) are hit tested
+        if self.candidates is not None:
+            searching = self.candidates
+        elif self.herd and len(self.slots) >= BATCH_HIT_TESTS:  # deers which carry a resource can not pick up anything
+            slots = self.slots[~self.herd.has_resource[self.slots]]
+            searching = [self.herd.deers[slot] for slot in slots[self.herd.inside_locations(slots)].tolist()]
+        else:
+            searching = self.active_deers()
+        self.candidates = None
+        for deer in searching:
+            self.hit_test(deer)
+
+        if self.iter_ % 1 < (1 / world.animation_smoothness):
+            statelog.debug("Time: %s seconds / Deers: %s / Resources: %s / Markers: %s",
+                           round(self.iter_), tuple(deer.log_state() for deer in world.deers),
+                           tuple((resource.name, resource.collected) for resource in world.resources),
+                           len(world.markers))
+
+        # criteria to end collection (every resource had a location emptied and every deer unloaded)
+        if self.iter_ > world.T or (len(world.tally.emptied_resources) == len(world.resources)
+                                    and world.tally.loaded_deers == 0):
+            enginelog.debug("Collection finished at time %s", self.iter_)
+            self.state_ = Process_State.produce
+            self.collection_time = self.iter_
+            world.markers.clear()  # remove all markers
+            if world.scent is not None:
+                world.scent.clear()
+            if self.stats:
+                self.stats.analyze_collection()
+
+    def hit_test(self, deer: Deer) -> None:
+        """
+        Checks whether a searching deer hit a resource location and lets it load the resource
+        :param deer: the deer to check
+        """
+        world = self.world
+        if deer.resource:  # one deer can not collect multiple Resources at once
+            return
+
+        # checks if the deer hit a natural resource (only the locations in the cell of the deer are tested)
+        location = world.location_grid.hit(deer.position)
+        if location:  # a searching deer hits a resource
+            deer.load_resource(location, world.Lp, world.markers)  # deer loads resource
+            world.tally.pickups += 1
+            world.latest_event = f'Latest event: Deer #{deer.index} collected ' \
+                                 f'\'{location.resource.name}\' (time: {self.iter_:.2f})'
+
+            if location.amount == 0:  # checks if resource location is depleted
+                world.locations.remove(location)
+                world.location_grid.remove(location)
+                world.resources_with_emptied_locations.append(location.resource.name)
+                world.tally.emptied_resources.add(location.resource.name)
+                world.latest_event = f'Latest event: Resource \'{location.resource.name}\' was depleted ' \
+                                     f'by deer #{deer.index} (time: {self.iter_:.2f})'
+            else:
+                world.location_grid.update(location)  # the location shrank
+                if world.scent is not None:  # lay a trail from the location to Santa's house
+                    deer.is_scenting = True
+                    world.scent.deposit(deer.position)
+                elif not world.markers.for_location(location):
+                    world.markers.add(deer.start_marker(location, world.santa_house.center))  # add marker
+
+    def produce(self) -> None:
+        """
+        Produces the toys and plans the distribution
+        """
+        world = self.world
+
+        world.produce_toys()
+        world.calculate_distribution()
+        self.state_ = Process_State.distribute
+        # add time spent to the budget we have
+        world.T_dist += self.iter_
+
+        if self.on_produced:
+            self.on_produced(world)
+
+    def distribute(self, movement: str) -> None:
+        """
+        One tick of the distribution phase (after the deers moved)
+        :param movement: "home" if the deers went home, else "distribute"
+        """
+        world = self.world
+
+        if movement == "home":
+            if self.all_home:
+                self.finish()
+        else:
+            # continue distribution
+            for deer in self.resting:  # paths are handed out in the order of the deer indices
+                deer.pick_path(world.path_pool)
+
+            if abs(self.iter_ % 1 - 0) < (1 / world.animation_smoothness):
+                statelog.debug("Time: %s / Deers: %s / Paths: %s of %s finished", round(self.iter_),
+                               tuple(deer.log_state() for deer in world.deers), world.tally.finished_paths,
+                               len(world.distribution_paths))
+
+            # finish early if the job is done
+            if world.tally.finished_paths == len(world.distribution_paths):
+                # yeah, all paths were followed successfully
+                if world.tally.inactive_deers == len(world.deers):
+                    # the deers are resting
+                    enginelog.debug("Distribution finished by %s deers on %s paths.", len(world.deers),
+                                    len(world.distribution_paths))
+                    self.finish()
+
+        world.tally.farthest_steps += 1  # no deer gets further away from home than dx per tick
+
+    def must_go_home(self) -> bool:
+        """
+        Returns True if the deers have to leave now in order to be home before the kids wake up.
+        The farthest deer is only searched when the upper bound world.tally.farthest_steps says that it is necessary.
+        """
+        world = self.world
+        time_left = world.T_dist - self.iter_
+        if world.tally.farthest_steps is None or time_left <= world.tally.farthest_steps:
+            world.tally.farthest_steps = self.steps_home()
+        return time_left <= world.tally.farthest_steps
+
+    def steps_home(self) -> int:
+        """
+        Returns the number of steps which the farthest deer needs to get home
+        """
+        world = self.world
+        return max(deer.steps_to_destination(world.dx, world.santa_house.center) for deer in world.deers)
+
+    def finish(self) -> None:
+        """
+        Ends the hunt
+        """
+        self.state_ = Process_State.finished
+        if self.stats:
+            self.stats.close()
+        if self.on_finished:
+            self.on_finished(self.iter_)
@@ -0,0 +1,110 @@
+"""
+Lockstep simulation of many independent worlds in one process. The deers of all worlds live in one Herd, so
+every tick moves all of them with one batched call per kind of movement instead of one call per world. Only the
+resolution of each tick (picking up resources, markers, paths, ...) is done world by world, every world has its
+own Engine for that. Small worlds are dominated by the overhead of the interpreter, batching hundreds of them
+amortizes it. The results are the same as the ones of separate Engines with the numpy backend, and thus (as both
+backends square distances alike) as the ones with the python backend; consistency.py checks both.
+NumPy is optional, an Ensemble just can not be created without it.
+Author: Maximilian Janisch
+"""
+
+__all__ = ("Ensemble",)
+
+from typing import *  # library for type hints
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is only needed for the ensemble
+    np = None
+
+from engine import *
+from global_variables import *
+from herd import *
+from logs import *
+
+
+class Ensemble:
+    """
+    Advances many worlds tick by tick in lockstep. Worlds which have finished (or reached the state of
+    run_until) are masked out and do not move anymore.
+    """
+
+    def __init__(self, worlds: Iterable[World], stats: Iterable = None):
+        """
+        Initializes the Ensemble class
+        :param worlds: the worlds which get simulated (their deers are attached to one Herd)
+        :param stats: optional Statistics instance per world (or None), see Engine
+        """
+        worlds = list(worlds)
+        self.herd = Herd(worlds[0].kernels if worlds else "numpy")
+        stats = list(stats) if stats is not None else [None] * len(worlds)
+        self.engines: List[Engine] = [Engine(world, stats_, "numpy", self.herd) for world, stats_ in
+                                      zip(worlds, stats)]
+        enginelog.debug("Created ensemble of %s worlds with %s deers", len(self.engines), len(self.herd))
+
+    def __repr__(self):
+        return f"Ensemble of {len(self.engines)} worlds | {int(self.finished.sum())} finished"
+
+    def __len__(self):
+        return len(self.engines)
+
+    @property
+    def finished(self) -> "np.ndarray":
+        """
+        Mask of the worlds whose hunt is over
+        """
+        return np.array([engine.is_finished() for engine in self.engines], bool)
+
+    @property
+    def worlds(self) -> List[World]:
+        return [engine.world for engine in self.engines]
+
+    def step(self, until: Process_State = Process_State.finished) -> "np.ndarray":
+        """
+        Advances every world which has neither finished nor reached the state until by one tick
+        :param until: worlds in this state are not advanced
+        :return: mask of the worlds which were advanced
+        """
+        advanced = np.array([engine.state_ != until and not engine.is_finished() for engine in self.engines], bool)
+        engines = [engine for engine, running in zip(self.engines, advanced) if running]
+        movements = [engine.plan_move() for engine in engines]
+
+        # one batched move per kind of movement over the deers of all worlds
+        for kind, move in (("collect", self.herd.move_to_collect), ("distribute", self.herd.move_to_distribute),
+                           ("home", self.herd.return_to_home)):
+            slots = [engine.slots for engine, movement in zip(engines, movements) if movement == kind]
+            if slots:
+                move(np.concatenate(slots))
+
+        # the deers which may hit a location are found in one batch as well
+        collecting = [engine for engine in engines if engine.state_ == Process_State.collect]
+        if collecting:
+            slots = np.concatenate([engine.slots for engine in collecting])
+            slots = slots[~self.herd.has_resource[slots]]
+            for engine in collecting:
+                engine.candidates = []
+            for slot in slots[self.herd.inside_locations(slots)].tolist():
+                self.engines[self.herd.world[slot]].candidates.append(self.herd.deers[slot])
+
+        for engine, movement in zip(engines, movements):
+            engine.resolve(movement)
+        return advanced
+
+    def run_until(self, state: Process_State) -> List[Process_State]:
+        """
+        Steps as fast as possible until every world has reached the given state (or the end of its hunt)
+        :param state: state to stop at
+        :return: the state which was reached by every world
+        """
+        while self.step(state).any():
+            pass
+        return [engine.state_ for engine in self.engines]
+
+    def run(self) -> List[float]:
+        """
+        Runs all hunts to completion
+        :return: the time at which every hunt finished
+        """
+        self.run_until(Process_State.finished)
+        return [engine.iter_ for engine in self.engines]
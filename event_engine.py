@@ -0,0 +1,394 @@
+"""
+Discrete-event mode of the headless engine.
+Most ticks of a deer are predictable straight-line moves (returning home, following a marker, walking to the next
+house of a distribution path) or plain waiting in Santa's house. The Event_Engine parks such deers on a "flight",
+computes analytically when something can happen to them (arrival, deposit, toy delivery, reaching a resource,
+end of the rest) and keeps them in a priority queue. Parked deers are not touched until that tick (or until the
+marker they follow changes), and if every deer is parked the clock jumps straight to the next event.
+Random walkers are parked between two targets as well; they are woken when a marker changes across their way.
+Painting and erasing markers still runs tick by tick, as the other deers see every change of a marker.
+With the scent coordination the field changes every tick, so the collection runs tick by tick as well.
+The events are estimated conservatively (a deer is rather woken a tick too early than too late), and the positions
+of parked deers are summed up move by move like the Engine does (only later, when they are needed), so the hunt is
+the same as with the Engine.
+Author: Maximilian Janisch
+"""
+
+__all__ = ("Flight", "Event_Engine")
+
+import heapq
+from math import *
+from typing import *  # library for type hints
+
+from deer import *
+from engine import *
+from geometry import *
+from global_variables import *
+from helper_functions import *
+from spatial_index import *
+
+never = inf  # wake tick of deers which only wait for a change of their marker
+
+
+class Flight:
+    """
+    Straight-line movement (or rest) of a parked deer, starting after the tick in which the deer was parked
+    """
+    __slots__ = ("kind", "tick", "start", "destination", "distance", "direction", "wake", "counter", "moves",
+                 "current")
+
+    def __init__(self, kind: str, tick: int, start: Tuple[float, float], destination: Tuple[float, float],
+                 counter: int = 0):
+        """
+        Initializes the Flight class
+        :param kind: "walk", "home", "marker", "house", "rest" or "wait"
+        :param tick: the tick in which the deer was parked (its last processed tick)
+        :param start: position of the deer after that tick
+        :param destination: point the deer moves towards (start for resting deers)
+        :param counter: inactivity counter of resting deers (see Deer.inactive)
+        """
+        self.kind = kind
+        self.tick = tick
+        self.start = start
+        self.destination = destination
+        self.distance = euclidean_norm((destination[0] - start[0], destination[1] - start[1]))
+        if self.distance:
+            self.direction = ((destination[0] - start[0]) / self.distance, (destination[1] - start[1]) / self.distance)
+        else:
+            self.direction = (0., 0.)
+        self.wake = never  # tick in which the deer is processed normally again
+        self.counter = counter
+        self.moves = 0  # number of moves which were summed up into current
+        self.current = start
+
+    def __repr__(self):
+        return f"Flight \"{self.kind} from {self.start} to {self.destination} | wake at tick {self.wake}\""
+
+    def __lt__(self, other: "Flight") -> bool:  # ties in the queue are already broken by the deer index
+        return False
+
+    def position(self, moves: int, dx: float) -> Tuple[float, float]:
+        """
+        Returns the position after the given number of moves of length dx, summed up move by move exactly like
+        Deer.move_towards does (the moves which were summed up for an earlier call are not repeated)
+        """
+        if moves < self.moves:
+            self.moves, self.current = 0, self.start
+        while self.moves < moves and self.current != self.destination:
+            self.current = step_towards(self.current, self.destination, dx)
+            self.moves += 1
+        return self.current
+
+    def moves_until_square(self, square: Square, dx: float) -> Optional[int]:
+        """
+        Returns a lower bound for the number of moves after which the deer is inside square (slab method),
+        None if the segment misses square
+        """
+        enter, leave = 0., self.distance
+        for axis in (0, 1):
+            low = square.center[axis] - square.size / 2 - self.start[axis]
+            high = square.center[axis] + square.size / 2 - self.start[axis]
+            if self.direction[axis] == 0:
+                if low > 0 or high < 0:
+                    return None
+                continue
+            first, second = sorted((low / self.direction[axis], high / self.direction[axis]))
+            enter, leave = max(enter, first), min(leave, second)
+        if enter > leave:
+            return None
+        return max(floor(enter / dx) - 1, 0)  # one move of slack for rounding
+
+    def moves_until_segment(self, start: Tuple[float, float], end: Tuple[float, float], dx: float) -> Optional[int]:
+        """
+        Returns a lower bound for the number of moves after which the deer crossed the segment (start -> end),
+        None if the flight misses it
+        """
+        if not segments_intersect(self.start, self.destination, start, end):
+            return None
+        denominator = self.direction[0] * (end[1] - start[1]) - self.direction[1] * (end[0] - start[0])
+        if denominator == 0:  # parallel (or a flight without length), the crossing might be right away
+            return 0
+        travelled = orientation(start, end, self.start) / denominator  # distance to the crossing
+        return max(floor(travelled / dx) - 1, 0)
+
+    def moves_until_circle(self, circle: Circle, dx: float) -> Optional[int]:
+        """
+        Returns a lower bound for the number of moves after which the deer is inside circle,
+        None if the segment misses circle
+        """
+        offset = (self.start[0] - circle.center[0], self.start[1] - circle.center[1])
+        b = offset[0] * self.direction[0] + offset[1] * self.direction[1]
+        radius = circle.radius * (1 + 1e-9)
+        discriminant = b * b - (offset[0] ** 2 + offset[1] ** 2 - radius ** 2)
+        if discriminant < 0:
+            return None
+        enter, leave = -b - sqrt(discriminant), -b + sqrt(discriminant)
+        if leave < 0 or enter > self.distance:
+            return None
+        return max(floor(enter / dx) - 1, 0)
+
+
+class Event_Engine(Engine):
+    def __init__(self, world: World, stats=None, backend: str = "python"):
+        """
+        Initializes the Event_Engine class
+        :param world: the world which gets simulated
+        :param stats: optional Statistics instance (only updated at the ticks in which something happens)
+        :param backend: has to be "python", the herd moves all deers in every tick anyway
+        """
+        if backend != "python":
+            raise ValueError(f"The Event_Engine can not be used with the {backend} backend")
+        super().__init__(world, stats, backend)
+
+        self.tick = 0  # number of processed (or skipped) ticks
+        self.flights: Dict[Deer, Flight] = {}  # parked deers
+        self.queue: List[Tuple[float, int, Flight]] = []  # (wake tick, deer index, flight)
+        self.followers: Dict[Marker, Set[Deer]] = {}  # parked deers which follow a marker
+        self.walkers: Dict[Tuple[int, int], Set[Deer]] = {}  # parked random walkers by the cells of their flight
+        self.walker_cells: Dict[Deer, List[Tuple[int, int]]] = {}
+        self.idle: Set[Deer] = set()  # parked resting deers without a marker
+        self.parking = True  # switched off once the deers have to go home before the kids wake up
+        self.awake: List[Deer] = world.deers
+        self.skipped = 0  # number of ticks which were jumped over
+        self.paths_left = False  # True if there are paths which no deer picked yet
+
+    def __repr__(self):
+        return f"Event_Engine in state {self.state_.name} at time {self.iter_:.2f} " \
+               f"with {len(self.flights)} parked deers"
+
+    def active_deers(self) -> List[Deer]:
+        """
+        Returns the deers which are not parked (in the order of their indices)
+        """
+        return self.awake
+
+    def step(self) -> Process_State:
+        """
+        Advances the simulation by one tick, or by all ticks up to the next event if every deer is parked
+        :return: the state after the tick
+        """
+        world = self.world
+        moving = self.state_ in (Process_State.collect, Process_State.distribute)
+
+        if not moving and self.flights:
+            self.wake_all()
+        if moving and self.flights and len(self.flights) == len(world.deers):
+            self.skip()
+
+        while self.queue and self.queue[0][0] <= self.tick:
+            _, index, flight = heapq.heappop(self.queue)
+            if self.flights.get(world.deers[index]) is flight:
+                self.wake(world.deers[index])
+
+        self.awake = [deer for deer in world.deers if deer not in self.flights] if self.flights else world.deers
+        if self.stats:
+            self.sync()
+        state = super().step()
+
+        if self.parking and moving and (state == Process_State.distribute
+                                        or state == Process_State.collect and world.scent is None):
+            self.paths_left = state == Process_State.distribute and bool(world.path_pool)
+            for deer in self.awake:
+                self.park(deer)
+        self.tick += 1
+        return state
+
+    def run(self) -> float:
+        """
+        Runs the whole hunt to completion as fast as possible
+        :return: the time at which the hunt finished
+        """
+        super().run()
+        self.sync()
+        return self.iter_
+
+    def skip(self) -> None:
+        """
+        Jumps over the ticks in which nothing can happen (every deer is parked)
+        """
+        world = self.world
+        target = self.queue[0][0] if self.queue else never
+
+        while self.tick < target:
+            if self.state_ == Process_State.collect and self.iter_ > world.T:
+                break
+            if self.state_ == Process_State.distribute and world.T_dist - self.iter_ <= world.tally.farthest_steps:
+                break  # the deers might have to go home, see Engine.must_go_home
+            self.iter_ += 1 / world.animation_smoothness
+            world.gui_time += 1 / world.animation_smoothness
+            if self.state_ == Process_State.distribute:
+                world.tally.farthest_steps += 1
+            self.tick += 1
+            self.skipped += 1
+
+    def must_go_home(self) -> bool:
+        """
+        Returns True if the deers have to go home (parking ends then, see Engine.must_go_home)
+        """
+        result = super().must_go_home()
+        if result and self.parking:
+            self.wake_all()
+            self.parking = False
+            self.awake = self.world.deers
+        return result
+
+    def steps_home(self) -> int:
+        """
+        Returns the number of steps which the farthest deer needs to get home (parked deers included)
+        """
+        self.sync()
+        return super().steps_home()
+
+    def commit_markers(self) -> None:
+        """
+        Commits the marker changes and wakes the parked deers which are affected by them in the next tick
+        """
+        markers = self.world.markers
+        changed = list(markers.changed)
+        for marker in changed:
+            for deer in self.followers.get(marker, ()):
+                self.schedule(deer, self.tick + 1)
+        super().commit_markers()
+
+        # random walkers whose way crosses a changed marker might follow it
+        for marker in changed:
+            if marker.is_disabled():  # vanishing markers can not be crossed anymore
+                continue
+            walkers = set()
+            for cell in segment_cells(marker.startpoint, marker.endpoint, markers.grid.cell_size):
+                walkers.update(self.walkers.get(cell, ()))
+            for deer in walkers:
+                flight = self.flights[deer]
+                position = flight.position(self.tick - flight.tick, self.world.dx)  # after this tick
+                if segments_intersect(position, flight.destination, marker.startpoint, marker.endpoint):
+                    self.schedule(deer, self.tick + 1)
+        if markers.valid():  # resting deers without a marker pick one as soon as there is one
+            for deer in self.idle:
+                self.schedule(deer, self.tick + 1)
+
+    def schedule(self, deer: Deer, tick: float) -> None:
+        """
+        Lets a parked deer be processed normally again in the given tick
+        """
+        flight = self.flights[deer]
+        if tick < flight.wake:
+            flight.wake = tick
+            heapq.heappush(self.queue, (tick, deer.index, flight))
+
+    def park(self, deer: Deer) -> None:
+        """
+        Parks deer (after its tick was processed) if its next ticks are predictable
+        """
+        world = self.world
+        dx = world.dx
+        flight = None
+        wake = never
+
+        if self.state_ == Process_State.collect:
+            if deer.inactive:
+                if deer.marker or not world.markers.valid():
+                    flight = Flight("rest", self.tick, deer.position, deer.position, deer.inactive)
+                    wake = self.tick + deer.smoothness - deer.inactive  # the rest ends in this tick
+            elif deer.resource:
+                if not (deer.is_painting_marker or deer.is_erasing_marker):
+                    flight = Flight("home", self.tick, deer.position, world.santa_house.center)
+            elif deer.marker:
+                planned_direction = (deer.marker.endpoint[0] - deer.position[0],
+                                     deer.marker.endpoint[1] - deer.position[1])
+                if (planned_direction[0] * deer.marker.direction[0] >= 0) and (
+                        planned_direction[1] * deer.marker.direction[1] >= 0):
+                    flight = Flight("marker", self.tick, deer.position, deer.marker.endpoint)
+            elif deer.random_target:
+                flight = Flight("walk", self.tick, deer.position, deer.random_target)
+
+        else:
+            if deer.inactive:
+                if not self.paths_left:
+                    flight = Flight("wait", self.tick, deer.position, deer.position)  # paths never come back
+            elif deer.resource or not deer.path:
+                flight = Flight("home", self.tick, deer.position, world.santa_house.center)
+            elif not deer.path.is_finished():
+                flight = Flight("house", self.tick, deer.position, deer.path.next_center())
+
+        if not flight:
+            return
+
+        if flight.kind == "home":  # the arrival is checked at the beginning of the following tick
+            moves = flight.moves_until_square(world.santa_house, dx)
+            if moves is None:
+                return
+            wake = self.tick + moves + 1
+        elif flight.kind == "house":  # toys are given right after the move
+            moves = flight.moves_until_square(deer.path.get_next_house(), dx)
+            if moves is None:
+                return
+            wake = self.tick + moves
+        elif flight.kind == "walk":  # a new target is drawn after the arrival, markers are crossed during the move
+            wake = self.tick + floor(flight.distance / dx)
+            for marker in world.markers.grid.query(flight.start, flight.destination):
+                moves = flight.moves_until_segment(marker.startpoint, marker.endpoint, dx)
+                if moves is not None:
+                    wake = min(wake, self.tick + moves)
+        if flight.kind in ("walk", "marker"):  # resources are hit right after the move
+            for location in world.location_grid.along(flight.start, flight.destination):
+                moves = flight.moves_until_circle(location, dx)
+                if moves is not None and location.amount > 0:
+                    wake = min(wake, self.tick + moves)
+
+        if wake <= self.tick + 1:
+            return  # nothing to skip
+
+        self.flights[deer] = flight
+        if flight.kind == "marker":
+            self.followers.setdefault(deer.marker, set()).add(deer)
+        elif flight.kind == "walk":
+            self.walker_cells[deer] = segment_cells(flight.start, flight.destination, world.markers.grid.cell_size)
+            for cell in self.walker_cells[deer]:
+                self.walkers.setdefault(cell, set()).add(deer)
+        elif flight.kind == "rest" and not deer.marker:
+            self.idle.add(deer)
+        self.schedule(deer, wake)
+
+    def wake(self, deer: Deer) -> None:
+        """
+        Puts a parked deer back to where it is at the beginning of the current tick
+        """
+        flight = self.flights.pop(deer)
+        moves = self.tick - flight.tick - 1
+        deer.position = flight.position(moves, self.world.dx)
+        if flight.kind == "rest":
+            deer.inactive = (flight.counter + moves) % deer.smoothness
+            self.idle.discard(deer)
+        elif flight.kind == "marker":
+            self.followers[deer.marker].discard(deer)
+            if not self.followers[deer.marker]:
+                del self.followers[deer.marker]
+        elif flight.kind == "walk":
+            for cell in self.walker_cells.pop(deer):
+                self.walkers[cell].discard(deer)
+                if not self.walkers[cell]:
+                    del self.walkers[cell]
+
+    def wake_all(self) -> None:
+        """
+        Wakes every parked deer
+        """
+        for deer in list(self.flights):
+            self.wake(deer)
+        self.queue.clear()
+
+    def sync(self, end: bool = False) -> None:
+        """
+        Writes the positions of the parked deers at the beginning of the current tick into them
+        (e.g. for the statistics or the GUI)
+        :param end: write the positions at the end of the current tick instead
+        """
+        for deer, flight in self.flights.items():
+            deer.position = flight.position(self.tick - flight.tick - 1 + end, self.world.dx)
+
+    def record(self) -> None:
+        """
+        Records the tick, with the parked deers where they are at its end
+        """
+        self.sync(end=True)
+        super().record()
@@ -1,18 +1,29 @@
 """
 Classes that are responsible mainly for geometry in this project are specified here.
+The batch predicates at the end evaluate many points, shapes or segments against many others in one vectorized
+call and return the index pairs which satisfy the predicate (they need NumPy, the classes do not).
 Authors: Maximilian Janisch, Robert Scherrer, Reetta Välimäki
 """
 
-__all__ = ("Circle", "Square", "Resource", "Location", "House", "Marker")
+__all__ = ("Circle", "Square", "Resource", "Location", "House", "Marker",
+           "points_in_circles", "points_in_squares", "circles_overlap_circles", "circles_overlap_squares",
+           "squares_overlap_squares", "segments_intersect_batch", "segment_pairs")
 
 from math import *
 from typing import *  # library for type hints
 
+try:
+    import numpy as np
+except ImportError:  # NumPy is only needed for the batch predicates
+    np = None
+
 from helper_functions import *
 from logs import *
 
 
 class Resource:
+    __slots__ = ("index", "name", "collected")
+
     def __init__(self, index: int, name: str, collected: int):
         """
         Initializes the Resource class
@@ -29,10 +40,12 @@ class Resource:
 
     def deposit(self, amount: int):
         self.collected += amount
-        mainlog.debug(f"depositing {amount} to {self}")
+        deerlog.debug("depositing %s to %s", amount, self)
 
 
 class Square:
+    __slots__ = ("center", "size")
+
     def __init__(self, center: Tuple[float, float], size: float):
         """
         Initializes the Square class
@@ -42,10 +55,21 @@ class Square:
         self.center = center
         self.size = size
 
-        self.left_boundary = self.center[0] - self.size / 2
-        self.right_boundary = self.center[0] + self.size / 2
-        self.top_boundary = self.center[1] + self.size / 2
-        self.bottom_boundary = self.center[1] - self.size / 2
+    @property
+    def left_boundary(self) -> float:
+        return self.center[0] - self.size / 2
+
+    @property
+    def right_boundary(self) -> float:
+        return self.center[0] + self.size / 2
+
+    @property
+    def top_boundary(self) -> float:
+        return self.center[1] + self.size / 2
+
+    @property
+    def bottom_boundary(self) -> float:
+        return self.center[1] - self.size / 2
 
     def __repr__(self):
         return f"Square with \"center {self.center} | edge length {self.size}\""
@@ -69,6 +93,8 @@ class Square:
 
 
 class Circle:
+    __slots__ = ("center", "radius")
+
     def __init__(self, center: Tuple[float, float], radius: float):
         """
         Initializes the Circle class
@@ -113,6 +139,8 @@ class Circle:
 
 
 class Location(Circle):
+    __slots__ = ("resource", "amount")
+
     def __init__(self, resource: Resource, center: Tuple[float, float], radius: float):
         """
         Initializes the Location class
@@ -140,18 +168,15 @@ class Location(Circle):
 
 
 class House(Square):
-    def __init__(self, center: Tuple[float, float], size: float):
-        """
-        Initializes the House class
-        :param center: center of the house
-        :param size: size of the house (square form)
-        :arg euler angle between the santa house an the kids house
-        """
-        super().__init__(center, size)
-        self.angle = None
+    """
+    Santa's house or the house of a kid (see tables.House_Table for many houses)
+    """
+    __slots__ = ()
 
 
 class Marker:
+    __slots__ = ("location", "endpoint", "startpoint", "direction", "is_complete", "is_erasing", "pending", "registry")
+
     def __init__(self, location: Location, direction: Tuple[float, float]):
         """
         Initializes the Marker class
@@ -162,6 +187,10 @@ class Marker:
         self.endpoint = location.center  # where the marker will be drawn to
         self.startpoint = self.endpoint  # where the maker ends, start without length
         self.direction = direction  # tells the deers in which direction to follow
+        self.is_complete = False  # True once the marker reaches Santa's house
+        self.is_erasing = False
+        self.pending: Dict[str, Any] = {}  # changes which become visible to the other deers with the next commit
+        self.registry = None  # Marker_Registry which gets notified about pending changes
 
     def __repr__(self):
         return f"Marker starting at {self.startpoint} associated with {self.location}"
@@ -172,33 +201,238 @@ class Marker:
         Checks if a deer traversed this marker while going from old_pos to new_pos
         :param old_pos: Old position of the deer
         :param new_pos: New position of the deer
-        :return: True if the segments (old_pos -> new_pos) and (startpoint -> location.center) intersect, else False
+        :return: True if the segments (old_pos -> new_pos) and (startpoint -> endpoint) intersect, else False
         """
+        return segments_intersect(old_pos, new_pos, self.startpoint, self.endpoint)
 
-        def almost_on_segment(point: Tuple[float, float]):
-            """
-            Checks whether point is __almost__ on the segment from self.startpoint to self.endpoint
-            :param point: Point to check
-            :return:
-            """
-            return euclidean_norm((point[0] - self.startpoint[0], point[1] - self.startpoint[1])) \
-                   + euclidean_norm((point[0] - self.endpoint[0], point[1] - self.endpoint[1])) \
-                   <= euclidean_norm((self.endpoint[0] - self.startpoint[0], self.endpoint[1] - self.startpoint[1])) \
-                   + 0.2  # tolerance
+    @property
+    def state(self) -> str:
+        """
+        Returns "disabled", "erasing", "complete" or "painting"
+        """
+        if self.is_disabled():
+            return "disabled"
+        if self.is_erasing:
+            return "erasing"
+        return "complete" if self.is_complete else "painting"
 
-        return almost_on_segment(old_pos) and almost_on_segment(new_pos)
+    def change(self, **changes):
+        """
+        Registers changes of attributes which become visible with the next commit
+        """
+        self.pending.update(changes)
+        if self.registry is not None:
+            self.registry.changed[self] = None
+
+    def set_startpoint(self, point: Tuple[float, float]):
+        """
+        Moves the startpoint of the marker (visible after the next commit)
+        :param point: new startpoint
+        """
+        self.change(startpoint=point)
+
+    def set_endpoint(self, point: Tuple[float, float]):
+        """
+        Moves the endpoint of the marker (visible after the next commit)
+        :param point: new endpoint
+        """
+        self.change(endpoint=point)
+
+    def complete(self, home: Tuple[float, float]):
+        """
+        Connects the marker to Santa's house (visible after the next commit)
+        :param home: center of Santa's house
+        """
+        self.change(startpoint=home, is_complete=True)
+
+    def start_erasing(self):
+        """
+        Marks the marker as being erased (visible after the next commit)
+        """
+        self.change(is_erasing=True)
+
+    def commit(self) -> bool:
+        """
+        Makes the pending changes visible. The Engine commits all markers once every deer has moved, so that
+        all deers see the same markers during a tick, no matter in which order they are updated.
+        :return: True if something changed, else False
+        """
+        if not self.pending:
+            return False
+        for attribute, value in self.pending.items():
+            setattr(self, attribute, value)
+        self.pending = {}
+        return True
 
     def disable(self):
         """
-        moves the marker out of the way
+        moves the marker out of the way (visible after the next commit)
         future implementations could  implement a garbage collection
         """
-        self.startpoint = (-1, -1)
-        self.endpoint = (-1, -1)
-        self.location = None
+        self.change(startpoint=(-1, -1), endpoint=(-1, -1), location=None)
 
     def is_disabled(self):
         """
         returns false after call to disable
         """
         return not self.location
+
+
+# region batch predicates
+Pairs = Tuple["np.ndarray", "np.ndarray"]  # (indices into the first argument, indices into the second argument)
+block_size = 1 << 20  # maximal number of pairs which are evaluated at once (bounds the memory of the predicates)
+
+
+def _as_points(points: Any) -> "np.ndarray":
+    """
+    Converts a sequence of 2-tuples (or an array of shape (n, 2)) into a float array of shape (n, 2)
+    """
+    if np is None:
+        raise ImportError("The batch predicates of geometry.py need NumPy")
+    return np.asarray(points, dtype=float).reshape(-1, 2)
+
+
+def _euclidean_norm(difference: "np.ndarray") -> "np.ndarray":
+    """
+    euclidean_norm over the last axis of difference, squared by multiplication exactly like euclidean_norm
+    """
+    x, y = difference[..., 0], difference[..., 1]
+    return np.sqrt(x * x + y * y)
+
+
+def _pairs(rows: int, columns: int, predicate: Callable[[slice], "np.ndarray"]) -> Pairs:
+    """
+    Evaluates predicate for all pairs in blocks of rows
+    :param rows: length of the first argument
+    :param columns: length of the second argument
+    :param predicate: returns the boolean matrix (rows of the block x columns) for a slice of the rows
+    :return: the pairs for which predicate is True, ordered by the first and then by the second index
+    """
+    step = max(block_size // max(columns, 1), 1)
+    firsts, seconds = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+    for start in range(0, rows, step):
+        first, second = predicate(slice(start, min(start + step, rows))).nonzero()
+        firsts.append(first + start)
+        seconds.append(second)
+    return np.concatenate(firsts), np.concatenate(seconds)
+
+
+def points_in_circles(points: Any, centers: Any, radii: Any) -> Pairs:
+    """
+    Batched Circle.point_in_circle
+    :param points: n points
+    :param centers: centers of m circles
+    :param radii: radii of the m circles
+    :return: pairs (point, circle) of the points which lie in the circles
+    """
+    points, centers, radii = _as_points(points), _as_points(centers), np.asarray(radii, dtype=float)
+
+    def predicate(block: slice) -> "np.ndarray":
+        difference = centers[None, :, :] - points[block, None, :]
+        return _euclidean_norm(difference) <= radii[None, :]
+
+    return _pairs(len(points), len(centers), predicate)
+
+
+def points_in_squares(points: Any, centers: Any, sizes: Any) -> Pairs:
+    """
+    Batched Square.point_in_square
+    :param points: n points
+    :param centers: centers of m squares
+    :param sizes: edge lengths of the m squares
+    :return: pairs (point, square) of the points which lie in the squares
+    """
+    points, centers, sizes = _as_points(points), _as_points(centers), np.asarray(sizes, dtype=float)
+
+    def predicate(block: slice) -> "np.ndarray":
+        difference = np.abs(points[block, None, :] - centers[None, :, :])
+        return np.maximum(difference[:, :, 0], difference[:, :, 1]) <= sizes[None, :] / 2
+
+    return _pairs(len(points), len(centers), predicate)
+
+
+def circles_overlap_circles(centers: Any, radii: Any, other_centers: Any, other_radii: Any) -> Pairs:
+    """
+    Batched Circle.overlap_circle
+    :return: pairs (circle, other circle) of the overlapping circles
+    """
+    centers, radii = _as_points(centers), np.asarray(radii, dtype=float)
+    other_centers, other_radii = _as_points(other_centers), np.asarray(other_radii, dtype=float)
+
+    def predicate(block: slice) -> "np.ndarray":
+        difference = centers[block, None, :] - other_centers[None, :, :]
+        return _euclidean_norm(difference) <= radii[block, None] + other_radii[None, :]
+
+    return _pairs(len(centers), len(other_centers), predicate)
+
+
+def circles_overlap_squares(centers: Any, radii: Any, square_centers: Any, sizes: Any) -> Pairs:
+    """
+    Batched Circle.overlap_square
+    :return: pairs (circle, square) of the circles which overlap the squares
+    """
+    centers, radii = _as_points(centers), np.asarray(radii, dtype=float)
+    square_centers, half = _as_points(square_centers), np.asarray(sizes, dtype=float) / 2
+    low, high = square_centers - half[:, None], square_centers + half[:, None]
+
+    def predicate(block: slice) -> "np.ndarray":
+        # the point of each square which is closest to the center of the circle (the "Fusspunkt")
+        closest = np.minimum(high[None, :, :], np.maximum(low[None, :, :], centers[block, None, :]))
+        difference = centers[block, None, :] - closest
+        return _euclidean_norm(difference) <= radii[block, None]
+
+    return _pairs(len(centers), len(square_centers), predicate)
+
+
+def squares_overlap_squares(centers: Any, sizes: Any, other_centers: Any, other_sizes: Any) -> Pairs:
+    """
+    Batched Square.overlap_square
+    :return: pairs (square, other square) of the overlapping squares
+    """
+    centers, sizes = _as_points(centers), np.asarray(sizes, dtype=float)
+    other_centers, other_sizes = _as_points(other_centers), np.asarray(other_sizes, dtype=float)
+
+    def predicate(block: slice) -> "np.ndarray":
+        difference = np.abs(centers[block, None, :] - other_centers[None, :, :])
+        return np.maximum(difference[:, :, 0], difference[:, :, 1]) <= (sizes[block, None] + other_sizes[None, :]) / 2
+
+    return _pairs(len(centers), len(other_centers), predicate)
+
+
+def segments_intersect_batch(p1: "np.ndarray", p2: "np.ndarray", q1: "np.ndarray", q2: "np.ndarray") -> "np.ndarray":
+    """
+    Row-wise segments_intersect (see helper_functions): element i tells whether the segments (p1[i] -> p2[i]) and
+    (q1[i] -> q2[i]) intersect. The arguments may have any number of leading dimensions, the last one is x, y.
+    """
+    def orientation_(p, q, r):
+        return (q[..., 0] - p[..., 0]) * (r[..., 1] - p[..., 1]) - (q[..., 1] - p[..., 1]) * (r[..., 0] - p[..., 0])
+
+    def in_box(a, b, point):
+        x, y = point[..., 0], point[..., 1]
+        return (np.minimum(a[..., 0], b[..., 0]) <= x) & (x <= np.maximum(a[..., 0], b[..., 0])) \
+            & (np.minimum(a[..., 1], b[..., 1]) <= y) & (y <= np.maximum(a[..., 1], b[..., 1]))
+
+    d1 = orientation_(q1, q2, p1)
+    d2 = orientation_(q1, q2, p2)
+    d3 = orientation_(p1, p2, q1)
+    d4 = orientation_(p1, p2, q2)
+    proper = (((d1 > 0) & (d2 < 0)) | ((d1 < 0) & (d2 > 0))) & (((d3 > 0) & (d4 < 0)) | ((d3 < 0) & (d4 > 0)))
+    return proper | ((d1 == 0) & in_box(q1, q2, p1)) | ((d2 == 0) & in_box(q1, q2, p2)) \
+        | ((d3 == 0) & in_box(p1, p2, q1)) | ((d4 == 0) & in_box(p1, p2, q2))
+
+
+def segment_pairs(starts: Any, ends: Any, other_starts: Any, other_ends: Any) -> Pairs:
+    """
+    Batched Marker.line_touch: tests every segment (starts[i] -> ends[i]) against every other segment
+    (other_starts[j] -> other_ends[j]), e.g. the moves of all deers against all markers
+    :return: pairs (segment, other segment) of the intersecting segments
+    """
+    starts, ends = _as_points(starts), _as_points(ends)
+    other_starts, other_ends = _as_points(other_starts), _as_points(other_ends)
+
+    def predicate(block: slice) -> "np.ndarray":
+        return segments_intersect_batch(starts[block, None, :], ends[block, None, :],
+                                        other_starts[None, :, :], other_ends[None, :, :])
+
+    return _pairs(len(starts), len(other_starts), predicate)
+# endregion
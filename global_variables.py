@@ -7,7 +7,8 @@ __all__ = ("World",)
 
 import configparser
 import os
-import random
+from array import array
+from math import *
 from typing import *
 
 from geometry import *
@@ -15,28 +16,51 @@ from distribution_classes import *
 from deer import *
 from helper_functions import *
 from logs import *
+from marker_registry import *
+from random_streams import *
+from production import *
+from route_planner import *
+from scent_field import *
+from spatial_index import *
+from tables import *
+from tally import *
+
+circle_packing_density = pi / (2 * sqrt(3))  # no arrangement of circles covers more of the plane
+max_placement_attempts = 100000  # candidates per location or house before the world counts as too crowded
 
 
 class World:
-    def __init__(self, file):
+    def __init__(self, file, overrides: Dict[str, Any] = None, seed: int = None):
         """
         Reads the configuration file
         :param file: path to the file config file
+        :param overrides: optional values which replace the ones in the config file,
+                          e.g. {"P": 4, "K": 20, "dx": 2, "Lp": 5, "D": 6, "T": 80}
+        :param seed: master seed of the run, see Random_Streams (random if None)
         """
         # region Read Config
         if not os.path.isfile(file):
-            mainlog.warn(f"Error while reading configuration: {file} is not a valid file path")
+            worldlog.warning("Error while reading configuration: %s is not a valid file path", file)
 
         config = configparser.ConfigParser()
         config.read(file)
+        overrides = overrides or {}
+        self.config_file = file
+        self.overrides = dict(overrides)  # kept for snapshots, which generate the world again
+
+        def setting(section: str, key: str):
+            """
+            Returns the overridden value of key if there is one, else the value from the config file
+            """
+            return overrides[key] if key in overrides else eval(config[section][key])
 
         self.animation_smoothness = eval(config['GUI']['smoothness'])
         self.colours = eval(config['GUI']['Resource_Colours'])
 
-        self.N = eval(config["General"]["N"])
-        self.P = eval(config["General"]["P"])
-        self.K = eval(config["General"]["K"])
-        self.kids_house_size = eval(config["General"]["kids_house_size"])
+        self.N = setting("General", "N")
+        self.P = setting("General", "P")
+        self.K = setting("General", "K")
+        self.kids_house_size = setting("General", "kids_house_size")
         if self.kids_house_size == -1:
             self.kids_house_size = self.N / 40
 
@@ -56,11 +80,22 @@ class World:
         self.max_resources = eval(config["General"]["maximum_locations_per_resource"])
         self.min_resources = eval(config["General"]["minimum_locations_per_resource"])
 
-        self.dx = eval(config["Deers"]["dx"])/self.animation_smoothness
-        self.Lp = eval(config["Deers"]["Lp"])
+        self.dx = setting("Deers", "dx")/self.animation_smoothness
+        self.Lp = setting("Deers", "Lp")
+        self.backend = setting("Deers", "backend")
+        self.kernels = setting("Deers", "kernels")
+        self.coordination = setting("Deers", "coordination")
+        self.tiles = setting("Domain", "tiles")
+
+        self.production_policy = setting("Production", "policy")
 
-        mainlog.info("-" * 40)
-        mainlog.info(f"Loaded all variables from {file}")
+        self.planner = setting("Distribution", "planner")
+        self.capacity = setting("Distribution", "capacity")
+        self.time_budget = setting("Distribution", "time_budget")
+        self.scheduler = setting("Distribution", "scheduler")
+
+        worldlog.info("-" * 40)
+        worldlog.info("Loaded all variables from %s", file)
         # endregion
 
         # region GUI
@@ -70,19 +105,35 @@ class World:
         self.happy_kids_list = [] # used for 'latest event' in GUI
         # endregion
 
-        self.markers: List[Marker] = []
+        self.markers = Marker_Registry(2 * self.max_radius)
+        self.scent: Optional[Scent_Field] = None  # replaces the markers if coordination is 'scent'
+        if self.coordination == "scent":
+            self.scent = Scent_Field(self.N, setting("Scent", "resolution"), setting("Scent", "evaporation"),
+                                     setting("Scent", "diffusion"), setting("Scent", "threshold"),
+                                     self.animation_smoothness)
+        elif self.coordination != "markers":
+            raise ValueError(f"Unknown coordination {self.coordination}, use 'markers' or 'scent'")
         self.resources_with_emptied_locations = []
+        self.tally = Tally()  # counters which tell the engine when a phase is over
 
         # region Initialize pseudo-random
-        self.D = random.randint(self.min_deers, self.max_deers)  # amount of deers
-        self.T = random.randint(self.min_time, self.max_time)  # provided time for collection
+        self.random_streams = Random_Streams(seed)
+        self.seed = self.random_streams.seed
+        self.rng = self.random_streams.world  # stream for the generation of the world
+        worldlog.info("Master seed: %s", self.seed)
+
+        # D and T are always drawn, so that overriding them does not shift the later draws of the world stream
+        drawn_D = self.rng.randint(self.min_deers, self.max_deers)
+        drawn_T = self.rng.randint(self.min_time, self.max_time)
+        self.D = overrides.get("D", drawn_D)  # amount of deers
+        self.T = overrides.get("T", drawn_T)  # provided time for collection
         self.T_dist = 1000  # time for distribution
-        self.santa_house: House = House(random_tuple(self.N / 20, self.N * 19 / 20), self.N / 20)
-        mainlog.debug(f"Generated Santa's house at {self.santa_house.center}")
+        self.santa_house: House = House(random_tuple(self.N / 20, self.N * 19 / 20, self.rng), self.N / 20)
+        worldlog.debug("Generated Santa's house at %s", self.santa_house.center)
         # endregion
 
         # region Generating Resources
-        resources = sorted(random.sample(self.resource_names, self.P))  # Pseudo-randomly choose P resources
+        resources = sorted(self.rng.sample(self.resource_names, self.P))  # Pseudo-randomly choose P resources
         self.resources = []
         for i in range(len(resources)):
             self.resources.append(Resource(i, resources[i], 0))
@@ -91,21 +142,28 @@ class World:
         # region Generating Toy types
         self.toy_types = []
         for i, name in enumerate(self.toy_names):
-            self.toy_types.append(Toy_Type(i, self.resources, name))
+            self.toy_types.append(Toy_Type(i, self.resources, name, self.rng))
         self.toy_types.sort(reverse=True)
         # endregion
 
         # region Generating Locations
+        self.check_density()
+        # locations and houses which were placed so far, by the cells of their bounding boxes
+        self.placement_grid = Placement_Grid(2 * max(self.max_radius, self.kids_house_size / 2))
         self.locations: List[Location] = self.create_locations()
+        self.location_grid = Location_Grid(2 * self.max_radius, self.locations)  # used for the hit tests of the deers
 
         # region Generating kids' houses
+        self.house_table = House_Table()  # the kids and their houses are stored in tables (see tables.py)
         self.kids_houses = self.create_kids_houses()
 
         # region Generating Kids
-        self.kids = []
+        self.kid_table = Kid_Table(self.house_table)
         for i, house in enumerate(self.kids_houses):
-            self.kids.append(Kid(i, self.kid_names[random.randint(1, len(self.kid_names) - 1)], house))
-        self.kids.sort(reverse=True)
+            self.kid_table.add(i, self.kid_names[self.rng.randint(1, len(self.kid_names) - 1)], house, self.rng)
+        # rows of the kids, the best graded first (a stable sort like sorting the kids themselves)
+        self.kids = array("q", sorted(range(self.K), key=self.kid_table.kid_grade.__getitem__, reverse=True))
+        self.placement_grid = None  # only needed while placing, it holds a proxy of every house
         # endregion
 
         # region initializing empty Toys list for later use in production
@@ -113,12 +171,48 @@ class World:
         # endregion
 
         # region Deers
-        self.deers: List[Deer] = [Deer(i, self.santa_house.center, self.animation_smoothness)
+        self.deers: List[Deer] = [Deer(i, self.santa_house.center, self.animation_smoothness,
+                                       self.random_streams.deer(i), self.tally)
                                   for i in range(self.D)]  # initialize deers
-        mainlog.info(f"{self.D} deers have {self.T} seconds to collect the resources")
+        worldlog.info("%s deers have %s seconds to collect the resources", self.D, self.T)
         # endregion
 
         self.distribution_paths = []
+        self.path_pool = Path_Pool(self.distribution_paths)  # paths which no deer has picked yet
+        self.planned_makespan: Optional[float] = None  # ticks the distribution takes according to the scheduler
+
+    def check_density(self) -> None:
+        """
+        Raises a ValueError if the locations and houses can certainly not be placed without overlapping
+        (even their smallest possible areas do not fit into the world with the densest packing)
+        """
+        circles = self.P * self.min_resources * pi * self.min_radius ** 2
+        squares = self.K * self.kids_house_size ** 2 + self.santa_house.size ** 2
+        space = (self.N + self.kids_house_size) ** 2  # kids' houses may stick out of the world a bit
+        if circles / circle_packing_density + squares > space:
+            raise ValueError(f"The world is too crowded: {self.P} resources with at least {self.min_resources} "
+                             f"locations of radius {self.min_radius} and {self.K} houses of size "
+                             f"{self.kids_house_size} do not fit into a world of size {self.N}")
+
+    def place(self, create: Callable[[], Any], extent: float, collides: Callable[[Any], bool],
+              keep: Callable[[Any], Any] = None) -> Any:
+        """
+        Rejection sampling: draws candidates until one does not collide and adds it to self.placement_grid
+        :param create: draws a candidate
+        :param extent: half edge length of the bounding box of the candidates
+        :param collides: returns True if a candidate collides with something
+        :param keep: optionally converts the placed candidate into the object which is kept (e.g. a row of a table)
+        :return: the placed candidate
+        """
+        for attempt in range(max_placement_attempts):
+            candidate = create()
+            if not collides(candidate):
+                if keep:
+                    candidate = keep(candidate)
+                self.placement_grid.add(candidate, extent)
+                return candidate
+        raise ValueError(f"Could not place {candidate} after {max_placement_attempts} attempts, the world is too "
+                         f"crowded (decrease P, K or the sizes, or increase N)")
 
     def create_locations(self) -> List[Location]:
         """
@@ -127,85 +221,67 @@ class World:
         result: List[Location] = []
         for i in range(self.P):
             # Generates pseudo-random location for each resource, assuring that no locations overlap
-            radius: float = random.uniform(self.min_radius, self.max_radius)
+            radius: float = self.rng.uniform(self.min_radius, self.max_radius)
 
-            amount = random.randint(self.min_resources, self.max_resources)
+            amount = self.rng.randint(self.min_resources, self.max_resources)
             for iter__ in range(amount):
-                new_location = Location(self.resources[i], random_tuple(radius, self.N - radius), radius)
-                collision: bool = new_location.overlap_square(self.santa_house) \
-                                  or any(new_location.overlap_circle(location) for location in result)
-                while collision:
-                    new_location = Location(self.resources[i], random_tuple(radius, self.N - radius), radius)
-                    if new_location.overlap_square(self.santa_house) \
-                            or any(new_location.overlap_circle(location) for location in result):
-                        # collision detection with Santa's house and previous locations
-                        continue
-                    break
-                result.append(new_location)
-        mainlog.debug(f"Generated {self.P} resources at the locations {result}")
+                result.append(self.place(
+                    lambda: Location(self.resources[i], random_tuple(radius, self.N - radius, self.rng), radius),
+                    radius,
+                    # collision detection with Santa's house and the neighbouring previous locations
+                    lambda location: location.overlap_square(self.santa_house)
+                    or any(location.overlap_circle(other) for other in self.placement_grid.near(location.center,
+                                                                                                radius))))
+        worldlog.debug("Generated %s resources at the locations %s", self.P, result)
         return result
 
-    def create_kids_houses(self) -> List[House]:
+    def create_kids_houses(self) -> array:
         """
-        Generating the kids houses
+        Generating the kids houses, returns their row indices in self.house_table
         """
-        result: List[House] = []
+        result = array("q")
+        extent = self.kids_house_size / 2
         for i in range(self.K):
             # Locations for each kid's house, assuring that nothing overlaps
-            kids_house = House(random_tuple(self.N / 80, self.N * 79 / 80), self.kids_house_size)
-
-            collision: bool = kids_house.overlap_square(self.santa_house) \
-                              or any(location.overlap_square(kids_house) for location in self.locations) \
-                              or any(house.overlap_square(kids_house) for house in result)
-
-            while collision:
-                kids_house = House(random_tuple(self.N / 80, self.N * 79 / 80), self.kids_house_size)
-                if kids_house.overlap_square(self.santa_house) \
-                        or any(location.overlap_square(kids_house) for location in self.locations) \
-                        or any(house.overlap_square(kids_house) for house in result):
-                    # collision detection with Santa's house, with circles and previous kids_houses
-                    continue
-                break
-            result.append(kids_house)
-
-        mainlog.debug(f"Generated {self.K} kids houses: {result}")
+            result.append(self.place(
+                lambda: House(random_tuple(self.N / 80, self.N * 79 / 80, self.rng), self.kids_house_size),
+                extent,
+                # collision detection with Santa's house and the neighbouring locations and previous kids_houses
+                # (Location.overlap_square and House.overlap_square both take a square)
+                lambda house: house.overlap_square(self.santa_house)
+                or any(other.overlap_square(house) for other in self.placement_grid.near(house.center, extent)),
+                lambda house: self.house_table.add(house.center, house.size)).row)
+
+        worldlog.debug("Generated %s kids houses in %s", self.K, self.house_table)
         return result
 
     def calculate_distribution(self) -> None:
         """
         takes all kids in the world and assigns them to a list of distribution
         paths that the deers can follow to distribute the toys
-        As a deer can load max 3 toys, there should be max 3 kids per path
+        A deer can load self.capacity toys and should manage a path within self.time_budget seconds (see route_planner)
         """
-        lucky_kids = [i for i in self.kids if i.toy]  # kids that will receive toys
-
-        lucky_kids_chunks = [[]]
-        while lucky_kids:
-            if len(lucky_kids_chunks[-1]) == 3:
-                lucky_kids_chunks.append([])
-            elif len(lucky_kids_chunks[-1]) > 0:
-                kid_minimal_distance_index = 0
-                for i in range(1, len(lucky_kids)):
-                    kid = lucky_kids[i]
-                    if euclidean_norm(
-                            (kid.house.center[0] - lucky_kids_chunks[-1][-1].house.center[0],
-                             kid.house.center[1] - lucky_kids_chunks[-1][-1].house.center[1]
-                             )) <= euclidean_norm(
-                            (lucky_kids[kid_minimal_distance_index].house.center[0] - lucky_kids_chunks[-1][-1].house.center[0],
-                             lucky_kids[kid_minimal_distance_index].house.center[1] - lucky_kids_chunks[-1][-1].house.center[1]
-                             )):
-                        kid_minimal_distance_index = i
-
-                lucky_kids_chunks[-1].append(lucky_kids.pop(kid_minimal_distance_index))
-
-            else:  # lucky_kids last chunk is empty
-                lucky_kids_chunks[-1].append(lucky_kids[0])
-                lucky_kids.pop(0)
-
-        for each in lucky_kids_chunks:
-            self.distribution_paths.append(Distribution_Path(each))
-
-        mainlog.debug(f"Planned {len(self.distribution_paths)} paths for {self.D} deers to distribute to {len(lucky_kids)} Kids")
+        toys, house, houses = self.kid_table.toy, self.kid_table.house, self.house_table
+        lucky_kids = [row for row in self.kids if toys[row]]  # rows of the kids that will receive toys
+
+        max_length = self.time_budget * self.dx * self.animation_smoothness  # distance flown in time_budget seconds
+        routes = plan_routes([(houses.x[house[row]], houses.y[house[row]]) for row in lucky_kids],
+                             self.santa_house.center, self.planner, self.capacity, max_length)
+        for route in routes:
+            self.distribution_paths.append(Kid_Path(self.kid_table, [lucky_kids[index] for index in route]))
+        self.tally.finished_paths = sum(1 for path in self.distribution_paths if path.is_finished())
+        if self.scheduler == "lpt":
+            self.path_pool = Path_Scheduler(self.distribution_paths, self.santa_house.center, self.dx)
+            self.planned_makespan = self.path_pool.makespan(
+                [deer.steps_to_destination(self.dx, self.santa_house.center) for deer in self.deers])
+            worldlog.debug("Planned makespan of the distribution: %s ticks", ceil(self.planned_makespan))
+        elif self.scheduler == "random":
+            self.path_pool = Path_Pool(self.distribution_paths)
+        else:
+            raise ValueError(f"Unknown scheduler {self.scheduler}, use 'random' or 'lpt'")
+
+        worldlog.debug("Planned %s paths for %s deers to distribute to %s Kids", len(self.distribution_paths), self.D,
+                       len(lucky_kids))
 
     def produce_toys(self) -> None:
         """
@@ -213,31 +289,20 @@ class World:
         in order of the toys value (i.e. rank)
 
         After the resource collection, the toys will be produced according the grading
+        Which toys are built decides self.production_policy (see production)
         """
         # build toys
-        depleted_toy_names = []
-        while len(depleted_toy_names) < len(self.toy_types):
-            toy_type = random.choice(self.toy_types)
-
-            while toy_type.toy_name in depleted_toy_names:
-                toy_type = random.choice(self.toy_types)
-
-            enough = True
-            for r in self.resources:
-                demand = toy_type.resource_list.count(r)
-                supply = r.collected
-                if demand > supply:
-                    # checks whether the number for collected resources is > 0
-                    enough = False
-                    if toy_type.toy_name not in depleted_toy_names:
-                        depleted_toy_names.append(toy_type.toy_name)
-            if enough:
-                self.toys.append(Toy(toy_type))
-                mainlog.debug("Produced toy {}".format(toy_type.toy_name))
+        produced: Dict[str, int] = {}
+        for toy_type in plan_production(self.toy_types, self.resources, self.production_policy,
+                                        self.random_streams.production):
+            self.toys.append(Toy(toy_type))
+            produced[toy_type.toy_name] = produced.get(toy_type.toy_name, 0) + 1
+        for toy_name, amount in produced.items():
+            worldlog.debug("Produced %s toys %s", amount, toy_name)
 
         # After the production of toys they will be assigned to the kids
         number_to_distribute = min(len(self.kids), len(self.toys))
-        mainlog.debug("{} Toys and {} Kids".format(len(self.toys), len(self.kids)))
+        worldlog.debug("%s Toys and %s Kids", len(self.toys), len(self.kids))
         for i in range(number_to_distribute):
-            self.kids[i].assign_toy(self.toys[i])
-            mainlog.debug("Kid {} will get toy {}".format(self.kids[i].name, self.toys[i].toy_type.toy_name))
+            self.kid_table.toy[self.kids[i]] = self.toys[i]  # Kid.assign_toy
+            worldlog.debug("Kid %s will get toy %s", self.kid_table.name[self.kids[i]], self.toys[i].toy_type.toy_name)
@@ -4,17 +4,32 @@ Authors: Atsuhiro Funatsu, Maximilian Janisch
 """
 
 import random
+from math import pi, sqrt
 
 import PyQt5.Qt
 import PyQt5.QtGui
 import PyQt5.QtWidgets
 from PyQt5 import QtCore
 
+from clock import SPEEDS
+from replay import DISTRIBUTING, LOADED
+
 
 class Santa_GUI(PyQt5.QtWidgets.QMainWindow):
 
-    def __init__(self, world):
-        """Initialises the class 'Santa_GUI'."""
+    def __init__(self, world, replay=None, clock=None):
+        """Initialises the class 'Santa_GUI'.
+
+        Args:
+            world: An instance of the class 'World', describing the world.
+                May be None in playback mode.
+            replay: An instance of the class 'Replay' (see replay.py). If it
+                is given, the GUI plays the recorded hunt instead of showing
+                the world.
+            clock: An instance of the class 'Frame_Clock' (see clock.py)
+                which drives the simulation. If it is given, the GUI shows
+                buttons to change the speed of the simulation.
+        """
 
         super().__init__()
 
@@ -22,6 +37,26 @@ class Santa_GUI(PyQt5.QtWidgets.QMainWindow):
         self.resize(800, 920)
 
         self.world = world
+        self.replay = replay
+        self.clock = clock
+
+        # the parts of the map which rarely change are rendered to pixmaps,
+        # see update_static_layers()
+        self.invalidate()
+
+        # pens and brushes, precomputed per resource
+        colours = world.colours if world is not None else {}
+        self.location_brushes = {
+            name: PyQt5.QtGui.QBrush(PyQt5.Qt.QColor(*colour[:3]))
+            for name, colour in colours.items()}
+        self.marker_pens = {
+            name: PyQt5.QtGui.QPen(PyQt5.QtGui.QColor(*colour[:3], 51), 5)
+            for name, colour in colours.items()}
+        self.default_marker_pen = PyQt5.QtGui.QPen(
+            PyQt5.QtGui.QColor(0, 0, 0), 5)
+        self.santa_brush = PyQt5.QtGui.QBrush(PyQt5.Qt.QColor(255, 0, 0))
+        self.black_brush = PyQt5.QtGui.QBrush(PyQt5.Qt.QColor(0, 0, 0))
+        self.orange_brush = PyQt5.QtGui.QBrush(PyQt5.Qt.QColor(255, 165, 0))
 
         self.draw_live_paths = False  # draw live distribution paths or not
         self.draw_a_priori_paths = False  # used for drawing / not drawing a priori distribution paths
@@ -38,6 +73,39 @@ class Santa_GUI(PyQt5.QtWidgets.QMainWindow):
         self.btn2.resize(self.btn2.minimumSizeHint())
         self.btn2.move(0, 840)
 
+        if clock is not None:
+            # one checkable button per speed, exactly one of them is checked
+            self.speed_buttons = PyQt5.QtWidgets.QButtonGroup(self)
+            for i, (label, speed) in enumerate(SPEEDS.items()):
+                button = PyQt5.QtWidgets.QPushButton(label, self)
+                button.setCheckable(True)
+                button.setChecked(speed == clock.speed)
+                button.clicked.connect(
+                    lambda checked, speed=speed: self.change_speed(speed))
+                button.setGeometry(560 + 60 * i, 800, 55, 30)
+                self.speed_buttons.addButton(button)
+
+        if replay is not None:
+            self.btn.hide()
+            self.btn2.hide()
+            self.setWindowTitle(f'Playback (Santa) - {replay.file}')
+            self.frame = replay[0]
+
+            self.play_btn = PyQt5.QtWidgets.QPushButton('Play/pause', self)
+            self.play_btn.clicked.connect(self.switch_playback)
+            self.play_btn.resize(self.play_btn.minimumSizeHint())
+            self.play_btn.move(0, 800)
+
+            # timeline, every position is one frame of the replay
+            self.slider = PyQt5.QtWidgets.QSlider(QtCore.Qt.Horizontal, self)
+            self.slider.setRange(0, len(replay) - 1)
+            self.slider.setGeometry(120, 805, 670, 25)
+            self.slider.valueChanged.connect(self.seek)
+
+            self.playback = QtCore.QTimer()
+            self.playback.timeout.connect(self.next_frame)
+            self.playback.start(1000 // replay.header['smoothness'])
+
         self.show()
 
     def paintEvent(self, QPaintEvent):
@@ -45,129 +113,54 @@ class Santa_GUI(PyQt5.QtWidgets.QMainWindow):
         #       paintEvent in QWidget on thus gets called on repaint
         """Draws the map."""
 
+        if self.replay is not None:
+            self.paint_frame()
+            return
+
         world = self.world
+        self.update_static_layers(world)
 
         pen = PyQt5.QtGui.QPen()
         qp = PyQt5.QtGui.QPainter()
         qp.begin(self)
 
-        # region plot world boundary
-        qp.drawRect(0, 0, 800, 800)
-        # endregion
-
-        # region plot resource locations
-        for location in world.locations:
-            qp.setBrush(PyQt5.Qt.QColor(
-                world.colours[location.resource.name][0],
-                world.colours[location.resource.name][1],
-                world.colours[location.resource.name][2]))
-            qp.drawEllipse(
-                world.scale * (location.center[0] - location.radius),
-                world.scale * (location.center[1] - location.radius),
-                world.scale * location.radius * 2,
-                world.scale * location.radius * 2)
-        # endregion
-
-        # region plot Santa's house
-        # body
-        qp.setBrush(PyQt5.Qt.QColor(255, 0, 0))
-        qp.drawRect(world.scale * (world.santa_house.center[0] - world.N / 40),
-                    world.scale * (world.santa_house.center[1] - world.N / 40),
-                    world.scale * world.N / 20,
-                    world.scale * world.N / 20)
-        # roof
-        qp.setBrush(PyQt5.Qt.QColor(0, 0, 0))
-        qp.drawLine(world.scale * (world.santa_house.center[0] - world.N / 40),
-                    world.scale * (world.santa_house.center[1] - world.N / 40),
-                    world.scale * (world.santa_house.center[0] + world.N / 40),
-                    world.scale * (world.santa_house.center[1] + world.N / 40))
-        qp.drawLine(world.scale * (world.santa_house.center[0] + world.N / 40),
-                    world.scale * (world.santa_house.center[1] - world.N / 40),
-                    world.scale * (world.santa_house.center[0] - world.N / 40),
-                    world.scale * (world.santa_house.center[1] + world.N / 40))
+        # region plot world boundary, resource locations and Santa's house
+        qp.drawPixmap(0, 0, self.locations_layer)
         # endregion
 
         # region plot kids' houses
-        for kid in world.kids:
-            if kid.received:
-                # If kid already has the toy, the house is orange.
-                qp.setBrush(PyQt5.Qt.QColor(255, 165, 0))
-            else:
-                # If not, it's black.
-                qp.setBrush(PyQt5.Qt.QColor(0, 0, 0))
-
-            qp.drawRect(
-                world.scale * (kid.house.center[0] - kid.house.size / 2),
-                world.scale * (kid.house.center[1] - kid.house.size / 2),
-                world.scale * kid.house.size,
-                world.scale * kid.house.size)
+        qp.drawPixmap(0, 0, self.houses_layer)
         # endregion
 
         # region plot markers
-        pen.setWidth(5)
         for marker in world.markers:
             try:
-                pen.setColor(PyQt5.QtGui.QColor(
-                    world.colours[marker.location.resource.name][0],
-                    world.colours[marker.location.resource.name][1],
-                    world.colours[marker.location.resource.name][2],
-                    51))
+                qp.setPen(self.marker_pens[marker.location.resource.name])
             except:
-                pen.setColor(PyQt5.QtGui.QColor(0, 0, 0))
-            qp.setPen(pen)
+                qp.setPen(self.default_marker_pen)
             qp.drawLine(world.scale * marker.endpoint[0],
                         world.scale * marker.endpoint[1],
                         world.scale * marker.startpoint[0],
                         world.scale * marker.startpoint[1])
 
         # reset pen
-        pen.setColor(PyQt5.QtGui.QColor(0, 0, 0, 255))
-        pen.setWidth(0)
         qp.setPen(pen)
         # endregion
 
+        # region plot scent
+        if world.scent is not None:
+            scent = world.scent
+            qp.setPen(QtCore.Qt.NoPen)
+            for i, j in zip(*(scent.values > scent.threshold).nonzero()):
+                qp.setBrush(PyQt5.QtGui.QColor(0, 120, 0, min(int(255 * scent.values[i, j]), 120)))
+                qp.drawRect(world.scale * i * scent.size, world.scale * j * scent.size,
+                            world.scale * scent.size, world.scale * scent.size)
+            qp.setPen(pen)
+        # endregion
+
         # region draw a priori distribution paths
         if self.draw_a_priori_paths:
-            pen.setWidth(3)
-            pen.setStyle(QtCore.Qt.CustomDashLine)
-            pen.setDashPattern([1, 4, 5, 4])
-            for path in self.world.distribution_paths:
-                try:
-                    pen.setColor(path.color)
-                except AttributeError:
-                    path.color = PyQt5.Qt.QColor(
-                        *random.choice(list(world.colours.values())), 70)
-                    pen.setColor(path.color)
-                qp.setPen(pen)
-
-                kids = path.kids
-                if kids:
-                    qp.drawLine(world.scale * world.santa_house.center[0],
-                                world.scale * world.santa_house.center[1],
-                                world.scale * kids[0].house.center[0],
-                                world.scale * kids[0].house.center[1],
-                                )
-                for i in range(len(kids) - 1):
-
-                    qp.drawLine(world.scale * kids[i].house.center[0],
-                                world.scale * kids[i].house.center[1],
-                                world.scale * kids[i + 1].house.center[0],
-                                world.scale * kids[i + 1].house.center[1])
-                else:
-                    try:
-                        qp.drawLine(world.scale * kids[-1].house.center[0],
-                                    world.scale * kids[-1].house.center[1],
-                                    world.scale * world.santa_house.center[0],
-                                    world.scale * world.santa_house.center[1]
-                                    )
-                    except IndexError:
-                        pass
-
-            # reset pen
-            pen.setColor(PyQt5.QtGui.QColor(0, 0, 0, 255))
-            pen.setStyle(QtCore.Qt.SolidLine)
-            pen.setWidth(0)
-            qp.setPen(pen)
+            qp.drawPixmap(0, 0, self.paths_layer)
         # endregion
 
         # region plot deers            
@@ -175,10 +168,10 @@ class Santa_GUI(PyQt5.QtWidgets.QMainWindow):
             if deer.loaded:
                 # If deer has loaded resource, its colour is orange.
                 # Alternatively, we could also draw deers by the colour of resource
-                qp.setBrush(PyQt5.Qt.QColor(255, 165, 0))
+                qp.setBrush(self.orange_brush)
             else:
                 # If not, it's black.
-                qp.setBrush(PyQt5.Qt.QColor(0, 0, 0))
+                qp.setBrush(self.black_brush)
 
             qp.drawEllipse(world.scale * deer.position[0] - 5,
                            world.scale * deer.position[1] - 5,
@@ -211,19 +204,22 @@ class Santa_GUI(PyQt5.QtWidgets.QMainWindow):
 
         # region draw clock
         qp.setBrush(PyQt5.Qt.QColor(255, 255, 255, 127))
-        qp.drawRect(8, 8, 320, 40)
-        qp.drawText(
-            12, 34,
-            f'Provided Time: {world.T} | Current Time: {world.gui_time:.2f}')
+        if self.clock is None:
+            qp.drawRect(8, 8, 320, 40)
+            qp.drawText(
+                12, 34,
+                f'Provided Time: {world.T} | '
+                f'Current Time: {world.gui_time:.2f}')
+        else:
+            qp.drawRect(8, 8, 420, 40)
+            qp.drawText(
+                12, 34,
+                f'Provided Time: {world.T} | '
+                f'Current Time: {world.gui_time:.2f} | '
+                f'Speed: {self.clock.label}')
         # endregion
         
-        # region draw 'latest event'
-        for kid in world.kids:
-            if kid.received and kid.index not in world.happy_kids_list:
-                world.happy_kids_list.append(kid.index)
-                world.latest_event = f'Latest event: {kid.name} received ' \
-                                     f'{kid.toy.toy_type.toy_name} ' \
-                                     f'(time: {world.gui_time:.2f})'
+        # region draw 'latest event' (see new_happy_kids())
         qp.drawText(5, 905, world.latest_event)
         # endregion
 
@@ -235,8 +231,229 @@ class Santa_GUI(PyQt5.QtWidgets.QMainWindow):
         Args:
             world: An instance of the class 'World', describing the world.
         """
+        if world is not self.world:
+            self.invalidate()
         self.world = world
 
+    def invalidate(self):
+        """Forgets the rendered static layers, they are rendered again on
+        the next repaint."""
+        self.locations_layer = None  # boundary, locations and Santa's house
+        self.pickups = None  # world.tally.pickups when the locations were rendered
+        self.houses_layer = None  # kids' houses
+        self.paths_layer = None  # a priori distribution paths
+        self.paths_key = None  # the paths which were rendered
+        self.delivered = []  # number of kids who received their toy per path
+        self.happy_kids = set(self.world.happy_kids_list) \
+            if self.world is not None else set()
+
+    def update_static_layers(self, world):
+        """Renders the parts of the map which rarely change again if needed.
+
+        The layer of the locations (world boundary, resource locations and
+        Santa's house) only changes when a deer picks up a resource, which
+        the engine counts in world.tally.pickups. The layer of the kids'
+        houses only changes when a kid receives its toy, and then only the
+        house of that kid is painted over. The layer of the a priori
+        distribution paths only changes when the paths are planned.
+
+        Args:
+            world: An instance of the class 'World', describing the world.
+        """
+        if self.locations_layer is None or world.tally.pickups != self.pickups:
+            self.pickups = world.tally.pickups
+            self.locations_layer = self.render_locations_layer(world)
+
+        happy_kids = self.new_happy_kids(world)
+        if self.houses_layer is None:
+            self.houses_layer = self.render_houses_layer(world)
+        elif happy_kids:
+            qp = PyQt5.QtGui.QPainter(self.houses_layer)
+            for kid in happy_kids:
+                self.paint_house(qp, world, kid)
+            qp.end()
+
+        key = (id(world.distribution_paths), len(world.distribution_paths))
+        if self.draw_a_priori_paths and key != self.paths_key:
+            self.paths_key = key
+            self.paths_layer = self.render_paths_layer(world)
+
+    def new_happy_kids(self, world):
+        """Finds the kids who received their toy since the last repaint.
+
+        Only the kids of the distribution paths can receive a toy, so only
+        the paths are checked (not every kid). The newly happy kids are
+        recorded in world.happy_kids_list and world.latest_event.
+
+        Args:
+            world: An instance of the class 'World', describing the world.
+
+        Returns:
+            A list of the newly happy kids, ordered by their index.
+        """
+        paths = world.distribution_paths
+        if len(self.delivered) != len(paths):  # the paths were planned
+            self.delivered = [0] * len(paths)
+
+        happy_kids = []
+        for i, path in enumerate(paths):
+            delivered = len(path.kids) - path.left_to_distribute()
+            if delivered != self.delivered[i]:
+                happy_kids += path.get_kids(self.delivered[i], delivered)
+                self.delivered[i] = delivered
+
+        happy_kids = sorted((kid for kid in happy_kids
+                             if kid.index not in self.happy_kids),
+                            key=lambda kid: kid.index)
+        for kid in happy_kids:
+            self.happy_kids.add(kid.index)
+            world.happy_kids_list.append(kid.index)
+            world.latest_event = f'Latest event: {kid.name} received ' \
+                                 f'{kid.toy.toy_type.toy_name} ' \
+                                 f'(time: {world.gui_time:.2f})'
+        return happy_kids
+
+    def paint_house(self, qp, world, kid):
+        """Paints the house of a kid, orange if the kid already has the toy,
+        black if not.
+
+        Args:
+            qp: The QPainter to paint with.
+            world: An instance of the class 'World', describing the world.
+            kid: The kid whose house gets painted.
+        """
+        qp.setBrush(self.orange_brush if kid.received else self.black_brush)
+        qp.drawRect(
+            world.scale * (kid.house.center[0] - kid.house.size / 2),
+            world.scale * (kid.house.center[1] - kid.house.size / 2),
+            world.scale * kid.house.size,
+            world.scale * kid.house.size)
+
+    def render_locations_layer(self, world):
+        """Renders the world boundary, the resource locations and Santa's
+        house.
+
+        Args:
+            world: An instance of the class 'World', describing the world.
+
+        Returns:
+            A transparent QPixmap with the locations.
+        """
+        layer = PyQt5.QtGui.QPixmap(801, 801)  # the boundary is 801 pixels wide
+        layer.fill(QtCore.Qt.transparent)
+        qp = PyQt5.QtGui.QPainter(layer)
+
+        # region plot world boundary
+        qp.drawRect(0, 0, 800, 800)
+        # endregion
+
+        # region plot resource locations
+        for location in world.locations:
+            qp.setBrush(self.location_brushes[location.resource.name])
+            qp.drawEllipse(
+                world.scale * (location.center[0] - location.radius),
+                world.scale * (location.center[1] - location.radius),
+                world.scale * location.radius * 2,
+                world.scale * location.radius * 2)
+        # endregion
+
+        # region plot Santa's house
+        # body
+        qp.setBrush(self.santa_brush)
+        qp.drawRect(world.scale * (world.santa_house.center[0] - world.N / 40),
+                    world.scale * (world.santa_house.center[1] - world.N / 40),
+                    world.scale * world.N / 20,
+                    world.scale * world.N / 20)
+        # roof
+        qp.setBrush(self.black_brush)
+        qp.drawLine(world.scale * (world.santa_house.center[0] - world.N / 40),
+                    world.scale * (world.santa_house.center[1] - world.N / 40),
+                    world.scale * (world.santa_house.center[0] + world.N / 40),
+                    world.scale * (world.santa_house.center[1] + world.N / 40))
+        qp.drawLine(world.scale * (world.santa_house.center[0] + world.N / 40),
+                    world.scale * (world.santa_house.center[1] - world.N / 40),
+                    world.scale * (world.santa_house.center[0] - world.N / 40),
+                    world.scale * (world.santa_house.center[1] + world.N / 40))
+        # endregion
+
+        qp.end()
+        return layer
+
+    def render_houses_layer(self, world):
+        """Renders the kids' houses.
+
+        Args:
+            world: An instance of the class 'World', describing the world.
+
+        Returns:
+            A transparent QPixmap with the kids' houses.
+        """
+        layer = PyQt5.QtGui.QPixmap(801, 801)
+        layer.fill(QtCore.Qt.transparent)
+        qp = PyQt5.QtGui.QPainter(layer)
+        for kid in world.kid_table.rows(world.kids):
+            self.paint_house(qp, world, kid)
+        qp.end()
+        return layer
+
+    def render_paths_layer(self, world):
+        """Renders the a priori distribution paths.
+
+        Args:
+            world: An instance of the class 'World', describing the world.
+
+        Returns:
+            A transparent QPixmap with the a priori distribution paths.
+        """
+        layer = PyQt5.QtGui.QPixmap(801, 801)
+        layer.fill(QtCore.Qt.transparent)
+        pen = PyQt5.QtGui.QPen()
+        qp = PyQt5.QtGui.QPainter(layer)
+
+        pen.setWidth(3)
+        pen.setStyle(QtCore.Qt.CustomDashLine)
+        pen.setDashPattern([1, 4, 5, 4])
+        for path in world.distribution_paths:
+            try:
+                pen.setColor(path.color)
+            except AttributeError:
+                path.color = PyQt5.Qt.QColor(
+                    *random.choice(list(world.colours.values())), 70)
+                pen.setColor(path.color)
+            qp.setPen(pen)
+
+            kids = path.get_kids()
+            if kids:
+                qp.drawLine(world.scale * world.santa_house.center[0],
+                            world.scale * world.santa_house.center[1],
+                            world.scale * kids[0].house.center[0],
+                            world.scale * kids[0].house.center[1],
+                            )
+            for i in range(len(kids) - 1):
+
+                qp.drawLine(world.scale * kids[i].house.center[0],
+                            world.scale * kids[i].house.center[1],
+                            world.scale * kids[i + 1].house.center[0],
+                            world.scale * kids[i + 1].house.center[1])
+            else:
+                try:
+                    qp.drawLine(world.scale * kids[-1].house.center[0],
+                                world.scale * kids[-1].house.center[1],
+                                world.scale * world.santa_house.center[0],
+                                world.scale * world.santa_house.center[1]
+                                )
+                except IndexError:
+                    pass
+
+        # reset pen
+        pen.setColor(PyQt5.QtGui.QColor(0, 0, 0, 255))
+        pen.setStyle(QtCore.Qt.SolidLine)
+        pen.setWidth(0)
+        qp.setPen(pen)
+
+        qp.end()
+        return layer
+
     def generate_message(self, world):
         """Generates a message for the pop-up message box.
         
@@ -275,7 +492,7 @@ class Santa_GUI(PyQt5.QtWidgets.QMainWindow):
         message += ".\n\n"
 
         toys = False
-        for kid in world.kids:
+        for kid in world.kid_table.rows(world.kids):
             if kid.toy is not None:  # if kid will get a toy
                 toys = True
                 message += (kid.name + ' will get ' +
@@ -317,6 +534,19 @@ class Santa_GUI(PyQt5.QtWidgets.QMainWindow):
         """
         self.draw_live_paths = not self.draw_live_paths
 
+    def change_speed(self, speed):
+        """Changes the speed of the simulation.
+
+        This method gets called when the user clicks one of the speed buttons
+        in the GUI. The speed only changes how many ticks of the simulation
+        are computed per rendered frame, the ticks themselves stay the same.
+
+        Args:
+            speed: Simulated seconds per wall second, None for as fast as
+                possible (see SPEEDS in clock.py).
+        """
+        self.clock.set_speed(speed)
+
     def switch_a_priori_mode(self):
         """Reverses the value of draw_a_priori_paths.
 
@@ -326,3 +556,118 @@ class Santa_GUI(PyQt5.QtWidgets.QMainWindow):
         whether the a priori paths will be drawn or not.
         """
         self.draw_a_priori_paths = not self.draw_a_priori_paths
+
+    def paint_frame(self):
+        """Draws the current frame of the replay (playback mode).
+
+        Like paintEvent, but everything is taken from the header and the
+        current frame of the replay instead of the world.
+        """
+        header = self.replay.header
+        frame = self.frame
+        scale = 800 / header['N']
+        house = header['house']
+
+        pen = PyQt5.QtGui.QPen()
+        qp = PyQt5.QtGui.QPainter()
+        qp.begin(self)
+
+        # region plot world boundary
+        qp.drawRect(0, 0, 800, 800)
+        # endregion
+
+        # region plot resource locations
+        for location, amount in zip(header['locations'], frame.amounts):
+            if amount:
+                radius = sqrt(amount / pi)
+                qp.setBrush(PyQt5.Qt.QColor(*location['colour']))
+                qp.drawEllipse(scale * (location['center'][0] - radius),
+                               scale * (location['center'][1] - radius),
+                               scale * radius * 2,
+                               scale * radius * 2)
+        # endregion
+
+        # region plot Santa's house
+        half = house['size'] / 2
+        qp.setBrush(PyQt5.Qt.QColor(255, 0, 0))
+        qp.drawRect(scale * (house['center'][0] - half), scale * (house['center'][1] - half),
+                    scale * house['size'], scale * house['size'])
+        qp.drawLine(scale * (house['center'][0] - half), scale * (house['center'][1] - half),
+                    scale * (house['center'][0] + half), scale * (house['center'][1] + half))
+        qp.drawLine(scale * (house['center'][0] + half), scale * (house['center'][1] - half),
+                    scale * (house['center'][0] - half), scale * (house['center'][1] + half))
+        # endregion
+
+        # region plot kids' houses
+        for kid, received in zip(header['kids'], frame.received):
+            # orange if the kid already has the toy, else black
+            qp.setBrush(PyQt5.Qt.QColor(255, 165, 0) if received else PyQt5.Qt.QColor(0, 0, 0))
+            qp.drawRect(scale * (kid['center'][0] - kid['size'] / 2),
+                        scale * (kid['center'][1] - kid['size'] / 2),
+                        scale * kid['size'],
+                        scale * kid['size'])
+        # endregion
+
+        # region plot markers
+        pen.setWidth(5)
+        for location, startpoint, endpoint in frame.markers:
+            if location >= 0:
+                pen.setColor(PyQt5.QtGui.QColor(*header['locations'][location]['colour'], 51))
+            else:
+                pen.setColor(PyQt5.QtGui.QColor(0, 0, 0))
+            qp.setPen(pen)
+            qp.drawLine(scale * endpoint[0], scale * endpoint[1], scale * startpoint[0], scale * startpoint[1])
+
+        # reset pen
+        pen.setColor(PyQt5.QtGui.QColor(0, 0, 0, 255))
+        pen.setWidth(0)
+        qp.setPen(pen)
+        # endregion
+
+        # region plot deers
+        for position, flags, toys in zip(frame.positions, frame.flags, frame.toys):
+            # orange if the deer carries a resource, else black
+            qp.setBrush(PyQt5.Qt.QColor(255, 165, 0) if flags & LOADED else PyQt5.Qt.QColor(0, 0, 0))
+            qp.drawEllipse(scale * position[0] - 5, scale * position[1] - 5, 10, 10)
+            if flags & DISTRIBUTING:
+                # Draws a number indicating the amount of loaded toys.
+                qp.drawText(scale * position[0] + 4, scale * position[1] - 4, str(toys))
+        # endregion
+
+        # region draw clock
+        qp.setBrush(PyQt5.Qt.QColor(255, 255, 255, 127))
+        qp.drawRect(8, 8, 420, 40)
+        qp.drawText(
+            12, 34,
+            f'Provided Time: {header["T"]} | Current Time: {frame.time:.2f} | '
+            f'Frame: {frame.index + 1}/{len(self.replay)}')
+        # endregion
+
+        qp.drawText(5, 905, frame.latest_event)
+
+        qp.end()
+
+    def seek(self, index):
+        """Shows the frame index of the replay (playback mode).
+
+        This method gets called when the slider of the timeline moves.
+        Decoding a frame takes constant time, see Replay.seek.
+        """
+        self.frame = self.replay[index]
+        self.repaint()
+
+    def next_frame(self):
+        """Advances the playback by one frame, and pauses at the end."""
+        if self.slider.value() + 1 < len(self.replay):
+            self.slider.setValue(self.slider.value() + 1)  # calls seek
+        else:
+            self.playback.stop()
+
+    def switch_playback(self):
+        """Pauses or resumes the playback (starts again at the end)."""
+        if self.playback.isActive():
+            self.playback.stop()
+        else:
+            if self.slider.value() + 1 >= len(self.replay):
+                self.slider.setValue(0)
+            self.playback.start()
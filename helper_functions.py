@@ -3,7 +3,7 @@
 Author: Maximilian Janisch
 """
 
-__all__ = ("random_tuple", "euclidean_norm", "max_norm", "limit")
+__all__ = ("random_tuple", "euclidean_norm", "max_norm", "limit", "step_towards", "orientation", "segments_intersect")
 
 import random
 
@@ -11,21 +11,37 @@ from typing import *  # library for type hints
 from math import *
 
 
-def random_tuple(_min: float, _max: float) -> Tuple[float, float]:
+def random_tuple(_min: float, _max: float, rng: random.Random = random) -> Tuple[float, float]:
     """
     Generates a random 2-tuple
     :param _min: Minimal number
     :param _max: Maximal number
+    :param rng: pseudo-random stream to draw from (default: the global random module)
     :return: Pseudo-random tuple
     """
-    return random.uniform(_min, _max), random.uniform(_min, _max)
+    return rng.uniform(_min, _max), rng.uniform(_min, _max)
 
 
 def euclidean_norm(_tuple: Tuple[float, float]) -> float:
     """
     Returns the euclidean norm of the point _tuple in two-dimensional euclidean space
+    (squared by multiplication like NumPy does, x ** 2 calls pow, which may round differently)
     """
-    return sqrt(_tuple[0] ** 2 + _tuple[1] ** 2)
+    return sqrt(_tuple[0] * _tuple[0] + _tuple[1] * _tuple[1])
+
+
+def step_towards(position: Tuple[float, float], destination: Tuple[float, float], dx: float) -> Tuple[float, float]:
+    """
+    Returns the position after one move of at most dx from position towards destination (see Deer.move_towards)
+    """
+    euclidean_distance = euclidean_norm((position[0] - destination[0], position[1] - destination[1]))
+    direction = (destination[0] - position[0], destination[1] - position[1])
+
+    if euclidean_norm(direction) == 0:  # avoid division by 0 error (if we are already at the destination)
+        return position
+    direction = (min(dx, euclidean_distance) * direction[0] / euclidean_norm(direction),
+                 min(dx, euclidean_distance) * direction[1] / euclidean_norm(direction))
+    return position[0] + direction[0], position[1] + direction[1]
 
 
 def max_norm(_tuple: Tuple[float, float]) -> float:
@@ -42,3 +58,37 @@ def limit(number: float, _min: float, _max: float) -> float:
     :return: closest number to the interval [_min, _max]
     """
     return min(_max, max(_min, number))
+
+
+def orientation(p: Tuple[float, float], q: Tuple[float, float], r: Tuple[float, float]) -> float:
+    """
+    Returns the cross product of q - p and r - p, i. e. a positive number if p, q, r turn counterclockwise,
+    a negative number if they turn clockwise and 0 if they are collinear
+    """
+    return (q[0] - p[0]) * (r[1] - p[1]) - (q[1] - p[1]) * (r[0] - p[0])
+
+
+def segments_intersect(p1: Tuple[float, float], p2: Tuple[float, float],
+                       q1: Tuple[float, float], q2: Tuple[float, float]) -> bool:
+    """
+    Returns True if the segments (p1 -> p2) and (q1 -> q2) intersect (touching counts), else False.
+    Only uses products, no square roots and no tolerance.
+    """
+    d1 = orientation(q1, q2, p1)
+    d2 = orientation(q1, q2, p2)
+    d3 = orientation(p1, p2, q1)
+    d4 = orientation(p1, p2, q2)
+
+    if ((d1 > 0 > d2) or (d1 < 0 < d2)) and ((d3 > 0 > d4) or (d3 < 0 < d4)):
+        return True  # proper crossing
+
+    # collinear (or touching) cases
+    return (d1 == 0 and _in_box(q1, q2, p1)) or (d2 == 0 and _in_box(q1, q2, p2)) \
+        or (d3 == 0 and _in_box(p1, p2, q1)) or (d4 == 0 and _in_box(p1, p2, q2))
+
+
+def _in_box(a: Tuple[float, float], b: Tuple[float, float], point: Tuple[float, float]) -> bool:
+    """
+    Checks whether point lies in the bounding box of the segment (a -> b)
+    """
+    return min(a[0], b[0]) <= point[0] <= max(a[0], b[0]) and min(a[1], b[1]) <= point[1] <= max(a[1], b[1])
@@ -0,0 +1,471 @@
+"""
+Vectorized deer backend. A Herd keeps the state of many deers (position, target, state flags, load, ...)
+in NumPy arrays and moves all of them with one batched step per tick. The Deer objects are converted into
+Herd_Deer views of their rows, so the rest of the project (GUI, statistics, engine) can keep using them.
+Only rare events (choosing a new random target, arriving at Santa's house, delivering a toy, ...) fall back
+to the scalar methods of Deer. Distances are squared by multiplication on both sides (see euclidean_norm), so
+both backends give the same results for the same seed (python consistency.py checks this).
+The deers of several worlds can share one Herd (see Ensemble), then the batched steps move all of them at once
+and only the parts which need the markers or the scent of a world are done world by world.
+NumPy is optional, the Herd just can not be created without it. With kernels = 'numba' the hottest batched
+steps run as compiled loops instead (see kernels.py).
+Author: Maximilian Janisch
+"""
+
+__all__ = ("Herd", "Herd_Deer")
+
+from typing import *  # library for type hints
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is only needed for this backend
+    np = None
+
+from deer import *
+from geometry import *
+from kernels import *
+from logs import *
+from spatial_index import *
+
+# name of the column: (data type, width or None for scalar columns)
+COLUMNS = {
+    "position": (float, 2), "old_position": (float, 2), "random_target": (float, 2), "has_target": (bool, None),
+    "loaded": (int, None), "inactive": (int, None),
+    "painting": (bool, None), "erasing": (bool, None), "scenting": (bool, None), "distributing": (bool, None),
+    "has_resource": (bool, None), "has_marker": (bool, None), "has_path": (bool, None),
+    # parameters of the world the deer lives in
+    "dx": (float, None), "home": (float, 2), "home_size": (float, None), "N": (float, None),
+    "smoothness": (int, None), "world": (int, None),
+}
+
+
+def _vector(name: str, flag: str = None) -> property:
+    """
+    Property for a 2-tuple which is stored in the column name of the herd
+    :param name: name of the column
+    :param flag: name of a boolean column which is False if the tuple is None
+    """
+    def fget(self):
+        if flag and not getattr(self.herd, flag)[self.slot]:
+            return None
+        return tuple(getattr(self.herd, name)[self.slot].tolist())
+
+    def fset(self, value):
+        if flag:
+            getattr(self.herd, flag)[self.slot] = value is not None
+        if value is not None:
+            getattr(self.herd, name)[self.slot] = value
+
+    return property(fget, fset)
+
+
+def _scalar(name: str, convert: type) -> property:
+    """
+    Property for a number which is stored in the column name of the herd
+    :param name: name of the column
+    :param convert: type of the number (int or bool)
+    """
+    def fget(self):
+        return convert(getattr(self.herd, name)[self.slot])
+
+    def fset(self, value):
+        getattr(self.herd, name)[self.slot] = value
+
+    return property(fget, fset)
+
+
+def _object(name: str, flag: str) -> property:
+    """
+    Property for a Python object (resource, marker, path) which is stored in the list name of the herd
+    :param name: name of the list
+    :param flag: name of a boolean column which is True if the object is not None
+    """
+    def fget(self):
+        return getattr(self.herd, name)[self.slot]
+
+    def fset(self, value):
+        getattr(self.herd, name)[self.slot] = value
+        getattr(self.herd, flag)[self.slot] = value is not None
+
+    return property(fget, fset)
+
+
+class Herd_Deer(Deer):
+    """
+    A deer whose state lives in a row of a Herd
+    """
+    position = _vector("position")
+    old_position = _vector("old_position")
+    random_target = _vector("random_target", "has_target")
+    loaded = _scalar("loaded", int)
+    inactive = _scalar("inactive", int)
+    is_painting_marker = _scalar("painting", bool)
+    is_erasing_marker = _scalar("erasing", bool)
+    is_scenting = _scalar("scenting", bool)
+    is_distributing = _scalar("distributing", bool)
+    resource = _object("resources", "has_resource")
+    marker = _object("markers", "has_marker")
+    path = _object("paths", "has_path")
+
+    @classmethod
+    def adopt(cls, deer: Deer, herd, slot: int) -> None:
+        """
+        Turns an existing Deer into a view of the row slot of herd (in place, so references to it stay valid)
+        :param deer: the deer
+        :param herd: the herd
+        :param slot: row of the deer in the herd
+        """
+        values = {attribute: deer.__dict__.pop(attribute) for attribute in
+                  ("position", "old_position", "random_target", "loaded", "inactive", "is_painting_marker",
+                   "is_erasing_marker", "is_scenting", "is_distributing", "resource", "marker", "path")}
+        deer.__class__ = cls
+        deer.herd = herd
+        deer.slot = slot
+        for attribute, value in values.items():
+            setattr(deer, attribute, value)
+
+
+class Herd:
+    def __init__(self, kernels: str = "numpy"):
+        """
+        Initializes an empty Herd, deers are added with attach
+        :param kernels: "numpy" or "numba" (compiled kernels, falls back to "numpy" if Numba is not installed)
+        """
+        if np is None:
+            raise ImportError("The numpy backend needs NumPy, install it or use the python backend")
+        self.kernels = select_kernels(kernels)
+        self.compiled = self.kernels == "numba"
+
+        for name, (dtype, width) in COLUMNS.items():
+            setattr(self, name, np.zeros((0, width) if width else 0, dtype))
+
+        self.deers: List[Herd_Deer] = []
+        self.worlds: list = []  # world of every deer
+        self.attached: list = []  # the attached worlds, the column world holds the index in this list
+        self.resources: List[Resource] = []
+        self.markers: List[Marker] = []
+        self.paths: list = []
+
+    def __repr__(self):
+        return f"Herd of {len(self.deers)} deers"
+
+    def __len__(self):
+        return len(self.deers)
+
+    def attach(self, world) -> "np.ndarray":
+        """
+        Adds all deers of world to the herd and turns them into Herd_Deers
+        :param world: the world
+        :return: the rows of the deers of world
+        """
+        start = len(self.deers)
+        count = len(world.deers)
+        for name, (dtype, width) in COLUMNS.items():
+            setattr(self, name, np.concatenate([getattr(self, name),
+                                                np.zeros((count, width) if width else count, dtype)]))
+        self.resources.extend([None] * count)
+        self.markers.extend([None] * count)
+        self.paths.extend([None] * count)
+
+        slots = np.arange(start, start + count)
+        self.dx[slots] = world.dx
+        self.home[slots] = world.santa_house.center
+        self.home_size[slots] = world.santa_house.size
+        self.N[slots] = world.N
+        self.world[slots] = len(self.attached)
+        self.attached.append(world)
+        for slot, deer in zip(slots.tolist(), world.deers):
+            self.smoothness[slot] = deer.smoothness
+            Herd_Deer.adopt(deer, self, slot)
+            self.deers.append(deer)
+            self.worlds.append(world)
+
+        enginelog.debug("Attached %s deers to %s", count, self)
+        return slots
+
+    def by_world(self, slots: "np.ndarray") -> Iterator[Tuple[Any, "np.ndarray"]]:
+        """
+        Splits slots by the worlds of the deers
+        :param slots: rows of deers
+        :return: generator of (world, rows of the deers of that world in slots), the worlds in the order of attach
+        """
+        if len(self.attached) == 1:
+            if len(slots):
+                yield self.attached[0], slots
+            return
+        worlds = self.world[slots]
+        order = np.argsort(worlds, kind="stable")
+        worlds, slots = worlds[order], slots[order]
+        starts = np.flatnonzero(np.r_[True, worlds[1:] != worlds[:-1]]) if len(slots) else []
+        for start, end in zip(starts, [*starts[1:], len(slots)]):
+            yield self.attached[worlds[start]], slots[start:end]
+
+    def inside_locations(self, slots: "np.ndarray") -> "np.ndarray":
+        """
+        Batched search for the deers which lie inside of a location of their world (with a margin for rounding, so
+        these are at least the deers for which the location grid of their world finds a location)
+        :param slots: rows of deers
+        :return: mask of these deers in slots
+        """
+        worlds = self.world[slots]
+        present = np.unique(worlds).tolist()
+        locations = [self.attached[world].locations for world in present]
+        width = max(map(len, locations), default=0)
+        if not width:
+            return np.zeros(len(slots), bool)
+        centers = np.zeros((len(self.attached), width, 2))
+        radii = np.full((len(self.attached), width), -1.)  # the padding contains no point
+        for world, locations_ in zip(present, locations):
+            if locations_:
+                centers[world, :len(locations_)] = [location.center for location in locations_]
+                radii[world, :len(locations_)] = [location.radius * (1 + 1e-9) for location in locations_]
+        if self.compiled:
+            return inside_circles_kernel(self.position[slots], worlds, centers, radii)
+        difference = centers[worlds] - self.position[slots, None, :]
+        x, y = difference[:, :, 0], difference[:, :, 1]
+        return (np.sqrt(x * x + y * y) <= radii[worlds]).any(axis=1)
+
+    # region batched movement
+    def move_towards(self, slots: "np.ndarray", destinations: "np.ndarray") -> None:
+        """
+        Batched Deer.move_towards
+        :param slots: rows of the deers to move
+        :param destinations: destination of every deer (one row per slot)
+        """
+        if not len(slots):
+            return
+        position = self.position[slots]
+        if self.compiled:
+            move_towards_kernel(position, np.ascontiguousarray(destinations, float), self.dx[slots])
+            self.position[slots] = position
+            return
+        direction = destinations - position
+        euclidean_distance = np.sqrt(direction[:, 0] * direction[:, 0] + direction[:, 1] * direction[:, 1])
+        moving = euclidean_distance != 0  # avoid division by 0 (if the deer is already at its destination)
+
+        step = np.minimum(self.dx[slots], euclidean_distance)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            position += np.where(moving[:, None], step[:, None] * direction / euclidean_distance[:, None], 0)
+        self.position[slots] = position
+
+    def random_walk(self, slots: "np.ndarray") -> None:
+        """
+        Batched Deer.random_walk
+        :param slots: rows of the deers to move
+        """
+        difference = self.position[slots] - self.random_target[slots]
+        distance = np.sqrt(difference[:, 0] * difference[:, 0] + difference[:, 1] * difference[:, 1])
+        on_the_way = self.has_target[slots] & ~(distance <= 0.001)
+
+        self.move_towards(slots[on_the_way], self.random_target[slots[on_the_way]])
+        for slot in slots[~on_the_way].tolist():  # new targets are drawn from the stream of each deer
+            deer = self.deers[slot]
+            deer.random_walk(self.dx[slot], self.N[slot])
+
+    def return_to_home(self, slots: "np.ndarray") -> None:
+        """
+        Batched Deer.return_to_home
+        :param slots: rows of the deers to move
+        """
+        home = self.home[slots]
+        distance = np.abs(self.position[slots] - home)
+        at_home = np.maximum(distance[:, 0], distance[:, 1]) <= self.home_size[slots] / 2
+
+        for slot in slots[at_home].tolist():  # unloading and finalizing markers is left to the deer
+            deer = self.deers[slot]
+            deer.return_to_home(self.dx[slot], self.worlds[slot].santa_house)
+
+        walking = slots[~at_home]
+        self.move_towards(walking, home[~at_home])
+        for slot in walking[self.painting[walking]].tolist():  # paint the marker
+            self.markers[slot].set_startpoint(tuple(self.position[slot].tolist()))
+        for slot in walking[self.erasing[walking]].tolist():  # erase the marker
+            self.markers[slot].set_endpoint(tuple(self.position[slot].tolist()))
+
+    def follow_marker(self, slots: "np.ndarray") -> None:
+        """
+        Batched Deer.follow_marker
+        :param slots: rows of the deers to move
+        """
+        if not len(slots):
+            return
+        endpoints = np.array([self.markers[slot].endpoint for slot in slots.tolist()], float)
+        directions = np.array([self.markers[slot].direction for slot in slots.tolist()], float)
+        planned_direction = endpoints - self.position[slots]
+        ahead = (planned_direction[:, 0] * directions[:, 0] >= 0) & (planned_direction[:, 1] * directions[:, 1] >= 0)
+
+        self.move_towards(slots[ahead], endpoints[ahead])
+        for slot in slots[~ahead].tolist():  # the marker's endpoint does not lie in our direction anymore
+            self.markers[slot] = None
+        self.has_marker[slots[~ahead]] = False
+        self.random_walk(slots[~ahead])
+
+    def find_markers(self, slots: "np.ndarray") -> None:
+        """
+        Batched search of Deer.move_to_collect: attaches every deer which crossed a marker during its last move
+        to the first such marker (in insertion order). Deers are only tested against the markers of their own world
+        in their cells.
+        :param slots: rows of searching deers (of one or more worlds)
+        """
+        grids = {world: self.attached[world].markers.grid for world in np.unique(self.world[slots]).tolist()}
+        grids = {world: grid for world, grid in grids.items() if len(grid)}
+        slots = slots[np.isin(self.world[slots], list(grids))]
+        if not len(slots):
+            return
+        worlds = self.world[slots]
+        cell_size = np.zeros(len(self.attached))
+        cell_size[list(grids)] = [grid.cell_size for grid in grids.values()]
+        old_position = self.old_position[slots]
+        position = self.position[slots]
+        low = np.floor(np.minimum(old_position, position) / cell_size[worlds, None]).astype(np.int64)
+        high = np.floor(np.maximum(old_position, position) / cell_size[worlds, None]).astype(np.int64)
+
+        # one entry per (world, cell, marker) triple of the grids
+        entries = [(world, cell, marker) for world, grid in grids.items()
+                   for cell, markers in grid.cells.items() for marker in markers]
+        if not entries:
+            return
+        entry_world = np.array([entry[0] for entry in entries], np.int64)
+        entry_cells = np.array([entry[1] for entry in entries], np.int64)
+        first_cell = min(low.min(), entry_cells.min())
+        span = max(high.max(), entry_cells.max()) - first_cell + 1
+
+        def key(world, x, y):
+            """
+            Encodes the cells of the worlds as integers
+            """
+            return (world * span + x - first_cell) * span + y - first_cell
+
+        # sorted by world and cell
+        entry_keys = key(entry_world, entry_cells[:, 0], entry_cells[:, 1])
+        by_key = np.argsort(entry_keys, kind="stable")
+        entry_keys = entry_keys[by_key]
+        entry_markers = [entries[index][2] for index in by_key.tolist()]
+        entry_order = np.array([grids[entries[index][0]].order[entries[index][2]] for index in by_key.tolist()],
+                               np.int64)
+        entry_start = np.array([marker.startpoint for marker in entry_markers], float).reshape(-1, 2)
+        entry_end = np.array([marker.endpoint for marker in entry_markers], float).reshape(-1, 2)
+
+        # the four corners of the bounding box cover all its cells as long as it spans at most 2 cells per axis
+        small = ~(high - low > 1).any(axis=1)
+        rows = np.flatnonzero(small)
+        pair_rows, pair_entries = [], []
+        for x, y in ((low[:, 0], low[:, 1]), (low[:, 0], high[:, 1]), (high[:, 0], low[:, 1]), (high[:, 0], high[:, 1])):
+            corner = key(worlds[rows], x[rows], y[rows])
+            first = np.searchsorted(entry_keys, corner, "left")
+            counts = np.searchsorted(entry_keys, corner, "right") - first
+            offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            pair_rows.append(np.repeat(rows, counts))
+            pair_entries.append(np.repeat(first, counts) + offsets)
+        pair_rows = np.concatenate(pair_rows)
+        pair_entries = np.concatenate(pair_entries)
+
+        intersect = segments_intersect_kernel if self.compiled else segments_intersect_batch
+        touching = intersect(old_position[pair_rows], position[pair_rows],
+                             entry_start[pair_entries], entry_end[pair_entries])
+        pair_rows, pair_entries = pair_rows[touching], pair_entries[touching]
+        # keep the first marker (in insertion order) of every deer
+        by_order = np.lexsort((entry_order[pair_entries], pair_rows))
+        pair_rows, pair_entries = pair_rows[by_order], pair_entries[by_order]
+        first_hit = np.ones(len(pair_rows), bool)
+        first_hit[1:] = pair_rows[1:] != pair_rows[:-1]
+
+        for row, entry in zip(pair_rows[first_hit].tolist(), pair_entries[first_hit].tolist()):
+            self.markers[slots[row]] = entry_markers[entry]
+            self.has_marker[slots[row]] = True
+        for slot in slots[~small].tolist():  # very fast deers
+            marker = grids[self.world[slot]].hit(tuple(self.old_position[slot].tolist()),
+                                                 tuple(self.position[slot].tolist()))
+            if marker:
+                self.markers[slot] = marker
+                self.has_marker[slot] = True
+    # endregion
+
+    # region phases
+    def move_to_collect(self, slots: "np.ndarray") -> None:
+        """
+        Batched Deer.move_to_collect
+        :param slots: rows of the deers to move (of one or more worlds in the collection phase)
+        """
+        self.old_position[slots] = self.position[slots]
+
+        inactive = self.inactive[slots] != 0
+        resting = slots[inactive]
+        if len(resting):  # deer rests after depositing materials
+            self.inactive[resting] = (self.inactive[resting] + 1) % self.smoothness[resting]
+            for slot in resting[self.inactive[resting] == 0].tolist():  # the rest is over
+                self.deers[slot].tally.inactive_deers -= 1
+            for world, searching_marker in self.by_world(resting[~self.has_marker[resting]]):
+                if world.scent is None:
+                    # avoid markers that have not reached santa's house
+                    valid_markers = world.markers.valid()
+                    if valid_markers:
+                        for slot in searching_marker.tolist():
+                            self.deers[slot].marker = self.deers[slot].rng.choice(valid_markers)
+
+        active = slots[~inactive]
+        loaded = self.has_resource[active]
+        self.return_to_home(active[loaded])
+        carrying = active[loaded]
+        for world, scenting in self.by_world(carrying[self.scenting[carrying]]):
+            if world.scent is not None:  # lay the trails
+                world.scent.deposit_batch(self.position[scenting])
+
+        active = active[~loaded]
+        following = self.has_marker[active]
+        self.follow_marker(active[following])
+
+        # deers with neither a resource nor a marker follow the trails away from home if there are any,
+        # else they move around pseudo-randomly (and look for crossed markers)
+        searching = active[~following]
+        walking = np.ones(len(searching), bool)
+        for world, group in self.by_world(searching):
+            if world.scent is not None:
+                found, targets = world.scent.uphill_batch(self.position[group], self.home[group])
+                self.move_towards(group[found], targets[found])
+                walking &= ~np.isin(searching, group[found])
+        self.random_walk(searching[walking])
+        markers = np.array([world.scent is None for world in self.attached])
+        self.find_markers(searching[walking & markers[self.world[searching]]])
+
+    def move_to_distribute(self, slots: "np.ndarray") -> None:
+        """
+        Batched Deer.move_to_distribute
+        :param slots: rows of the deers to move (of one or more worlds in the distribution phase)
+        """
+        for slot in slots[~self.distributing[slots]].tolist():
+            self.deers[slot].start_distributing()
+
+        self.old_position[slots] = self.position[slots]
+
+        active = slots[self.inactive[slots] == 0]  # resting deers wait for a path (see Deer.pick_path)
+        loaded = self.has_resource[active]
+        self.return_to_home(active[loaded])  # still in collection mode, go home and finish job
+
+        active = active[~loaded]
+        on_path = active[self.has_path[active]]
+        finished = np.array([self.paths[slot].is_finished() for slot in on_path.tolist()], bool)
+
+        delivering = on_path[~finished] if len(on_path) else on_path
+        paths = [self.paths[slot] for slot in delivering.tolist()]
+        self.move_towards(delivering, np.array([path.next_center() for path in paths], float).reshape(-1, 2))
+        for slot, path in zip(delivering.tolist(), paths):
+            if path.next_house_contains(tuple(self.position[slot].tolist())):
+                deer = self.deers[slot]
+                deerlog.debug("Deer #%s gave toy to %s", deer.index, deer.path.get_next_kid().name)
+                deer.give_toy()
+
+        done = on_path[finished] if len(on_path) else on_path
+        for slot in done.tolist():
+            self.paths[slot] = None
+        self.has_path[done] = False
+        self.return_to_home(done)
+        for slot in on_path.tolist():
+            self.deers[slot].distr_log.append(tuple(self.position[slot].tolist()))
+
+        idle = active[~self.has_path[active]]
+        idle = idle[~np.isin(idle, done)]
+        for slot in idle.tolist():
+            self.deers[slot].distr_log.append(tuple(self.position[slot].tolist()))
+        self.return_to_home(idle)
+    # endregion
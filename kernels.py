@@ -0,0 +1,141 @@
+"""
+Optional compiled step kernels for the Herd. Every kernel is a plain loop over the rows of a batch, which Numba
+compiles to machine code for the CPU. fastmath is not used, so the kernels compute exactly what the NumPy code of
+the Herd and the python backend compute, operation by operation (distances are squared by multiplication, like
+euclidean_norm does), and all of them give bitwise the same results (see consistency.py).
+Numba is optional. Without it the Herd keeps its NumPy code, and kernels = 'numba' falls back to 'numpy' with a
+warning.
+The scalar helpers of helper_functions.py stay plain Python: calling a compiled function from Python costs more
+than the few operations of such a helper.
+Author: Maximilian Janisch
+"""
+
+__all__ = ("KERNELS", "numba_available", "select_kernels",
+           "move_towards_kernel", "segments_intersect_kernel", "inside_circles_kernel")
+
+from typing import *  # library for type hints
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is only needed for the kernels
+    np = None
+
+try:
+    import numba
+except ImportError:  # Numba is only needed for kernels = 'numba'
+    numba = None
+
+from logs import *
+
+KERNELS = ("numpy", "numba")
+
+
+def numba_available() -> bool:
+    """
+    Returns True if the kernels can be compiled
+    """
+    return numba is not None and np is not None
+
+
+def select_kernels(kernels: str) -> str:
+    """
+    Returns the kernels which are actually used for the requested ones
+    :param kernels: "numpy" or "numba"
+    :return: kernels, or "numpy" if Numba is not installed
+    """
+    if kernels not in KERNELS:
+        raise ValueError(f"Unknown kernels {kernels}, use one of {KERNELS}")
+    if kernels == "numba" and not numba_available():
+        enginelog.warning("Numba is not installed, the numpy kernels are used instead")
+        return "numpy"
+    return kernels
+
+
+def _jit(function: Callable) -> Callable:
+    """
+    Compiles function with Numba if it is installed (the result is cached next to this file)
+    """
+    if numba is None:
+        return function
+    return numba.njit(cache=True, nogil=True)(function)
+
+
+@_jit
+def move_towards_kernel(position, destinations, dx) -> None:
+    """
+    Compiled Herd.move_towards: moves every row of position by at most dx towards its destination (in place)
+    :param position: positions, shape (n, 2)
+    :param destinations: destinations, shape (n, 2)
+    :param dx: maximal step of every row, shape (n,)
+    """
+    for i in range(position.shape[0]):
+        x = destinations[i, 0] - position[i, 0]
+        y = destinations[i, 1] - position[i, 1]
+        euclidean_distance = np.sqrt(x * x + y * y)
+        if euclidean_distance != 0:
+            step = min(dx[i], euclidean_distance)
+            position[i, 0] += step * x / euclidean_distance
+            position[i, 1] += step * y / euclidean_distance
+        else:  # like adding the 0 of the NumPy code (turns -0.0 into 0.0)
+            position[i, 0] += 0.
+            position[i, 1] += 0.
+
+
+@_jit
+def _orientation(px, py, qx, qy, rx, ry) -> float:
+    """
+    orientation of helper_functions for the points (px, py), (qx, qy), (rx, ry)
+    """
+    return (qx - px) * (ry - py) - (qy - py) * (rx - px)
+
+
+@_jit
+def _in_box(ax, ay, bx, by, x, y) -> bool:
+    """
+    _in_box of helper_functions for the segment (ax, ay) -> (bx, by) and the point (x, y)
+    """
+    return min(ax, bx) <= x <= max(ax, bx) and min(ay, by) <= y <= max(ay, by)
+
+
+@_jit
+def segments_intersect_kernel(p1, p2, q1, q2) -> "np.ndarray":
+    """
+    Compiled segments_intersect_batch for arrays of shape (n, 2)
+    :return: element i tells whether the segments (p1[i] -> p2[i]) and (q1[i] -> q2[i]) intersect
+    """
+    result = np.zeros(p1.shape[0], np.bool_)
+    for i in range(p1.shape[0]):
+        ax, ay, bx, by = p1[i, 0], p1[i, 1], p2[i, 0], p2[i, 1]
+        cx, cy, dx, dy = q1[i, 0], q1[i, 1], q2[i, 0], q2[i, 1]
+        d1 = _orientation(cx, cy, dx, dy, ax, ay)
+        d2 = _orientation(cx, cy, dx, dy, bx, by)
+        d3 = _orientation(ax, ay, bx, by, cx, cy)
+        d4 = _orientation(ax, ay, bx, by, dx, dy)
+        if ((d1 > 0 > d2) or (d1 < 0 < d2)) and ((d3 > 0 > d4) or (d3 < 0 < d4)):
+            result[i] = True  # proper crossing
+        else:  # collinear (or touching) cases
+            result[i] = (d1 == 0 and _in_box(cx, cy, dx, dy, ax, ay)) or (d2 == 0 and _in_box(cx, cy, dx, dy, bx, by)) \
+                or (d3 == 0 and _in_box(ax, ay, bx, by, cx, cy)) or (d4 == 0 and _in_box(ax, ay, bx, by, dx, dy))
+    return result
+
+
+@_jit
+def inside_circles_kernel(points, groups, centers, radii) -> "np.ndarray":
+    """
+    Compiled search of Herd.inside_locations: element i tells whether points[i] lies in one of the circles of its
+    group (the padding of the groups has negative radii)
+    :param points: points, shape (n, 2)
+    :param groups: group of every point, shape (n,)
+    :param centers: centers of the circles of every group, shape (groups, width, 2)
+    :param radii: radii of the circles of every group, shape (groups, width)
+    """
+    result = np.zeros(points.shape[0], np.bool_)
+    for i in range(points.shape[0]):
+        group = groups[i]
+        for j in range(centers.shape[1]):
+            x = centers[group, j, 0] - points[i, 0]
+            y = centers[group, j, 1] - points[i, 1]
+            if np.sqrt(x * x + y * y) <= radii[group, j]:
+                result[i] = True
+                break
+    return result
@@ -2,31 +2,69 @@
 Eine Python-Bibliothek, welche importierbare Standard-Logger wie
 "mainlog" bereitstellt. Zudem können benutzerdefinierte Logger mittels get_logger erstellt werden.
 
+Die Logger schreiben nicht selbst in die Dateien: Meldungen werden (nur falls ihr Level aktiv ist) in eine Queue
+gestellt und von einem QueueListener in einem eigenen Thread formatiert und gespeichert. Sind alle Argumente einer
+Meldung unveränderlich (Zahlen, Strings, Tupel davon), wird auch die Meldung selbst erst im Listener zusammengesetzt. Jedes Subsystem
+(deerlog, enginelog, worldlog, statelog) hat ein eigenes Level, siehe configure_logging.
+
 Autor: Maximilian Janisch
 """
-__all__ = ('get_logger', 'mainlog')
+__all__ = ('get_logger', 'log_to_files', 'configure_logging', 'mainlog', 'deerlog', 'enginelog', 'worldlog',
+           'statelog')
 
+import atexit
+import configparser
 import logging
+import logging.handlers
+import os
+import queue
+from typing import *  # library for type hints
 
 
-def get_logger(name: str, formatter: logging.Formatter, debug_file: str, warning_file: str):
+_PLAIN = (int, float, str, bytes, bool, type(None))  # unveränderliche Typen, siehe _plain
+
+
+def _plain(value: Any) -> bool:
     """
-    Hat als Output einen Logger mit Namen name, welcher entsprechend formatter wichtige Mitteilung in warning_file und
-    "unwichtige" Mitteilungen in debug_file speichert.
-    :param formatter: Formatter, nach welchem Log-Meldungen gespeichert werden
-    :param name: Name des Loggers
-    :param debug_file: Debug Meldungen werden hier gespeichert
-    :param warning_file: Wichtige Meldungen werden hier gespeichert
-    :return: Logger entsprechend den obigen Angaben
+    Gibt True zurück, falls value unveränderlich ist (eine Zahl, ein String oder ein Tupel davon)
     """
+    return isinstance(value, _PLAIN) or type(value) is tuple and all(_plain(item) for item in value)
+
+
+class Queue_Handler(logging.handlers.QueueHandler):
+    """
+    QueueHandler, welcher im aufrufenden Thread nur dann die Meldung selbst zusammensetzt, wenn eines der Argumente
+    veränderlich ist (ein geloggtes Objekt kann sich ändern, bis der Listener die Meldung speichert). Meldungen mit
+    unveränderlichen Argumenten (z. B. Indizes und Anzahlen) setzt erst der QueueListener zusammen, ebenso
+    übernimmt er Zeitstempel, Formatter und das Schreiben in die Dateien.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if not _plain(record.args):  # args ist ein Tupel (oder ein Dict mit benannten Argumenten)
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+# Laufende Pipelines: Name des Loggers -> (Listener, Formatter, Debug-Datei, Warnungs-Datei)
+_pipelines: Dict[str, Tuple[logging.handlers.QueueListener, logging.Formatter, str, str]] = {}
+
+
+def _start_pipeline(name: str, formatter: logging.Formatter, debug_file: str, warning_file: str):
+    """
+    Hängt an den Logger mit Namen name einen Queue_Handler, dessen Meldungen ein QueueListener in debug_file
+    (alle Meldungen) und warning_file (ab WARNING) speichert. Eine bestehende Pipeline wird vorher geleert.
+    """
+    _stop_pipeline(name)
     logger = logging.getLogger(name)
-    logger.setLevel(logging.DEBUG)
 
     # Handler 1 (Debug)
-    filehandler_debug = logging.FileHandler(debug_file)
+    filehandler_debug = logging.FileHandler(debug_file, delay=True)  # Dateien erst beim ersten Eintrag erstellen
     filehandler_debug.setLevel(logging.DEBUG)
     # Handler 2 (Wichtig)
-    filehandler_important = logging.FileHandler(warning_file)
+    filehandler_important = logging.FileHandler(warning_file, delay=True)
     filehandler_important.setLevel(logging.WARNING)
 
     # Initialisiere Formatter
@@ -36,13 +74,102 @@ def get_logger(name: str, formatter: logging.Formatter, debug_file: str, warning
     while logger.handlers:  # verhindert doppelte Logs bei mehrfacher Erstellung eines Loggers
         logger.removeHandler(logger.handlers[0])
 
-    logger.addHandler(filehandler_debug)
-    logger.addHandler(filehandler_important)
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(Queue_Handler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, filehandler_debug, filehandler_important,
+                                              respect_handler_level=True)
+    listener.start()
+    _pipelines[name] = (listener, formatter, debug_file, warning_file)
+
 
+def _stop_pipeline(name: str):
+    """
+    Speichert alle noch wartenden Meldungen des Loggers mit Namen name und schliesst seine Dateien
+    """
+    if name in _pipelines:
+        listener = _pipelines.pop(name)[0]
+        if listener._thread is not None:
+            listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+def _stop_all():
+    for name in list(_pipelines):
+        _stop_pipeline(name)
+
+
+def _restart_after_fork():
+    """
+    Nach einem fork läuft der Listener-Thread im Kindprozess nicht mehr, er wird deshalb neu gestartet
+    """
+    for name, (listener, formatter, debug_file, warning_file) in list(_pipelines.items()):
+        listener._thread = None  # der Thread gehört dem Elternprozess
+        _start_pipeline(name, formatter, debug_file, warning_file)
+
+
+def get_logger(name: str, formatter: logging.Formatter, debug_file: str, warning_file: str):
+    """
+    Hat als Output einen Logger mit Namen name, welcher entsprechend formatter wichtige Mitteilung in warning_file und
+    "unwichtige" Mitteilungen in debug_file speichert (asynchron, siehe Queue_Handler).
+    :param formatter: Formatter, nach welchem Log-Meldungen gespeichert werden
+    :param name: Name des Loggers
+    :param debug_file: Debug Meldungen werden hier gespeichert
+    :param warning_file: Wichtige Meldungen werden hier gespeichert
+    :return: Logger entsprechend den obigen Angaben
+    """
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.DEBUG)
+    _start_pipeline(name, formatter, debug_file, warning_file)
     return logger
 
 
+def log_to_files(debug_file: str, warning_file: str, logger: logging.Logger = None):
+    """
+    Lässt einen mit get_logger erstellten Logger (standardmässig mainlog samt Subsystemen) ab sofort in andere Dateien
+    schreiben, z. B. eigene Dateien pro Prozess oder pro Simulation.
+    :param debug_file: Debug Meldungen werden hier gespeichert
+    :param warning_file: Wichtige Meldungen werden hier gespeichert
+    :param logger: der umzuleitende Logger
+    """
+    name = (logger or mainlog).name
+    _start_pipeline(name, _pipelines[name][1], debug_file, warning_file)
+
+
+def configure_logging(file: str = None, level: str = None):
+    """
+    Setzt die Levels von mainlog und den Subsystemen gemäss dem Abschnitt [Logging] der Konfigurationsdatei.
+    Mit files = 'process' schreibt jeder Prozess in eigene Dateien (z. B. mainDebug_1234.log).
+    :param file: Pfad zur Konfigurationsdatei (optional)
+    :param level: falls angegeben, gilt dieses Level (z. B. 'WARNING') für alle Subsysteme
+    """
+    settings = {}
+    if file:
+        config = configparser.ConfigParser()
+        config.read(file, encoding="utf-8")
+        if config.has_section("Logging"):
+            settings = {key: eval(value) for key, value in config["Logging"].items()}
+
+    mainlog.setLevel(level or settings.get("main", "DEBUG"))
+    for name, logger in subsystems.items():
+        logger.setLevel(level or settings.get(name, logging.NOTSET))  # NOTSET: Level von mainlog
+
+    if settings.get("files") == "process":
+        log_to_files(f"mainDebug_{os.getpid()}.log", f"main_{os.getpid()}.log")
+
+
+atexit.register(_stop_all)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
 # Defaults
 default_formatter = logging.Formatter('[{asctime}] | {levelname} | PID: {process} / File: {filename}, line {lineno}'
                                       ' | {name}: {message}', style='{', datefmt='%d. %m. %Y / %H:%M:%S')
 mainlog = get_logger("MainLog", default_formatter, "mainDebug.log", "main.log")
+
+# Subsysteme (schreiben über mainlog, haben aber eigene Levels)
+deerlog = mainlog.getChild("Deer")  # Bewegungen und Entscheidungen der Rentiere
+enginelog = mainlog.getChild("Engine")  # Zustandswechsel der Simulation
+worldlog = mainlog.getChild("World")  # Erzeugung der Welt, Produktion und Verteilung
+statelog = mainlog.getChild("State")  # Momentaufnahmen aller Rentiere etc. (einmal pro Sekunde)
+subsystems = {"deer": deerlog, "engine": enginelog, "world": worldlog, "state": statelog}
@@ -1,156 +1,86 @@
 """
 Main file of the Santa Hunt project
+Usage: python main.py simulates a hunt, python main.py <file> plays a recorded hunt (see replay.py)
 Authors: Maximilian Janisch, Robert Scherrer, Atsuhiro Funatsu
 """
 
 import sys
-from enum import Enum
 
 import PyQt5.QtCore
 import PyQt5.QtWidgets
 
+from clock import *
+from engine import *
 from global_variables import *
 from gui import Santa_GUI
 from logs import *
+from replay import *
 from statistics import Statistics
 
 
-class Process_State(Enum):
-    start = 0
-    collect = 1
-    produce = 2
-    distribute = 3
-    finished = 4
-
-
-world = World("config.ini")  # reads Config and generates Resources, Locations, Deers
-
-iter_ = 0
-state_ = Process_State.start
-
-
-# region Main Function
-def main():  # one step of the main loop
-    global iter_, state_
-
-    if state_ == Process_State.start:
-        for deer in world.deers:  # All deers leave Santa's house
-            deer.move_to_collect(world.dx, world.santa_house, world.N, world.markers)
-        state_ = Process_State.collect
-
-    elif state_ == Process_State.collect:
-        for deer in world.deers:
-            deer.move_to_collect(world.dx, world.santa_house, world.N, world.markers)
-            for location in world.locations:  # checks if the deer hit a natural resource
-                if location.point_in_circle(deer.position) and not deer.resource and (
-                        location.amount > 0):  # a searching deer hits a resource
-                    deer.load_resource(location, world.Lp, world.markers)  # deer loads resource
-                    world.latest_event = f'Latest event: Deer #{deer.index} collected \'{location.resource.name}\' (time: {iter_:.2f})'
-
-                    if location.amount == 0:  # checks if resource location is depleted
-                        world.locations.remove(location)
-                        world.resources_with_emptied_locations.append(location.resource.name)
-                        world.latest_event = f'Latest event: Resource \'{location.resource.name}\' was depleted by deer #{deer.index} (time: {iter_:.2f})'
-                    else:
-                        already_marked = False
-                        for marker in world.markers:
-                            already_marked = already_marked or (marker.location == location)
-                        if not already_marked:
-                            world.markers.append(deer.start_marker(location, world.santa_house.center))  # add marker
-                    break  # one deer can not collect multiple Resources at once
-
-        if iter_ % 1 < (1 / world.animation_smoothness):
-            mainlog.debug(f"Time: {round(iter_)} seconds / Deers: {world.deers} / Resources: {world.resources} "
-                          f"/ Markers: {world.markers}")
-
-        # criteria to end collection
-        if iter_ > world.T or (all(resource_.name in world.resources_with_emptied_locations
-                                   for resource_ in world.resources)
-                               and all(deer.loaded == 0 for deer in world.deers)):
-            mainlog.debug(f"Collection finished at time {iter_}")
-            state_ = Process_State.produce
-            world.markers = []  # remove all markers
-            stats.analyze_collection()
-
-    elif state_ == Process_State.produce:
-        # produce toys
-        world.produce_toys()
-        world.calculate_distribution()
-        state_ = Process_State.distribute
-        # add time spent to the budget we have
-        world.T_dist += iter_
-
-        gui.show_popup(world)
-        gui.draw_a_priori_paths = True
-
-    elif state_ == Process_State.distribute:
-        # start distribution
-        time_left = world.T_dist - iter_
-        time_to_go_home = max(deer.steps_to_destination(world.dx, world.santa_house.center) for deer in world.deers)
-        if time_left <= time_to_go_home:
-            # go home before the kids wake up
-            if all(world.santa_house.point_in_square(deer_.position) for deer_ in world.deers):
-                state_ = Process_State.finished
-                gui_updates.stop()
-                gui.game_finished(iter_)
-                gui.close()
-            for deer in world.deers:
-                deer.return_to_home(world.dx, world.santa_house)
-        else:
-            # continue distribution
-            for deer in world.deers:
-                deer.move_to_distribute(world.dx, world.santa_house, world.distribution_paths)
-
-            if abs(iter_ % 1 - 0) < (1 / world.animation_smoothness):
-                mainlog.debug(f"Time: {round(iter_)} / Deers: {world.deers} / Paths: {world.distribution_paths}")
-
-            # finish early if the job is done
-            if all(path.is_finished() for path in world.distribution_paths):
-                # yeah, all paths were followed successfully
-                if all(deer.inactive for deer in world.deers):
-                    # the deers are resting
-                    mainlog.debug(
-                        f"Distribution finished by {len(world.deers)} deers on {len(world.distribution_paths)} paths.")
-                    state_ = Process_State.finished
-                    stats.close()
-                    gui_updates.stop()
-                    gui.game_finished(iter_)
-                    gui.close()
-
-    iter_ += 1 / world.animation_smoothness
-    world.gui_time += 1 / world.animation_smoothness
-
-    for marker in world.markers:
-        if marker.is_disabled():
-            world.markers.remove(marker)
+# region GUI
+def animation_next():
+    """
+    Updates the program logic by the ticks which are due (see Frame_Clock) and renders one frame
+    """
+    if clock.advance(engine_step):  # next steps of loop
+        gui.update_world(world)  # update
+        gui.update()  # GUI (Qt skips the frame if the last one is still being painted)
 
 
-# endregion
+def engine_step() -> bool:
+    """
+    Advances the engine by one tick
+    :return: False once the hunt is over
+    """
+    engine.step()
+    return not engine.is_finished()
 
 
-# region GUI
-def animation_next():
+def toys_produced(world_: World):
     """
-    Updates the program logic and GUI
+    Shows the toys which were produced and starts drawing the planned paths
     """
-    main()  # next step of loop
-    gui.update_world(world)  # update
-    gui.repaint()  # GUI
+    gui.show_popup(world_)
+    gui.draw_a_priori_paths = True
+    clock.reset()  # the time in which the pop-up was open is not simulated
 
-    stats.update(iter_)  # update stats
+
+def hunt_finished(iter_: float):
+    """
+    Stops the animation once the engine reports that the hunt is over
+    """
+    gui_updates.stop()
+    gui.game_finished(iter_)
+    gui.close()
 
 # endregion
 
 
 # region mainloop
-stats = Statistics(world)
-app = PyQt5.QtWidgets.QApplication(sys.argv)
-gui_updates = PyQt5.QtCore.QTimer()
-gui_updates.timeout.connect(animation_next)
-gui_updates.start(1000 // world.animation_smoothness)  # delay in milliseconds
-gui = Santa_GUI(world)
-app.exec_()
-
+if __name__ == "__main__" and len(sys.argv) > 1:
+    configure_logging("config.ini")
+    app = PyQt5.QtWidgets.QApplication(sys.argv)
+    with Replay(sys.argv[1]) as replay:
+        gui = Santa_GUI(None, replay)
+        app.exec_()
+
+elif __name__ == "__main__":
+    configure_logging("config.ini")
+    world = World("config.ini")  # reads Config and generates Resources, Locations, Deers
+    stats = Statistics(world)
+    engine = Engine(world, stats)
+    engine.on_produced = toys_produced
+    engine.on_finished = hunt_finished
+
+    app = PyQt5.QtWidgets.QApplication(sys.argv)
+    gui_updates = PyQt5.QtCore.QTimer()
+    gui_updates.timeout.connect(animation_next)
+    frame_time = 1000 // world.animation_smoothness  # delay between two frames in milliseconds
+    clock = Frame_Clock(world.animation_smoothness, frame_time / 1000)
+    gui_updates.start(frame_time)
+    gui = Santa_GUI(world, clock=clock)
+    app.exec_()
+
+    mainlog.info("Final result: %s", world.resources)
 # endregion
-
-mainlog.info(f"Final result: {world.resources}")
@@ -0,0 +1,156 @@
+"""
+Registry of all markers of a world with O(1) lookups by location and by state.
+Author: Maximilian Janisch
+"""
+
+__all__ = ("Marker_Registry",)
+
+from typing import *  # library for type hints
+
+from geometry import *
+from spatial_index import *
+
+
+class Marker_Registry:
+    """
+    Holds the markers of a world. Markers can be looked up by location, by state ("painting", "complete",
+    "erasing") and spatially (see Marker_Grid). Complete markers (the ones which reach Santa's house and thus
+    can be picked by resting deers) are kept in a list with swap-remove, so picking one is O(1) as well.
+    Iterating over the registry yields the markers in insertion order.
+    """
+    states = ("painting", "complete", "erasing")
+
+    def __init__(self, cell_size: float):
+        """
+        Initializes the Marker_Registry class
+        :param cell_size: edge length of the cells of the Marker_Grid
+        """
+        self.grid = Marker_Grid(cell_size)
+        self.markers: Dict[Marker, None] = {}  # insertion ordered set
+        self.by_location: Dict[Location, Marker] = {}
+        self.location_of: Dict[Marker, Location] = {}  # disabled markers forget their location
+        self.by_state: Dict[str, Set[Marker]] = {state: set() for state in self.states}
+        self.state_of: Dict[Marker, str] = {}
+        self.homebound: List[Marker] = []  # markers which reached Santa's house
+        self.homebound_index: Dict[Marker, int] = {}
+        self.changed: Dict[Marker, None] = {}  # markers with pending changes
+
+    def __repr__(self):
+        return f"{list(self.markers)}"
+
+    def __iter__(self) -> Iterator[Marker]:
+        return iter(self.markers)
+
+    def __len__(self):
+        return len(self.markers)
+
+    def __contains__(self, marker: Marker) -> bool:
+        return marker in self.markers
+
+    def add(self, marker: Marker) -> None:
+        """
+        Adds a new marker
+        """
+        self.markers[marker] = None
+        self.by_location[marker.location] = marker
+        self.location_of[marker] = marker.location
+        marker.registry = self
+        self.grid.add(marker)
+        self._update_state(marker)
+
+    def remove(self, marker: Marker) -> None:
+        """
+        Removes a marker
+        """
+        del self.markers[marker]
+        location = self.location_of.pop(marker)
+        if self.by_location.get(location) is marker:
+            del self.by_location[location]
+        self.by_state[self.state_of.pop(marker)].discard(marker)
+        self._set_homebound(marker, False)
+        self.changed.pop(marker, None)
+        self.grid.remove(marker)
+        marker.registry = None
+
+    def clear(self) -> None:
+        """
+        Removes all markers
+        """
+        for marker in self.markers:
+            marker.registry = None
+        self.__init__(self.grid.cell_size)
+
+    def for_location(self, location: Location) -> Optional[Marker]:
+        """
+        Returns the marker which leads to location (None if there is none)
+        """
+        return self.by_location.get(location)
+
+    def in_state(self, state: str) -> Set[Marker]:
+        """
+        Returns all markers in state ("painting", "complete" or "erasing")
+        """
+        return self.by_state[state]
+
+    def valid(self) -> List[Marker]:
+        """
+        Returns the markers which reach Santa's house (do not modify the list)
+        """
+        return self.homebound
+
+    def set_homebound(self, markers: List[Marker]) -> None:
+        """
+        Replaces the order of the markers which reach Santa's house (e.g. when a snapshot is restored, as
+        deers pick from valid() by index)
+        :param markers: the markers of valid() in their new order
+        """
+        if set(markers) != set(self.homebound):
+            raise ValueError("Marker_Registry.set_homebound: the markers have to be the ones which reach Santa's house")
+        self.homebound = list(markers)
+        self.homebound_index = {marker: index for index, marker in enumerate(self.homebound)}
+
+    def hit(self, start: Tuple[float, float], end: Tuple[float, float]) -> Optional[Marker]:
+        """
+        Returns the first marker (in insertion order) which the segment (start -> end) touches, else None
+        """
+        return self.grid.hit(start, end)
+
+    def commit(self) -> None:
+        """
+        Commits the pending changes of all changed markers (see Marker.commit). Disabled markers are dropped.
+        """
+        changed, self.changed = self.changed, {}
+        for marker in changed:
+            marker.commit()
+            if marker.is_disabled():
+                self.remove(marker)
+            else:
+                self.grid.update(marker)
+                self._update_state(marker)
+
+    def _update_state(self, marker: Marker) -> None:
+        """
+        Moves marker to the bucket of its current state
+        """
+        old_state = self.state_of.get(marker)
+        new_state = marker.state
+        if old_state != new_state:
+            if old_state:
+                self.by_state[old_state].discard(marker)
+            self.by_state[new_state].add(marker)
+            self.state_of[marker] = new_state
+        self._set_homebound(marker, marker.is_complete)
+
+    def _set_homebound(self, marker: Marker, homebound: bool) -> None:
+        """
+        Adds marker to (or removes it from) the list of markers which reach Santa's house
+        """
+        if homebound and marker not in self.homebound_index:
+            self.homebound_index[marker] = len(self.homebound)
+            self.homebound.append(marker)
+        elif not homebound and marker in self.homebound_index:
+            index = self.homebound_index.pop(marker)
+            last = self.homebound.pop()
+            if last is not marker:  # swap-remove
+                self.homebound[index] = last
+                self.homebound_index[last] = index
@@ -0,0 +1,264 @@
+"""
+Runs large batches of seeded hunts on all cores and aggregates their results.
+Usage: python monte_carlo.py --runs 1000 --workers 64 --chunksize 4 --set D=6 --set K=20
+With --ensemble 100 every worker simulates 100 hunts at once in lockstep (see ensemble.py).
+Author: Maximilian Janisch
+"""
+
+__all__ = ("Hunt_Job", "Hunt_Result", "Hunt_Summary", "make_jobs", "run_hunt", "run_ensemble", "run_hunts")
+
+import argparse
+import ast
+import multiprocessing
+import os
+from typing import *  # library for type hints
+
+from engine import *
+from ensemble import *
+from event_engine import *
+from global_variables import *
+from logs import *
+from replay import *
+from snapshot import *
+
+
+class Hunt_Job(NamedTuple):
+    """
+    Everything a worker process needs to know in order to simulate one hunt
+    """
+    seed: int
+    overrides: Dict[str, Any] = {}  # replaces values of the config file, see World
+    config: str = "config.ini"
+    stats_file: str = None  # if given, the csv statistics of the run are written to this file
+    events: bool = False  # simulate with the Event_Engine instead of tick by tick
+    snapshot: str = None  # if given, the hunt continues from this snapshot (seed and config are taken from it)
+    checkpoint: str = None  # if given, a snapshot is written to this file at the end of the collection
+    replay: str = None  # if given, the run is recorded into this file (see replay.py)
+
+
+class Hunt_Result(NamedTuple):
+    """
+    Outcome of one simulated hunt
+    """
+    seed: int
+    overrides: Dict[str, Any]
+    D: int
+    T: int
+    collected: Dict[str, int]  # collected amount per resource name at the end of the collection
+    toys: int
+    lucky_kids: int  # kids who were assigned a toy
+    delivered: int  # kids who actually received their toy
+    collection_time: float
+    finish_time: float
+
+    @property
+    def delivery_ratio(self) -> float:
+        """
+        Returns the share of the assigned toys which were delivered (1 if no toys were assigned)
+        """
+        return self.delivered / self.lucky_kids if self.lucky_kids else 1.0
+
+
+class Hunt_Summary:
+    """
+    Aggregates Hunt_Results as they stream in
+    """
+    def __init__(self):
+        self.runs = 0
+        self.collected_sums: Dict[str, int] = {}
+        self.collected_runs: Dict[str, int] = {}  # resources are sampled per world, so each one has its own count
+        self.delivery_ratio_sum = 0.
+        self.collection_time_sum = 0.
+        self.finish_time_sum = 0.
+
+    def __repr__(self):
+        return f"Summary of {self.runs} hunts | mean delivery ratio {self.mean_delivery_ratio:.3f} " \
+               f"| mean finish time {self.mean_finish_time:.2f}"
+
+    def add(self, result: Hunt_Result) -> None:
+        """
+        Adds the result of one hunt to the summary
+        :param result: the result to add
+        """
+        self.runs += 1
+        for name, amount in result.collected.items():
+            self.collected_sums[name] = self.collected_sums.get(name, 0) + amount
+            self.collected_runs[name] = self.collected_runs.get(name, 0) + 1
+        self.delivery_ratio_sum += result.delivery_ratio
+        self.collection_time_sum += result.collection_time
+        self.finish_time_sum += result.finish_time
+
+    @property
+    def mean_collected(self) -> Dict[str, float]:
+        """
+        Mean collected amount per resource name (over the hunts in which the resource existed)
+        """
+        return {name: self.collected_sums[name] / self.collected_runs[name] for name in sorted(self.collected_sums)}
+
+    @property
+    def mean_delivery_ratio(self) -> float:
+        return self.delivery_ratio_sum / self.runs if self.runs else 0.
+
+    @property
+    def mean_collection_time(self) -> float:
+        return self.collection_time_sum / self.runs if self.runs else 0.
+
+    @property
+    def mean_finish_time(self) -> float:
+        return self.finish_time_sum / self.runs if self.runs else 0.
+
+
+def make_jobs(runs: int, seed: int = 0, config: str = "config.ini", events: bool = False, snapshot: str = None,
+              replays: str = None, **overrides) -> List[Hunt_Job]:
+    """
+    Creates runs jobs with consecutive seeds and the same overrides
+    :param runs: number of jobs
+    :param seed: seed of the first job
+    :param config: path to the config file
+    :param events: simulate with the Event_Engine
+    :param snapshot: continue every job from this snapshot instead (only makes sense with different overrides)
+    :param replays: record every job into this directory (as hunt_<seed>.replay)
+    :return: list of jobs
+    """
+    return [Hunt_Job(seed + i, overrides, config, events=events, snapshot=snapshot,
+                     replay=replays and os.path.join(replays, f"hunt_{seed + i}.replay")) for i in range(runs)]
+
+
+def run_hunt(job: Hunt_Job) -> Hunt_Result:
+    """
+    Simulates one hunt headlessly (this function runs inside the worker processes)
+    :param job: the hunt to simulate
+    :return: its result
+    """
+    engine_class = Event_Engine if job.events else Engine
+    if job.snapshot:
+        engine = load_snapshot(job.snapshot, job.overrides, engine_class)
+        world = engine.world
+    else:
+        world = World(job.config, job.overrides, job.seed)
+        engine = engine_class(world)
+
+    if job.stats_file:
+        from statistics import Statistics  # local import, this module shadows the standard library
+        engine.stats = Statistics(world, job.stats_file)
+    if job.replay:
+        engine.recorder = Replay_Recorder(world, job.replay)
+
+    engine.run_until(Process_State.produce)
+    collected = {resource.name: resource.collected for resource in world.resources}
+    if job.checkpoint:
+        save_snapshot(engine, job.checkpoint)
+    engine.run()
+
+    return _result(job, engine, collected)
+
+
+def run_ensemble(jobs: Sequence[Hunt_Job]) -> List[Hunt_Result]:
+    """
+    Simulates several hunts at once in one Ensemble (this function runs inside the worker processes), the results
+    are the same as the ones of run_hunt with the numpy or the python backend (see consistency.py)
+    :param jobs: the hunts to simulate (without events, snapshot and checkpoint)
+    :return: their results, in the order of jobs
+    """
+    for job in jobs:
+        if job.events or job.snapshot or job.checkpoint:
+            raise ValueError(f"Job {job.seed}: an ensemble can not simulate events, snapshots or checkpoints")
+    ensemble = Ensemble(World(job.config, job.overrides, job.seed) for job in jobs)
+
+    for job, engine in zip(jobs, ensemble.engines):
+        if job.stats_file:
+            from statistics import Statistics  # local import, this module shadows the standard library
+            engine.stats = Statistics(engine.world, job.stats_file)
+        if job.replay:
+            engine.recorder = Replay_Recorder(engine.world, job.replay)
+
+    ensemble.run_until(Process_State.produce)
+    collected = [{resource.name: resource.collected for resource in world.resources} for world in ensemble.worlds]
+    ensemble.run()
+
+    return [_result(job, engine, collected_) for job, engine, collected_ in zip(jobs, ensemble.engines, collected)]
+
+
+def _result(job: Hunt_Job, engine: Engine, collected: Dict[str, int]) -> Hunt_Result:
+    """
+    Returns the result of a finished hunt
+    :param job: the simulated hunt
+    :param engine: its engine
+    :param collected: collected amount per resource name at the end of the collection
+    """
+    world = engine.world
+    return Hunt_Result(world.seed, job.overrides, world.D, world.T, collected, len(world.toys),
+                       sum(1 for row in world.kids if world.kid_table.toy[row]),
+                       sum(world.kid_table.received[row] for row in world.kids),
+                       engine.collection_time, engine.iter_)
+
+
+def _init_worker(log_level: str):
+    """
+    Every worker logs into its own files (e.g. mainDebug_1234.log), so parallel hunts do not interleave
+    """
+    configure_logging(level=log_level)
+    log_to_files(f"mainDebug_{os.getpid()}.log", f"main_{os.getpid()}.log")
+
+
+def run_hunts(jobs: Iterable[Hunt_Job], workers: int = None, chunksize: int = 1,
+              log_level: str = "WARNING", ensemble: int = None) -> Iterator[Hunt_Result]:
+    """
+    Simulates all jobs in a process pool and yields the results as soon as they are finished (in any order)
+    :param jobs: hunts to simulate
+    :param workers: number of worker processes (default: number of cores), 1 runs everything in this process
+    :param chunksize: number of jobs (or ensembles) which are sent to a worker at once
+    :param log_level: level of all loggers in the worker processes (debug logs of every tick are expensive)
+    :param ensemble: if given, the jobs are simulated in ensembles of this many hunts (see run_ensemble)
+    :return: iterator over the results
+    """
+    if ensemble:
+        jobs = list(jobs)
+        batches = [jobs[start:start + ensemble] for start in range(0, len(jobs), ensemble)]
+        function, tasks = run_ensemble, batches
+    else:
+        function, tasks = run_hunt, jobs
+
+    if workers == 1:
+        configure_logging(level=log_level)
+        for result in map(function, tasks):
+            yield from result if ensemble else (result,)
+        return
+
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(log_level,)) as pool:
+        for result in pool.imap_unordered(function, tasks, chunksize):
+            yield from result if ensemble else (result,)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs many seeded Santa hunts in parallel")
+    parser.add_argument("--runs", type=int, default=100, help="number of hunts")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first hunt")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--chunksize", type=int, default=1, help="number of hunts sent to a worker at once")
+    parser.add_argument("--config", default="config.ini", help="path to the config file")
+    parser.add_argument("--events", action="store_true",
+                        help="skip the ticks in which the deers only move straight ahead (see Event_Engine)")
+    parser.add_argument("--log-level", default="WARNING", help="level of the logs of the hunts, e.g. DEBUG")
+    parser.add_argument("--snapshot", default=None,
+                        help="continue every hunt from this snapshot (see snapshot.py), e.g. with other --set values")
+    parser.add_argument("--replays", default=None, metavar="DIRECTORY",
+                        help="record every hunt into this directory, play them with python main.py <file>")
+    parser.add_argument("--ensemble", type=int, default=None, metavar="B",
+                        help="simulate B hunts at once per worker in lockstep (needs NumPy, see ensemble.py)")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="overrides a config value with a Python literal, e.g. --set D=6 (D, T, dx, Lp, P, K, N)")
+    arguments = parser.parse_args()
+
+    overrides_ = {key: ast.literal_eval(value) for key, value in (item.split("=", 1) for item in arguments.set)}
+    summary = Hunt_Summary()
+    for result_ in run_hunts(make_jobs(arguments.runs, arguments.seed, arguments.config, arguments.events,
+                                       arguments.snapshot, arguments.replays, **overrides_),
+                             arguments.workers, arguments.chunksize, arguments.log_level, arguments.ensemble):
+        summary.add(result_)
+        print(f"Seed {result_.seed}: delivered {result_.delivered}/{result_.lucky_kids} toys, "
+              f"finished after {result_.finish_time:.2f} seconds")
+
+    print(summary)
+    for name_, mean in summary.mean_collected.items():
+        print(f"{name_}: {mean:.2f}")
@@ -0,0 +1,111 @@
+"""
+Planning of the toy production: decides which toys Santa builds from the collected resources. The planners only
+return the toy types to build, the resources are used when the Toy objects are created (see World.produce_toys).
+Author: Maximilian Janisch
+"""
+
+__all__ = ("demand_vectors", "produce_random", "produce_greedy", "plan_production", "policies")
+
+import random
+from typing import *  # library for type hints
+
+from distribution_classes import *
+from geometry import *
+
+Demand = List[Tuple[int, int]]  # pairs (position of the resource, units needed)
+
+
+def demand_vectors(toy_types: Sequence[Toy_Type], resources: Sequence[Resource]) -> List[Demand]:
+    """
+    Returns for every toy type the units it needs of each resource (only the resources it needs at all)
+    """
+    positions = {id(resource): position for position, resource in enumerate(resources)}
+    result = []
+    for toy_type in toy_types:
+        counts: Dict[int, int] = {}
+        for resource in toy_type.resource_list:
+            counts[positions[id(resource)]] = counts.get(positions[id(resource)], 0) + 1
+        result.append(sorted(counts.items()))
+    return result
+
+
+def produce_random(toy_types: Sequence[Toy_Type], resources: Sequence[Resource],
+                   rng: random.Random = random) -> List[Toy_Type]:
+    """
+    The original policy: draws a toy type which is not depleted yet, builds it if the resources suffice and marks it
+    as depleted otherwise, until every type is depleted. Draws exactly the same numbers from rng as the original
+    loop, so the same seed gives the same toys, but checks a type in O(1) with its demand vector.
+    :param toy_types: the toy types of the world
+    :param resources: the resources of the world
+    :param rng: pseudo-random stream to draw from
+    :return: the toy types to build, in order
+    """
+    supply = [resource.collected for resource in resources]
+    demands = demand_vectors(toy_types, resources)
+    indices = range(len(toy_types))  # rng.choice(indices) draws the same number as rng.choice(toy_types)
+    depleted = [False] * len(toy_types)
+    remaining = len(toy_types)
+    result = []
+    while remaining:
+        index = rng.choice(indices)
+        while depleted[index]:
+            index = rng.choice(indices)
+
+        demand = demands[index]
+        if all(supply[position] >= units for position, units in demand):
+            for position, units in demand:
+                supply[position] -= units
+            result.append(toy_types[index])
+        else:
+            depleted[index] = True
+            remaining -= 1
+    return result
+
+
+def produce_greedy(toy_types: Sequence[Toy_Type], resources: Sequence[Resource],
+                   rng: random.Random = random) -> List[Toy_Type]:
+    """
+    Greedy knapsack which builds as many toys as possible in one pass: the toy types are sorted by how much of the
+    scarce resources they need (the sum of demand / supply) and each type is built as often as the remaining
+    resources allow. Does not draw from rng.
+    :param toy_types: the toy types of the world
+    :param resources: the resources of the world
+    :param rng: unused, for the same signature as produce_random
+    :return: the toy types to build, in order
+    """
+    supply = [resource.collected for resource in resources]
+    demands = demand_vectors(toy_types, resources)
+
+    def pressure(index: int) -> float:
+        if any(supply[position] < units for position, units in demands[index]):
+            return float("inf")
+        return sum(units / supply[position] for position, units in demands[index])
+
+    result = []
+    for index in sorted(range(len(toy_types)), key=pressure):
+        if not demands[index]:
+            continue  # a toy without resources could be built infinitely often
+        amount = min(supply[position] // units for position, units in demands[index])
+        for position, units in demands[index]:
+            supply[position] -= amount * units
+        result.extend([toy_types[index]] * amount)
+    return result
+
+
+policies: Dict[str, Callable[..., List[Toy_Type]]] = {"random": produce_random, "greedy": produce_greedy}
+
+
+def plan_production(toy_types: Sequence[Toy_Type], resources: Sequence[Resource], policy: str = "random",
+                    rng: random.Random = random) -> List[Toy_Type]:
+    """
+    Plans the production with one of the policies
+    :param toy_types: the toy types of the world
+    :param resources: the resources of the world (collected is the supply)
+    :param policy: "random" (the original random policy, seed compatible) or "greedy" (builds as many toys as
+                   possible)
+    :param rng: pseudo-random stream to draw from
+    :return: the toy types to build, in order
+    """
+    if policy not in policies:
+        raise ValueError(f"Unknown production policy {policy}, use one of {list(policies)}")
+    return policies[policy](toy_types, resources, rng)
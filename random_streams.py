@@ -0,0 +1,58 @@
+"""
+Seeded, splittable pseudo-random streams. One master seed determines every stream, and each stream only depends
+on the master seed and its name, so runs can be reproduced and deers can be updated in any order or process.
+Author: Maximilian Janisch
+"""
+
+__all__ = ("Random_Streams", "derive_seed")
+
+import hashlib
+import random
+from typing import *  # library for type hints
+
+
+def derive_seed(seed: int, *path: Any) -> int:
+    """
+    Derives the seed of a child stream
+    :param seed: master seed
+    :param path: name of the child stream, e.g. ("deer", 3)
+    :return: 64 bit seed which only depends on seed and path
+    """
+    digest = hashlib.sha256(repr((seed,) + path).encode()).digest()
+    return int.from_bytes(digest[:8], "little")
+
+
+class Random_Streams:
+    def __init__(self, seed: int = None):
+        """
+        Initializes the Random_Streams class
+        :param seed: master seed, if None it is drawn from the global random module (so random.seed still works)
+        """
+        if seed is None:
+            seed = random.getrandbits(63)
+        self.seed = seed
+
+        self.world = self.spawn("world")  # world generation (santa's house, resources, locations, kids, ...)
+        self.production = self.spawn("production")  # toy production
+        self.deers: Dict[int, random.Random] = {}
+
+    def __repr__(self):
+        return f"Random streams with master seed {self.seed}"
+
+    def spawn(self, *path: Any) -> random.Random:
+        """
+        Creates a new stream which only depends on the master seed and path
+        :param path: name of the stream
+        :return: the new stream
+        """
+        return random.Random(derive_seed(self.seed, *path))
+
+    def deer(self, index: int) -> random.Random:
+        """
+        Returns the stream of the deer with the given index
+        :param index: index of the deer
+        :return: the stream of that deer
+        """
+        if index not in self.deers:
+            self.deers[index] = self.spawn("deer", index)
+        return self.deers[index]
@@ -0,0 +1,392 @@
+"""
+Replays of finished hunts: a Replay_Recorder streams the state of every tick (quantized positions of the deers,
+their flags, the amounts of the locations, the kids which received their toy, the markers and the latest event)
+into a file, a Replay maps the file into memory and seeks to any frame without simulating the hunt again.
+
+Layout of a file (all numbers little endian):
+    magic b"SANTARPL" | format version (uint16) | length of the header (uint32) | header (utf-8 JSON)
+    frames: length of the frame (uint32) | kind (uint8) | state (uint8) | parts (uint8) | time (float64) | ...
+    index: offset of every frame (uint64), then the number of its keyframe (uint64)
+    trailer: offset of the index (uint64) | number of frames (uint64) | b"SANTAEND"
+Every keyframe_interval-th frame is a keyframe with the absolute state (positions as uint16 on a grid over the
+world, the small tables as int32). The frames in between only store the differences of the positions to the
+previous frame (int16) and the changed entries of the tables, the markers and the latest event only if they
+changed. A seek decodes the keyframe and at most keyframe_interval - 1 differences, so it takes constant time
+no matter how long the hunt was. Files of interrupted runs have no index, it is rebuilt by scanning the frames.
+The engines record one frame per step, so the ticks which the Event_Engine jumps over are not in the replay.
+Author: Maximilian Janisch
+"""
+
+__all__ = ("REPLAY_VERSION", "KEYFRAME_INTERVAL", "LOADED", "DISTRIBUTING", "Replay_Frame", "Replay_Recorder",
+           "Replay")
+
+import json
+import mmap
+import struct
+import sys
+from array import array
+from typing import *  # library for type hints
+
+from global_variables import *
+from logs import *
+
+MAGIC = b"SANTARPL"
+END_MAGIC = b"SANTAEND"
+REPLAY_VERSION = 1
+KEYFRAME_INTERVAL = 32  # frames between two keyframes (a seek decodes at most this many frames)
+GRID = 65535  # positions are quantized to GRID + 1 steps per edge of the world
+
+KEYFRAME, DELTA = 0, 1
+MARKERS, EVENT = 1, 2  # bits of the parts which a frame contains
+FRAME = struct.Struct("<IBBBd")  # length, kind, state, parts, time
+TRAILER = struct.Struct("<QQ8s")
+
+# tables of integers which are stored per frame (see Replay_Recorder.current_tables)
+TABLES = ("flags", "toys", "amounts", "received")
+LOADED, DISTRIBUTING = 1, 2  # bits of the flags of a deer
+
+Marker_Record = Tuple[int, Tuple[float, float], Tuple[float, float]]  # (location index, startpoint, endpoint)
+
+
+class Replay_Frame(NamedTuple):
+    """
+    The state of a hunt in one frame of a replay
+    """
+    index: int  # number of the frame
+    time: float  # simulated time in seconds
+    state: int  # value of the Process_State
+    positions: List[Tuple[float, float]]  # positions of the deers
+    flags: List[int]  # LOADED and DISTRIBUTING bits of the deers
+    toys: List[int]  # number of toys loaded by the deers
+    amounts: List[int]  # amounts of the locations (0 once a location was emptied)
+    received: List[int]  # 1 for the kids which received their toy
+    markers: List[Marker_Record]
+    latest_event: str
+
+
+def _pack(typecode: str, values: Iterable) -> bytes:
+    """
+    Returns the values as one little endian block
+    """
+    packed = array(typecode, values)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _unpack(typecode: str, data: memoryview, offset: int, count: int) -> Tuple[array, int]:
+    """
+    Inverse of _pack, reads count values at offset
+    :return: the values and the offset behind them
+    """
+    values = array(typecode)
+    end = offset + count * values.itemsize
+    values.frombytes(data[offset:end])
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values, end
+
+
+class Replay_Recorder:
+    """
+    Writes the frames of a hunt into a replay file (see the module docstring). The engine calls record after
+    every step if it has a recorder (see Engine.recorder).
+    """
+
+    def __init__(self, world: World, file: str, keyframe_interval: int = KEYFRAME_INTERVAL):
+        """
+        Initializes the Replay_Recorder class and writes the header
+        :param world: the world which gets recorded (before its first step, or e.g. after a restored snapshot)
+        :param file: path of the replay file
+        :param keyframe_interval: frames between two keyframes
+        """
+        if keyframe_interval < 1:
+            raise ValueError(f"The keyframe interval has to be at least 1, not {keyframe_interval}")
+        self.world = world
+        self.keyframe_interval = keyframe_interval
+        self.quantum = world.N / GRID  # edge of a cell of the position grid
+        self.steps = GRID / world.N  # grid steps per unit of length
+        self.locations = list(world.locations)  # including the ones which get emptied later on
+        self.location_indices = {id(location): index for index, location in enumerate(self.locations)}
+
+        header = {
+            "version": REPLAY_VERSION, "keyframe_interval": keyframe_interval, "seed": world.seed,
+            "N": world.N, "T": world.T, "smoothness": world.animation_smoothness,
+            "house": {"center": world.santa_house.center, "size": world.santa_house.size},
+            "locations": [{"resource": location.resource.name, "center": location.center,
+                           "colour": world.colours[location.resource.name]} for location in self.locations],
+            "kids": [{"name": kid.name, "center": kid.house.center, "size": kid.house.size}
+                     for kid in world.kid_table.rows(world.kids)],
+            "deers": len(world.deers),
+        }
+        encoded = json.dumps(header).encode("utf-8")
+
+        self.file = open(file, "wb")
+        self.file.write(MAGIC + struct.pack("<HI", REPLAY_VERSION, len(encoded)) + encoded)
+        self.offset = self.file.tell()
+        self.offsets = array("Q")  # offset of every frame
+        self.keys = array("Q")  # number of the keyframe of every frame
+        self.key = 0  # number of the last keyframe
+
+        # state of the previous frame
+        self.positions: List[int] = None
+        self.tables: Dict[str, List[int]] = {}
+        self.markers: List[Tuple[int, ...]] = None
+        self.latest_event: str = None
+
+    def __repr__(self):
+        return f"Replay recorder of {len(self.offsets)} frames into {self.file.name}"
+
+    def quantize(self, value: float) -> int:
+        """
+        Returns the grid step of a coordinate
+        """
+        return min(max(round(value * self.steps), 0), GRID)
+
+    def current_tables(self) -> Dict[str, List[int]]:
+        """
+        Returns the current values of the tables
+        """
+        world = self.world
+        return {
+            "flags": [(LOADED if deer.loaded else 0) | (DISTRIBUTING if deer.is_distributing else 0)
+                      for deer in world.deers],
+            "toys": [deer.loaded_toys() for deer in world.deers],
+            "amounts": [location.amount for location in self.locations],
+            "received": [world.kid_table.received[row] for row in world.kids],
+        }
+
+    def current_markers(self) -> List[Tuple[int, ...]]:
+        """
+        Returns the markers as (location index, quantized startpoint, quantized endpoint)
+        """
+        quantize = self.quantize
+        return [(self.location_indices.get(id(marker.location), -1),
+                 quantize(marker.startpoint[0]), quantize(marker.startpoint[1]),
+                 quantize(marker.endpoint[0]), quantize(marker.endpoint[1])) for marker in self.world.markers]
+
+    def record(self, time: float, state: int) -> None:
+        """
+        Appends the current state of the world as the next frame
+        :param time: simulated time in seconds
+        :param state: value of the Process_State of the engine
+        """
+        steps = self.steps
+        positions = [min(max(round(coordinate * steps), 0), GRID)
+                     for deer in self.world.deers for coordinate in deer.position]
+        tables = self.current_tables()
+        markers = self.current_markers()
+        latest_event = self.world.latest_event
+
+        kind = DELTA
+        if self.positions is None or len(self.offsets) - self.key >= self.keyframe_interval:
+            kind = KEYFRAME
+        else:
+            differences = [new - old for new, old in zip(positions, self.positions)]
+            if any(not -32768 <= difference <= 32767 for difference in differences):
+                kind = KEYFRAME  # e.g. a jump of the Event_Engine over many ticks
+
+        parts = 0
+        if kind == KEYFRAME or markers != self.markers:
+            parts |= MARKERS
+        if kind == KEYFRAME or latest_event != self.latest_event:
+            parts |= EVENT
+
+        body = bytearray()
+        if kind == KEYFRAME:
+            body += _pack("H", positions)
+            for name in TABLES:
+                body += _pack("i", tables[name])
+        else:
+            body += _pack("h", differences)
+            changes = [(table, index, value) for table, name in enumerate(TABLES) if tables[name] != self.tables[name]
+                       for index, (value, old) in enumerate(zip(tables[name], self.tables[name])) if value != old]
+            body += struct.pack("<I", len(changes))
+            body += _pack("B", (change[0] for change in changes))
+            body += _pack("I", (change[1] for change in changes))
+            body += _pack("i", (change[2] for change in changes))
+        if parts & MARKERS:
+            body += struct.pack("<I", len(markers))
+            body += _pack("i", (marker[0] for marker in markers))
+            body += _pack("H", (value for marker in markers for value in marker[1:]))
+        if parts & EVENT:
+            encoded = latest_event.encode("utf-8")
+            body += struct.pack("<I", len(encoded))
+            body += encoded
+
+        if kind == KEYFRAME:
+            self.key = len(self.offsets)
+        self.file.write(FRAME.pack(FRAME.size + len(body), kind, state, parts, time))
+        self.file.write(body)
+        self.offsets.append(self.offset)
+        self.keys.append(self.key)
+        self.offset += FRAME.size + len(body)
+
+        self.positions, self.tables, self.markers, self.latest_event = positions, tables, markers, latest_event
+
+    def close(self) -> None:
+        """
+        Writes the index and closes the file
+        """
+        if self.file.closed:
+            return
+        index = self.offset
+        self.file.write(_pack("Q", self.offsets))
+        self.file.write(_pack("Q", self.keys))
+        self.file.write(TRAILER.pack(index, len(self.offsets), END_MAGIC))
+        self.file.close()
+        mainlog.info("Recorded %s frames into %s", len(self.offsets), self.file.name)
+
+
+class Replay:
+    """
+    A recorded hunt, memory mapped for playback. replay[frame] returns the Replay_Frame of a frame.
+    Consecutive frames are decoded incrementally, any other frame from its keyframe.
+    """
+
+    def __init__(self, file: str):
+        """
+        Initializes the Replay class
+        :param file: path of the replay file
+        """
+        with open(file, "rb") as opened:
+            self.data = mmap.mmap(opened.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.data)
+
+        if bytes(self.view[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{file} is not a replay of a Santa hunt")
+        version, length = struct.unpack_from("<HI", self.view, len(MAGIC))
+        if version > REPLAY_VERSION:
+            raise ValueError(f"{file} has the replay format {version}, this version can read up to {REPLAY_VERSION}")
+        start = len(MAGIC) + 6
+        self.header = json.loads(bytes(self.view[start:start + length]).decode("utf-8"))
+        self.file = file
+        self.deers = self.header["deers"]
+        self.quantum = self.header["N"] / GRID
+
+        self.offsets, self.keys = self.read_index(start + length)
+        self.current: Replay_Frame = None
+        self.grid_positions: array = None  # quantized positions of the current frame
+
+    def __repr__(self):
+        return f"Replay of {len(self)} frames from {self.file}"
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, frame: int) -> Replay_Frame:
+        return self.seek(frame)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self) -> None:
+        """
+        Unmaps the file
+        """
+        self.view.release()
+        self.data.close()
+
+    def read_index(self, first: int) -> Tuple[array, array]:
+        """
+        Returns the offsets of the frames and the numbers of their keyframes, from the index at the end of the file
+        or, if the recording was interrupted, by scanning the frames
+        :param first: offset of the first frame
+        """
+        size = len(self.data)
+        if size >= first + TRAILER.size:
+            index, count, end = TRAILER.unpack_from(self.view, size - TRAILER.size)
+            if end == END_MAGIC:
+                offsets, after = _unpack("Q", self.view, index, count)
+                return offsets, _unpack("Q", self.view, after, count)[0]
+
+        offsets, keys = array("Q"), array("Q")
+        offset, key = first, 0
+        while offset + FRAME.size <= size:
+            length, kind = struct.unpack_from("<IB", self.view, offset)
+            if offset + length > size:
+                break  # the last frame was not written completely
+            if kind == KEYFRAME:
+                key = len(offsets)
+            offsets.append(offset)
+            keys.append(key)
+            offset += length
+        mainlog.warning("%s has no index, recovered %s frames", self.file, len(offsets))
+        return offsets, keys
+
+    def time(self, frame: int) -> float:
+        """
+        Returns the simulated time of a frame (without decoding it)
+        """
+        return FRAME.unpack_from(self.view, self.offsets[frame])[4]
+
+    def seek(self, frame: int) -> Replay_Frame:
+        """
+        Decodes a frame, in constant time (at most keyframe_interval frames are decoded)
+        :param frame: number of the frame, negative numbers count from the end
+        :return: the state of the hunt in this frame
+        """
+        if frame < 0:
+            frame += len(self)
+        if not 0 <= frame < len(self):
+            raise IndexError(f"Frame {frame} is not in the replay of {len(self)} frames")
+
+        current = self.current
+        if current is None or not (self.keys[current.index] == self.keys[frame] and current.index <= frame):
+            current = self.decode(self.keys[frame], None)  # start at the keyframe
+        while current.index < frame:
+            current = self.decode(current.index + 1, current)
+        self.current = current
+        return current
+
+    def decode(self, frame: int, previous: Optional[Replay_Frame]) -> Replay_Frame:
+        """
+        Decodes a frame
+        :param frame: number of the frame
+        :param previous: the frame before, None for a keyframe
+        """
+        view = self.view
+        offset = self.offsets[frame]
+        _, kind, state, parts, time = FRAME.unpack_from(view, offset)
+        offset += FRAME.size
+        deers, locations, kids = self.deers, len(self.header["locations"]), len(self.header["kids"])
+
+        if kind == KEYFRAME:
+            grid_positions, offset = _unpack("H", view, offset, 2 * deers)
+            grid_positions = array("l", grid_positions)
+            tables = []
+            for count in (deers, deers, locations, kids):
+                values, offset = _unpack("i", view, offset, count)
+                tables.append(values.tolist())
+            markers, latest_event = None, None
+        else:
+            differences, offset = _unpack("h", view, offset, 2 * deers)
+            grid_positions = array("l", map(sum, zip(self.grid_positions, differences)))
+            tables = [list(previous.flags), list(previous.toys), list(previous.amounts), list(previous.received)]
+            count, = struct.unpack_from("<I", view, offset)
+            changed_tables, offset = _unpack("B", view, offset + 4, count)
+            changed_indices, offset = _unpack("I", view, offset, count)
+            values, offset = _unpack("i", view, offset, count)
+            for table, index_, value in zip(changed_tables, changed_indices, values):
+                tables[table][index_] = value
+            markers, latest_event = previous.markers, previous.latest_event
+
+        if parts & MARKERS:
+            count, = struct.unpack_from("<I", view, offset)
+            marker_locations, offset = _unpack("i", view, offset + 4, count)
+            points, offset = _unpack("H", view, offset, 4 * count)
+            quantum = self.quantum
+            markers = [(location, (points[4 * i] * quantum, points[4 * i + 1] * quantum),
+                        (points[4 * i + 2] * quantum, points[4 * i + 3] * quantum))
+                       for i, location in enumerate(marker_locations)]
+        if parts & EVENT:
+            length, = struct.unpack_from("<I", view, offset)
+            latest_event = bytes(view[offset + 4:offset + 4 + length]).decode("utf-8")
+
+        self.grid_positions = grid_positions
+        quantum = self.quantum
+        positions = [(grid_positions[2 * i] * quantum, grid_positions[2 * i + 1] * quantum) for i in range(deers)]
+        return Replay_Frame(frame, time, state, positions, *tables, markers, latest_event)
@@ -0,0 +1,192 @@
+"""
+Planning of the distribution paths. This is a capacitated vehicle routing problem: every route starts and ends in
+Santa's house, visits at most capacity kids' houses and should not be longer than the distance a deer can fly within
+the time budget. The planners work on points (the houses) and return routes as lists of point indices.
+Author: Maximilian Janisch
+"""
+
+__all__ = ("plan_greedy", "plan_savings", "improve_route", "route_length", "plan_routes", "planners")
+
+from typing import *  # library for type hints
+
+from helper_functions import *
+from spatial_index import *
+
+Point = Tuple[float, float]
+
+
+def distance(p: Point, q: Point) -> float:
+    return euclidean_norm((p[0] - q[0], p[1] - q[1]))
+
+
+def route_length(route: Sequence[int], points: Sequence[Point], home: Point) -> float:
+    """
+    Returns the length of the round trip home -> points of route -> home
+    """
+    stops = [home] + [points[index] for index in route] + [home]
+    return sum(distance(stops[i], stops[i + 1]) for i in range(len(stops) - 1))
+
+
+def plan_greedy(points: Sequence[Point], home: Point, capacity: int = 3, max_length: float = 0) -> List[List[int]]:
+    """
+    Chains nearest neighbours (the original planner of the project): a route starts with the first point which is not
+    planned yet and continues with the point closest to its last point until it is full. Of equally close points the
+    one with the largest index is chosen, like the original scan did.
+    :param points: the kids' houses
+    :param home: Santa's house
+    :param capacity: maximal number of points per route
+    :param max_length: maximal length of a round trip (0: no limit), a route which would get longer is closed
+    :return: the routes (a single empty route if there are no points)
+    """
+    tree = KD_Tree(points)
+    routes: List[List[int]] = [[]]
+    first = 0  # first point (in the given order) which is not planned yet
+    length = 0.  # length of the round trip of the last route
+    for _ in range(len(points)):
+        route = routes[-1]
+        if len(route) == capacity:
+            routes.append([])
+            route = routes[-1]
+        elif route:
+            last = points[route[-1]]
+            index = tree.nearest_last(last)
+            detour = distance(last, points[index]) + distance(points[index], home) - distance(last, home)
+            if max_length and length + detour > max_length:
+                routes.append([])
+                route = routes[-1]
+            else:
+                length += detour
+
+        if not route:
+            while tree.removed[first]:
+                first += 1
+            index = first
+            length = 2 * distance(home, points[index])
+        route.append(index)
+        tree.remove(index)
+    return routes
+
+
+def plan_savings(points: Sequence[Point], home: Point, capacity: int = 3, max_length: float = 0,
+                 neighbours: int = 10) -> List[List[int]]:
+    """
+    Clarke-Wright savings: starts with one round trip per point and merges the two routes whose joining saves the
+    most distance, as long as capacity and max_length allow it. Only the pairs of neighbouring points (found with a
+    KD_Tree) are considered, so the construction takes O(n log n). Every route is improved with improve_route.
+    :param points: the kids' houses
+    :param home: Santa's house
+    :param capacity: maximal number of points per route
+    :param max_length: maximal length of a round trip (0: no limit)
+    :param neighbours: number of nearest neighbours of each point whose savings are considered
+    :return: the routes (a single empty route if there are no points, like plan_greedy)
+    """
+    if not points:
+        return [[]]
+    tree = KD_Tree(points)
+    to_home = [distance(home, point) for point in points]
+    pairs: Dict[Tuple[int, int], None] = {}
+    for i, point in enumerate(points):
+        for j in tree.nearest(point, neighbours + 1):
+            if j != i:
+                pairs[min(i, j), max(i, j)] = None
+    savings = sorted(((to_home[i] + to_home[j] - distance(points[i], points[j]), i, j) for i, j in pairs),
+                     reverse=True)
+
+    routes: Dict[int, List[int]] = {i: [i] for i in range(len(points))}
+    route_of = list(range(len(points)))
+    lengths = {i: 2 * to_home[i] for i in range(len(points))}
+    for saving, i, j in savings:
+        if saving <= 0:
+            break
+        a, b = route_of[i], route_of[j]
+        if a == b or len(routes[a]) + len(routes[b]) > capacity:
+            continue
+        first, second = routes[a], routes[b]
+        if i not in (first[0], first[-1]) or j not in (second[0], second[-1]):
+            continue  # only the ends of two routes can be joined
+        if max_length and lengths[a] + lengths[b] - saving > max_length:
+            continue
+        if first[-1] != i:
+            first.reverse()
+        if second[0] != j:
+            second.reverse()
+        first.extend(second)
+        for index in second:
+            route_of[index] = a
+        lengths[a] += lengths.pop(b) - saving
+        del routes[b]
+
+    return [improve_route(routes[key], points, home) for key in sorted(routes)]
+
+
+def improve_route(route: List[int], points: Sequence[Point], home: Point) -> List[int]:
+    """
+    Shortens the round trip of route with 2-opt (reversing a part of the route) and or-opt (moving one to three
+    consecutive points to another place of the route, possibly reversed) until neither finds an improvement
+    :return: the improved route (route itself is changed as well)
+    """
+    epsilon = 1e-9
+
+    def at(position: int) -> Point:
+        return home if position < 0 or position >= len(route) else points[route[position]]
+
+    improved = True
+    while improved:
+        improved = False
+
+        # 2-opt
+        for i in range(len(route) - 1):
+            for j in range(i + 1, len(route)):
+                change = distance(at(i - 1), at(j)) + distance(at(i), at(j + 1)) \
+                         - distance(at(i - 1), at(i)) - distance(at(j), at(j + 1))
+                if change < -epsilon:
+                    route[i:j + 1] = reversed(route[i:j + 1])
+                    improved = True
+
+        # or-opt
+        for size in (1, 2, 3):
+            i = 0
+            while i + size <= len(route):
+                segment = route[i:i + size]
+                start, end = points[segment[0]], points[segment[-1]]
+                gain = distance(at(i - 1), start) + distance(end, at(i + size)) - distance(at(i - 1), at(i + size))
+                rest = route[:i] + route[i + size:]
+                best = (epsilon, None, False)
+                for position in range(len(rest) + 1):
+                    if position == i:
+                        continue  # the current place of the segment
+                    before = home if position == 0 else points[rest[position - 1]]
+                    after = home if position == len(rest) else points[rest[position]]
+                    for reverse in (False, True):
+                        first, last = (end, start) if reverse else (start, end)
+                        saving = gain - (distance(before, first) + distance(last, after) - distance(before, after))
+                        if saving > best[0]:
+                            best = (saving, position, reverse)
+                if best[1] is not None:
+                    _, position, reverse = best
+                    route[:] = rest[:position] + (segment[::-1] if reverse else segment) + rest[position:]
+                    improved = True
+                i += 1
+    return route
+
+
+planners: Dict[str, Callable[..., List[List[int]]]] = {"greedy": plan_greedy, "savings": plan_savings}
+
+
+def plan_routes(points: Sequence[Point], home: Point, planner: str = "greedy", capacity: int = 3,
+                max_length: float = 0) -> List[List[int]]:
+    """
+    Plans the routes with one of the planners
+    :param points: the kids' houses
+    :param home: Santa's house
+    :param planner: "greedy" (nearest neighbours, the original behaviour) or "savings" (Clarke-Wright with 2-opt
+                    and or-opt, much shorter routes)
+    :param capacity: maximal number of points per route (the toys a deer can carry)
+    :param max_length: maximal length of a round trip (0: no limit)
+    :return: the routes as lists of indices of points (a single empty route if there are no points)
+    """
+    if planner not in planners:
+        raise ValueError(f"Unknown planner {planner}, use one of {list(planners)}")
+    if capacity < 1:
+        raise ValueError(f"The capacity of a route has to be at least 1, not {capacity}")
+    return planners[planner](points, home, capacity, max_length)
@@ -0,0 +1,174 @@
+"""
+Scent field: an alternative to the markers for the coordination of the deers. Deers which carry a resource home
+lay a trail of scent on a grid over the world, searching deers follow the trail away from Santa's house towards
+the resource. Once per tick the scent evaporates and diffuses (one vectorized update of the whole grid), so the
+cost of the coordination does not depend on the number of trails.
+NumPy is optional, the Scent_Field just can not be created without it.
+Author: Maximilian Janisch
+"""
+
+__all__ = ("Scent_Field",)
+
+from typing import *  # library for type hints
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is only needed for the scent coordination
+    np = None
+
+# offsets of the neighbouring cells, in the order in which they are compared
+NEIGHBOURS = tuple((di, dj) for di in (-1, 0, 1) for dj in (-1, 0, 1) if di or dj)
+
+
+class Scent_Field:
+    """
+    Grid of scent values over the N x N world. values[i, j] is the scent of the cell with the x index i and the
+    y index j. Deposits of a tick are collected separately and only become visible in commit (like the changes
+    of the markers, see Marker.commit), so the order in which the deers move does not matter.
+    """
+
+    def __init__(self, N: float, resolution: int, evaporation: float, diffusion: float, threshold: float,
+                 smoothness: int):
+        """
+        Initializes the Scent_Field class
+        :param N: edge of the world
+        :param resolution: number of cells per edge
+        :param evaporation: part of the scent which evaporates per second
+        :param diffusion: part of the scent of a cell which is exchanged with its neighbours per second
+        :param threshold: scent values up to threshold are not noticed by the deers
+        :param smoothness: ticks per second
+        """
+        if np is None:
+            raise ImportError("The scent coordination needs NumPy, install it or use coordination = 'markers'")
+
+        self.N = N
+        self.resolution = resolution
+        self.size = N / resolution  # edge of a cell
+        self.threshold = threshold
+        self.smoothness = smoothness
+        self.keep = (1 - evaporation) ** (1 / smoothness)  # part of the scent which is left after one tick
+        self.diffusion = min(diffusion / smoothness, 1)  # per tick, at most 1 for a stable update
+
+        self.values = np.zeros((resolution, resolution))
+        self.deposits = np.zeros((resolution, resolution))
+        self.offsets = np.array(NEIGHBOURS)
+        self.empty = True  # no scent was laid since the last clear, commit has nothing to do
+        # buffers of commit
+        self.padded = np.zeros((resolution + 2, resolution + 2))
+        self.neighbours = np.zeros((resolution, resolution))
+
+    def __repr__(self):
+        return f"Scent field of {self.resolution}x{self.resolution} cells | total scent {self.values.sum():.2f}"
+
+    def cell(self, position: Tuple[float, float]) -> Tuple[int, int]:
+        """
+        Returns the indices of the cell which contains position
+        """
+        return (min(max(int(position[0] / self.size), 0), self.resolution - 1),
+                min(max(int(position[1] / self.size), 0), self.resolution - 1))
+
+    def cells(self, positions: "np.ndarray") -> "np.ndarray":
+        """
+        Batched cell, one row per position
+        """
+        return np.clip((positions / self.size).astype(int), 0, self.resolution - 1)
+
+    def value(self, position: Tuple[float, float]) -> float:
+        """
+        Returns the scent at position
+        """
+        return float(self.values[self.cell(position)])
+
+    def deposit(self, position: Tuple[float, float]) -> None:
+        """
+        Lays the scent of one tick at position (visible after the next commit)
+        """
+        self.deposits[self.cell(position)] += 1 / self.smoothness
+        self.empty = False
+
+    def deposit_batch(self, positions: "np.ndarray") -> None:
+        """
+        Batched deposit, one row per position (in the order of the rows, like consecutive calls of deposit)
+        """
+        cells = self.cells(positions)
+        np.add.at(self.deposits, (cells[:, 0], cells[:, 1]), 1 / self.smoothness)
+        self.empty &= not len(positions)
+
+    def uphill(self, position: Tuple[float, float], home: Tuple[float, float]) -> Optional[Tuple[float, float]]:
+        """
+        Returns the center of the neighbouring cell with the most scent among the cells which are further away
+        from home than the cell of position, or None if none of them has more scent than the threshold
+        :param position: position of the deer
+        :param home: center of Santa's house
+        """
+        i, j = self.cell(position)
+        x, y = (i + 0.5) * self.size - home[0], (j + 0.5) * self.size - home[1]
+        own = x * x + y * y
+        best = self.threshold
+        target = None
+        for di, dj in NEIGHBOURS:
+            a, b = i + di, j + dj
+            if 0 <= a < self.resolution and 0 <= b < self.resolution:
+                value = float(self.values[a, b])
+                if value > best:
+                    center = ((a + 0.5) * self.size, (b + 0.5) * self.size)
+                    x, y = center[0] - home[0], center[1] - home[1]
+                    if x * x + y * y > own:
+                        best = value
+                        target = center
+        return target
+
+    def uphill_batch(self, positions: "np.ndarray", home: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray"]:
+        """
+        Batched uphill, one row per position
+        :param positions: positions of the deers
+        :param home: center of Santa's house (one row per position)
+        :return: mask of the positions with a target and the targets (one row per position, only valid in the mask)
+        """
+        cells = self.cells(positions)
+        neighbours = cells[:, None, :] + self.offsets[None, :, :]
+        inside = ((neighbours >= 0) & (neighbours < self.resolution)).all(axis=2)
+        clipped = np.clip(neighbours, 0, self.resolution - 1)
+        values = self.values[clipped[:, :, 0], clipped[:, :, 1]]
+
+        centers = (neighbours + 0.5) * self.size
+        own_center = (cells + 0.5) * self.size
+        x, y = own_center[:, 0] - home[:, 0], own_center[:, 1] - home[:, 1]
+        own = x * x + y * y
+        x, y = centers[:, :, 0] - home[:, None, 0], centers[:, :, 1] - home[:, None, 1]
+        further = x * x + y * y > own[:, None]
+
+        candidate = inside & further & (values > self.threshold)
+        best = np.argmax(np.where(candidate, values, -np.inf), axis=1)  # the first one of equal values
+        found = candidate.any(axis=1)
+        return found, centers[np.arange(len(positions)), best]
+
+    def commit(self) -> None:
+        """
+        Adds the deposits of the tick, then lets the scent evaporate and diffuse (the borders reflect the scent)
+        """
+        if self.empty:
+            return
+        values = self.values
+        values += self.deposits
+        self.deposits[:] = 0
+        values *= self.keep
+        if self.diffusion:
+            padded, neighbours = self.padded, self.neighbours
+            padded[1:-1, 1:-1] = values
+            padded[0, 1:-1], padded[-1, 1:-1] = values[0], values[-1]
+            padded[1:-1, 0], padded[1:-1, -1] = values[:, 0], values[:, -1]
+            np.add(padded[:-2, 1:-1], padded[2:, 1:-1], out=neighbours)
+            neighbours += padded[1:-1, :-2]
+            neighbours += padded[1:-1, 2:]
+            neighbours *= self.diffusion / 4
+            values *= 1 - self.diffusion
+            values += neighbours
+
+    def clear(self) -> None:
+        """
+        Removes all scent
+        """
+        self.values[:] = 0
+        self.deposits[:] = 0
+        self.empty = True
@@ -0,0 +1,426 @@
+"""
+Snapshots of a running hunt: the complete state of a World and its Engine (deers, markers, locations, kids, toys,
+paths, scent, pseudo-random streams, time and state) in a compact, versioned binary file. Hunts can be resumed
+after an interruption, or many variants can be branched off from one expensive collection phase.
+
+Layout of a file (all numbers little endian):
+    magic b"SANTASNP" | format version (uint16) | zlib compressed body
+    body: number of tables (uint32), then for every table its name and number of columns (uint32),
+          then for every column its name, type code (1 byte), number of values (uint64), number of bytes (uint64)
+          and the values as one packed array (type codes of the array module, "s" for utf-8 strings)
+Names are stored as uint16 length + utf-8. The snapshot does not contain the static parts of the world (names,
+houses, toy types, ...): they are generated again from the config file, overrides and seed, which are stored.
+Readers ignore unknown tables and columns, so newer versions can add data without breaking older files.
+Author: Maximilian Janisch
+"""
+
+__all__ = ("FORMAT_VERSION", "dump_snapshot", "restore_snapshot", "save_snapshot", "load_snapshot")
+
+import ast
+import struct
+import sys
+import zlib
+from array import array
+from math import *
+from typing import *  # library for type hints
+
+from distribution_classes import *
+from domain import *
+from engine import *
+from event_engine import *
+from geometry import *
+from global_variables import *
+from logs import *
+from spatial_index import *
+from tables import *
+
+MAGIC = b"SANTASNP"
+FORMAT_VERSION = 1
+
+Column = Tuple[str, Sequence]  # (type code, values)
+Tables = Dict[str, Dict[str, Column]]
+
+engine_classes = {"Engine": Engine, "Event_Engine": Event_Engine, "Domain_Engine": Domain_Engine}
+
+
+# region binary format
+def _pack_name(out: bytearray, name: str) -> None:
+    data = name.encode("utf-8")
+    out += struct.pack("<H", len(data))
+    out += data
+
+
+def _unpack_name(data: memoryview, offset: int) -> Tuple[str, int]:
+    length, = struct.unpack_from("<H", data, offset)
+    offset += 2
+    return bytes(data[offset:offset + length]).decode("utf-8"), offset + length
+
+
+def _pack_values(typecode: str, values: Sequence) -> bytes:
+    """
+    Returns the values of a column as one little endian block
+    """
+    if typecode == "s":
+        encoded = [value.encode("utf-8") for value in values]
+        return _pack_values("q", [len(value) for value in encoded]) + b"".join(encoded)
+    packed = array(typecode, values)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _unpack_values(typecode: str, count: int, data: memoryview) -> list:
+    """
+    Inverse of _pack_values
+    """
+    if typecode == "s":
+        lengths = _unpack_values("q", count, data[:8 * count])
+        result, offset = [], 8 * count
+        for length in lengths:
+            result.append(bytes(data[offset:offset + length]).decode("utf-8"))
+            offset += length
+        return result
+    values = array(typecode)
+    values.frombytes(bytes(data))
+    if sys.byteorder == "big":
+        values.byteswap()
+    if len(values) != count:
+        raise ValueError(f"Corrupt snapshot: expected {count} values, found {len(values)}")
+    return values.tolist()
+
+
+def encode(tables: Tables) -> bytes:
+    """
+    Encodes tables of columns into the snapshot format
+    """
+    body = bytearray(struct.pack("<I", len(tables)))
+    for table, columns in tables.items():
+        _pack_name(body, table)
+        body += struct.pack("<I", len(columns))
+        for column, (typecode, values) in columns.items():
+            data = _pack_values(typecode, values)
+            _pack_name(body, column)
+            body += typecode.encode("ascii")
+            body += struct.pack("<QQ", len(values), len(data))
+            body += data
+    return MAGIC + struct.pack("<H", FORMAT_VERSION) + zlib.compress(bytes(body))
+
+
+def decode(data: bytes) -> Dict[str, Dict[str, list]]:
+    """
+    Decodes a snapshot into tables of columns (lists of values)
+    """
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a snapshot of a hunt")
+    version, = struct.unpack_from("<H", data, len(MAGIC))
+    if version > FORMAT_VERSION:
+        raise ValueError(f"The snapshot has format version {version}, this version can only read up to "
+                         f"{FORMAT_VERSION}")
+    body = memoryview(zlib.decompress(data[len(MAGIC) + 2:]))
+
+    tables: Dict[str, Dict[str, list]] = {}
+    count, = struct.unpack_from("<I", body, 0)
+    offset = 4
+    for _ in range(count):
+        table, offset = _unpack_name(body, offset)
+        columns, = struct.unpack_from("<I", body, offset)
+        offset += 4
+        tables[table] = {}
+        for _ in range(columns):
+            column, offset = _unpack_name(body, offset)
+            typecode = chr(body[offset])
+            values, length = struct.unpack_from("<QQ", body, offset + 1)
+            offset += 17
+            tables[table][column] = _unpack_values(typecode, values, body[offset:offset + length])
+            offset += length
+    return tables
+# endregion
+
+
+def _optional(value: Optional[float]) -> float:
+    return nan if value is None else value
+
+
+def _from_optional(value: float) -> Optional[float]:
+    return None if isnan(value) else value
+
+
+def _points(points: Iterable[Tuple[float, float]]) -> List[float]:
+    return [coordinate for point in points for coordinate in point]
+
+
+def _pairs(values: Sequence[float]) -> List[Tuple[float, float]]:
+    return [(values[i], values[i + 1]) for i in range(0, len(values), 2)]
+
+
+def _split(values: Sequence, lengths: Sequence[int]) -> List[list]:
+    result, offset = [], 0
+    for length in lengths:
+        result.append(values[offset:offset + length])
+        offset += length
+    return result
+
+
+def dump_snapshot(engine: Engine) -> bytes:
+    """
+    Returns the snapshot of a hunt between two ticks
+    :param engine: engine of the hunt (its world is saved as well)
+    """
+    world = engine.world
+    if world.markers.changed:
+        raise ValueError("Snapshots can only be taken between two ticks (there are uncommitted markers)")
+    if isinstance(engine, Event_Engine):
+        engine.sync()  # the parked deers are stored where they are, the restored engine starts without parking
+    if isinstance(engine, Domain_Engine):
+        engine.gather()  # the random streams of the deers which the workers move
+
+    # the removed locations are still referenced by markers which lead to them
+    registered = list(world.markers)
+    markers = list(registered)
+    marker_index = {marker: index for index, marker in enumerate(markers)}
+    for deer in world.deers:
+        if deer.marker is not None and deer.marker not in marker_index:
+            marker_index[deer.marker] = len(markers)
+            markers.append(deer.marker)
+    locations = list(world.locations)
+    location_index = {location: index for index, location in enumerate(locations)}
+    for marker in markers:
+        if marker.location is not None and marker.location not in location_index:
+            location_index[marker.location] = len(locations)
+            locations.append(marker.location)
+    path_index = {path: index for index, path in enumerate(world.distribution_paths)}
+    kid_index = {row: index for index, row in enumerate(world.kids)}
+    toy_index = {toy: index for index, toy in enumerate(world.toys)}
+    toy_type_index = {id(toy_type): index for index, toy_type in enumerate(world.toy_types)}
+
+    streams = {"world": world.random_streams.world, "production": world.random_streams.production}
+    streams.update((f"deer {index}", stream) for index, stream in sorted(world.random_streams.deers.items()))
+    states = [stream.getstate() for stream in streams.values()]
+
+    tables: Tables = {
+        "meta": {"config": ("s", [world.config_file]), "overrides": ("s", [repr(world.overrides)]),
+                 "seed": ("q", [world.seed]), "T": ("d", [world.T])},
+        "engine": {"class": ("s", [type(engine).__name__]), "backend": ("s", [engine.backend]),
+                   "iter": ("d", [engine.iter_]), "state": ("q", [engine.state_.value]),
+                   "collection_time": ("d", [_optional(engine.collection_time)]),
+                   "tick": ("q", [getattr(engine, "tick", 0)])},
+        "world": {"D": ("q", [world.D]), "T_dist": ("d", [world.T_dist]),
+                  "gui_time": ("d", [world.gui_time]), "latest_event": ("s", [world.latest_event]),
+                  "planned_makespan": ("d", [_optional(world.planned_makespan)]),
+                  "happy_kids": ("q", world.happy_kids_list),
+                  "emptied": ("s", world.resources_with_emptied_locations)},
+        "tally": {"emptied_resources": ("s", sorted(world.tally.emptied_resources)),
+                  "loaded_deers": ("q", [world.tally.loaded_deers]),
+                  "inactive_deers": ("q", [world.tally.inactive_deers]),
+                  "finished_paths": ("q", [world.tally.finished_paths]),
+                  "farthest_steps": ("q", [-1 if world.tally.farthest_steps is None
+                                           else world.tally.farthest_steps])},
+        "streams": {"name": ("s", list(streams)), "version": ("q", [state[0] for state in states]),
+                    "internal": ("I", [word for state in states for word in state[1]]),
+                    "gauss_next": ("d", [_optional(state[2]) for state in states])},
+        "resources": {"collected": ("q", [resource.collected for resource in world.resources])},
+        "locations": {"resource": ("q", [location.resource.index for location in locations]),
+                      "center": ("d", _points(location.center for location in locations)),
+                      "radius": ("d", [location.radius for location in locations]),
+                      "amount": ("q", [location.amount for location in locations]),
+                      "alive": ("b", [index < len(world.locations) for index in range(len(locations))])},
+        "markers": {"location": ("q", [location_index.get(marker.location, -1) for marker in markers]),
+                    "endpoint": ("d", _points(marker.endpoint for marker in markers)),
+                    "startpoint": ("d", _points(marker.startpoint for marker in markers)),
+                    "direction": ("d", _points(marker.direction for marker in markers)),
+                    "is_complete": ("b", [marker.is_complete for marker in markers]),
+                    "is_erasing": ("b", [marker.is_erasing for marker in markers]),
+                    "registered": ("b", [index < len(registered) for index in range(len(markers))]),
+                    "homebound": ("q", [marker_index[marker] for marker in world.markers.valid()])},
+        "deers": {"position": ("d", _points(deer.position for deer in world.deers)),
+                  "old_position": ("d", _points(deer.old_position for deer in world.deers)),
+                  "random_target": ("d", _points(deer.random_target or (nan, nan) for deer in world.deers)),
+                  "loaded": ("q", [deer.loaded for deer in world.deers]),
+                  "inactive": ("q", [int(deer.inactive) for deer in world.deers]),
+                  "resource": ("q", [deer.resource.index if deer.resource else -1 for deer in world.deers]),
+                  "marker": ("q", [marker_index[deer.marker] if deer.marker is not None else -1
+                                   for deer in world.deers]),
+                  "path": ("q", [path_index[deer.path] if deer.path is not None else -1 for deer in world.deers]),
+                  "is_painting_marker": ("b", [deer.is_painting_marker for deer in world.deers]),
+                  "is_erasing_marker": ("b", [deer.is_erasing_marker for deer in world.deers]),
+                  "is_scenting": ("b", [deer.is_scenting for deer in world.deers]),
+                  "is_distributing": ("b", [deer.is_distributing for deer in world.deers]),
+                  "distr_log_length": ("q", [len(deer.distr_log) for deer in world.deers]),
+                  "distr_log": ("d", _points(point for deer in world.deers for point in deer.distr_log))},
+        "toys": {"toy_type": ("q", [toy_type_index[id(toy.toy_type)] for toy in world.toys])},
+        "kids": {"received": ("b", [world.kid_table.received[row] for row in world.kids]),
+                 "toy": ("q", [toy_index[world.kid_table.toy[row]] if world.kid_table.toy[row] is not None else -1
+                               for row in world.kids])},
+        "paths": {"length": ("q", [len(path.kids) for path in world.distribution_paths]),
+                  "kids": ("q", [kid_index[row] for path in world.distribution_paths for row in path.kids]),
+                  "picked": ("b", [path.picked_by_deer for path in world.distribution_paths]),
+                  "cursor": ("q", [path.cursor for path in world.distribution_paths])},
+    }
+    if world.scent is not None:
+        tables["scent"] = {"values": ("d", world.scent.values.ravel().tolist()),
+                           "deposits": ("d", world.scent.deposits.ravel().tolist()),
+                           "empty": ("b", [world.scent.empty])}
+    return encode(tables)
+
+
+def _read_overrides(text: str) -> Dict[str, Any]:
+    """
+    Parses the overrides stored in a snapshot. Only literals are accepted, so loading a snapshot never runs code
+    :param text: repr of the overrides of the saved world
+    :return: the overrides
+    """
+    try:
+        overrides = ast.literal_eval(text)
+    except (ValueError, SyntaxError) as error:
+        raise ValueError(f"Corrupt snapshot: the overrides are not a literal ({error})") from None
+    if not isinstance(overrides, dict) or not all(isinstance(key, str) for key in overrides):
+        raise ValueError(f"Corrupt snapshot: the overrides are not a dict of settings: {text!r}")
+    return overrides
+
+
+def restore_snapshot(data: bytes, overrides: Dict[str, Any] = None, engine_class: type = None,
+                     backend: str = None) -> Engine:
+    """
+    Restores a hunt from a snapshot
+    :param data: the snapshot (see dump_snapshot)
+    :param overrides: additional overrides of the config file, e.g. another planner for a branch of the hunt
+                      (values which change the generation of the world can not be changed)
+    :param engine_class: class of the new engine (default: the class of the saved engine)
+    :param backend: backend of the new engine (default: the backend of the saved engine)
+    :return: a new engine whose world is in the saved state
+    """
+    tables = decode(data)
+    meta, saved = tables["meta"], tables["engine"]
+    world = World(meta["config"][0], dict(_read_overrides(meta["overrides"][0]), **(overrides or {})), meta["seed"][0])
+
+    columns = tables["world"]
+    if world.D != columns["D"][0] or world.T != meta["T"][0] or len(world.kids) != len(tables["kids"]["received"]) \
+            or len(world.resources) != len(tables["resources"]["collected"]):
+        raise ValueError("The world of the snapshot can not be generated again (did the config file or an "
+                         "override of the generation change?)")
+    world.T_dist, world.gui_time = columns["T_dist"][0], columns["gui_time"][0]
+    world.latest_event = columns["latest_event"][0]
+    world.happy_kids_list = columns["happy_kids"]
+    world.resources_with_emptied_locations = columns["emptied"]
+
+    columns = tables["tally"]
+    world.tally.emptied_resources = set(columns["emptied_resources"])
+    world.tally.loaded_deers = columns["loaded_deers"][0]
+    world.tally.inactive_deers = columns["inactive_deers"][0]
+    world.tally.finished_paths = columns["finished_paths"][0]
+    world.tally.farthest_steps = None if columns["farthest_steps"][0] < 0 else columns["farthest_steps"][0]
+
+    columns = tables["streams"]
+    words = _split(columns["internal"], [len(columns["internal"]) // len(columns["name"])] * len(columns["name"]))
+    for name, version, internal, gauss_next in zip(columns["name"], columns["version"], words,
+                                                   columns["gauss_next"]):
+        kind, _, index = name.partition(" ")
+        stream = world.random_streams.deer(int(index)) if kind == "deer" else getattr(world.random_streams, kind)
+        stream.setstate((version, tuple(internal), _from_optional(gauss_next)))
+
+    for resource, collected in zip(world.resources, tables["resources"]["collected"]):
+        resource.collected = collected
+
+    columns = tables["locations"]
+    locations = []
+    for resource, center, radius, amount in zip(columns["resource"], _pairs(columns["center"]), columns["radius"],
+                                                columns["amount"]):
+        location = Location(world.resources[resource], center, radius)
+        location.amount = amount
+        locations.append(location)
+    world.locations = [location for location, alive in zip(locations, columns["alive"]) if alive]
+    world.location_grid = Location_Grid(2 * world.max_radius, world.locations)
+
+    columns = tables["markers"]
+    markers = []
+    for location, endpoint, startpoint, direction, is_complete, is_erasing in zip(
+            columns["location"], _pairs(columns["endpoint"]), _pairs(columns["startpoint"]),
+            _pairs(columns["direction"]), columns["is_complete"], columns["is_erasing"]):
+        marker = Marker.__new__(Marker)  # disabled markers have no location, so Marker.__init__ can not be used
+        for attribute, value in dict(location=locations[location] if location >= 0 else None, endpoint=endpoint,
+                                     startpoint=startpoint, direction=direction, is_complete=bool(is_complete),
+                                     is_erasing=bool(is_erasing), pending={}, registry=None).items():
+            setattr(marker, attribute, value)
+        markers.append(marker)
+    world.markers.clear()
+    for marker, registered in zip(markers, columns["registered"]):
+        if registered:
+            world.markers.add(marker)
+    world.markers.set_homebound([markers[index] for index in columns["homebound"]])
+
+    world.toys = []
+    for toy_type in tables["toys"]["toy_type"]:
+        toy = Toy.__new__(Toy)  # the resources were already used when the toy was produced
+        toy.toy_type = world.toy_types[toy_type]
+        world.toys.append(toy)
+
+    columns = tables["kids"]
+    for row, received, toy in zip(world.kids, columns["received"], columns["toy"]):
+        world.kid_table.received[row] = received
+        world.kid_table.toy[row] = world.toys[toy] if toy >= 0 else None
+
+    columns = tables["paths"]
+    world.distribution_paths = []
+    for kids, picked, cursor in zip(_split(columns["kids"], columns["length"]), columns["picked"],
+                                    columns["cursor"]):
+        path = Kid_Path(world.kid_table, [world.kids[kid] for kid in kids])
+        path.picked_by_deer, path.cursor = bool(picked), cursor
+        world.distribution_paths.append(path)
+    if world.distribution_paths and world.scheduler == "lpt":
+        world.path_pool = Path_Scheduler(world.distribution_paths, world.santa_house.center, world.dx)
+    else:
+        world.path_pool = Path_Pool(world.distribution_paths)
+    world.planned_makespan = _from_optional(tables["world"]["planned_makespan"][0])
+
+    columns = tables["deers"]
+    distr_logs = _split(_pairs(columns["distr_log"]), columns["distr_log_length"])
+    for i, deer in enumerate(world.deers):
+        deer.position = tuple(columns["position"][2 * i:2 * i + 2])
+        deer.old_position = tuple(columns["old_position"][2 * i:2 * i + 2])
+        target = tuple(columns["random_target"][2 * i:2 * i + 2])
+        deer.random_target = None if isnan(target[0]) else target
+        deer.loaded, deer.inactive = columns["loaded"][i], columns["inactive"][i]
+        deer.resource = world.resources[columns["resource"][i]] if columns["resource"][i] >= 0 else None
+        deer.marker = markers[columns["marker"][i]] if columns["marker"][i] >= 0 else None
+        deer.path = world.distribution_paths[columns["path"][i]] if columns["path"][i] >= 0 else None
+        deer.is_painting_marker = bool(columns["is_painting_marker"][i])
+        deer.is_erasing_marker = bool(columns["is_erasing_marker"][i])
+        deer.is_scenting = bool(columns["is_scenting"][i])
+        deer.is_distributing = bool(columns["is_distributing"][i])
+        deer.distr_log = distr_logs[i]
+
+    if world.scent is not None and "scent" in tables:
+        columns = tables["scent"]
+        world.scent.values.ravel()[:] = columns["values"]
+        world.scent.deposits.ravel()[:] = columns["deposits"]
+        world.scent.empty = bool(columns["empty"][0])
+
+    engine_class = engine_class or engine_classes.get(saved["class"][0], Engine)
+    engine = engine_class(world, backend=backend or saved["backend"][0])
+    engine.iter_ = saved["iter"][0]
+    engine.state_ = Process_State(saved["state"][0])
+    engine.collection_time = _from_optional(saved["collection_time"][0])
+    if isinstance(engine, Event_Engine):
+        engine.tick = saved["tick"][0]
+    return engine
+
+
+def save_snapshot(engine: Engine, file: str) -> None:
+    """
+    Writes the snapshot of a hunt between two ticks into file
+    """
+    data = dump_snapshot(engine)
+    with open(file, "wb") as snapshot:
+        snapshot.write(data)
+    enginelog.info("Saved a snapshot of %s (%s bytes) to %s", engine, len(data), file)
+
+
+def load_snapshot(file: str, overrides: Dict[str, Any] = None, engine_class: type = None,
+                  backend: str = None) -> Engine:
+    """
+    Restores a hunt from the snapshot in file (see restore_snapshot)
+    """
+    with open(file, "rb") as snapshot:
+        engine = restore_snapshot(snapshot.read(), overrides, engine_class, backend)
+    enginelog.info("Loaded a snapshot of %s from %s", engine, file)
+    return engine
@@ -0,0 +1,395 @@
+"""
+Spatial indices which keep the hit tests of the deers from checking every object of the world.
+Author: Maximilian Janisch
+"""
+
+__all__ = ("Location_Grid", "Marker_Grid", "Placement_Grid", "KD_Tree", "segment_cells")
+
+import heapq
+from math import *
+from typing import *  # library for type hints
+
+from geometry import *
+from helper_functions import *
+
+
+def segment_cells(start: Tuple[float, float], end: Tuple[float, float], size: float) -> List[Tuple[int, int]]:
+    """
+    Returns (a slight superset of) the cells of a uniform grid which the segment (start -> end) passes through
+    :param start: first point of the segment
+    :param end: second point of the segment
+    :param size: edge length of the cells
+    """
+    (x0, y0), (x1, y1) = sorted((start, end))
+    epsilon = 1e-9 * size  # rounding must never lose a cell
+    result = []
+    for column in range(floor(x0 / size), floor(x1 / size) + 1):
+        # part of the segment inside this column
+        if x1 == x0:
+            ya, yb = y0, y1
+        else:
+            xa, xb = max(x0, column * size), min(x1, (column + 1) * size)
+            ya = y0 + (y1 - y0) * (xa - x0) / (x1 - x0)
+            yb = y0 + (y1 - y0) * (xb - x0) / (x1 - x0)
+        for row in range(floor((min(ya, yb) - epsilon) / size), floor((max(ya, yb) + epsilon) / size) + 1):
+            result.append((column, row))
+    return result
+
+
+class Location_Grid:
+    """
+    Uniform grid over the resource locations. Every location is stored in all cells which its bounding box
+    touches, so a point only has to be tested against the locations in its own cell.
+    """
+    def __init__(self, cell_size: float, locations: Iterable[Location] = ()):
+        """
+        Initializes the Location_Grid class
+        :param cell_size: edge length of a cell (e.g. the maximal diameter of a location)
+        :param locations: locations to add right away
+        """
+        self.cell_size = cell_size
+        self.cells: Dict[Tuple[int, int], List[Location]] = {}
+        self.covered: Dict[Location, List[Tuple[int, int]]] = {}  # cells in which each location is stored
+        self.order: Dict[Location, int] = {}  # insertion order, hits are reported in this order
+        self.counter = 0
+
+        for location in locations:
+            self.add(location)
+
+    def __repr__(self):
+        return f"Location_Grid with {len(self.order)} locations in {len(self.cells)} cells of size {self.cell_size}"
+
+    def __len__(self):
+        return len(self.order)
+
+    def __contains__(self, location: Location) -> bool:
+        return location in self.order
+
+    def cell(self, point: Tuple[float, float]) -> Tuple[int, int]:
+        """
+        Returns the cell which contains point
+        """
+        return floor(point[0] / self.cell_size), floor(point[1] / self.cell_size)
+
+    def cells_of(self, location: Location) -> List[Tuple[int, int]]:
+        """
+        Returns all cells which the bounding box of location touches
+        """
+        left, bottom = self.cell((location.center[0] - location.radius, location.center[1] - location.radius))
+        right, top = self.cell((location.center[0] + location.radius, location.center[1] + location.radius))
+        return [(x, y) for x in range(left, right + 1) for y in range(bottom, top + 1)]
+
+    def add(self, location: Location) -> None:
+        """
+        Adds location to the grid
+        """
+        self.order[location] = self.counter
+        self.counter += 1
+        self.covered[location] = self.cells_of(location)
+        for cell in self.covered[location]:
+            self.cells.setdefault(cell, []).append(location)
+
+    def remove(self, location: Location) -> None:
+        """
+        Removes location from the grid (e.g. after it was depleted)
+        """
+        for cell in self.covered.pop(location):
+            self.cells[cell].remove(location)
+            if not self.cells[cell]:
+                del self.cells[cell]
+        del self.order[location]
+
+    def update(self, location: Location) -> None:
+        """
+        Has to be called after the radius of location shrank, drops the cells which it does not touch anymore
+        """
+        remaining = self.cells_of(location)
+        for cell in set(self.covered[location]).difference(remaining):
+            self.cells[cell].remove(location)
+            if not self.cells[cell]:
+                del self.cells[cell]
+        self.covered[location] = remaining
+
+    def query(self, point: Tuple[float, float]) -> List[Location]:
+        """
+        Returns the locations which might contain point (in insertion order)
+        """
+        candidates = self.cells.get(self.cell(point), [])
+        if len(candidates) > 1:
+            candidates = sorted(candidates, key=self.order.__getitem__)
+        return candidates
+
+    def along(self, start: Tuple[float, float], end: Tuple[float, float]) -> List[Location]:
+        """
+        Returns the locations which might contain a point of the segment (start -> end), in insertion order
+        """
+        candidates = set()
+        for cell in segment_cells(start, end, self.cell_size):
+            candidates.update(self.cells.get(cell, ()))
+        return sorted(candidates, key=self.order.__getitem__)
+
+    def hit(self, point: Tuple[float, float]) -> Optional[Location]:
+        """
+        Returns the first location (in insertion order) which contains point and is not empty, else None
+        """
+        for location in self.query(point):
+            if location.point_in_circle(point) and location.amount > 0:
+                return location
+        return None
+
+
+class Marker_Grid:
+    """
+    Uniform grid over the marker segments. Every marker is stored in the cells which its segment passes through,
+    so a deer only tests the markers near its own movement.
+    """
+    def __init__(self, cell_size: float):
+        """
+        Initializes the Marker_Grid class
+        :param cell_size: edge length of a cell (should be bigger than the distance a deer moves per tick)
+        """
+        self.cell_size = cell_size
+        self.cells: Dict[Tuple[int, int], Set[Marker]] = {}
+        self.covered: Dict[Marker, List[Tuple[int, int]]] = {}  # cells in which each marker is stored
+        self.order: Dict[Marker, int] = {}  # insertion order, hits are reported in this order
+        self.counter = 0
+
+    def __repr__(self):
+        return f"Marker_Grid with {len(self.order)} markers in {len(self.cells)} cells of size {self.cell_size}"
+
+    def __len__(self):
+        return len(self.order)
+
+    def __contains__(self, marker: Marker) -> bool:
+        return marker in self.order
+
+    def cells_of(self, start: Tuple[float, float], end: Tuple[float, float]) -> List[Tuple[int, int]]:
+        """
+        Returns (a slight superset of) the cells which the segment (start -> end) passes through
+        """
+        return segment_cells(start, end, self.cell_size)
+
+    def add(self, marker: Marker) -> None:
+        """
+        Adds marker to the grid
+        """
+        self.order[marker] = self.counter
+        self.counter += 1
+        self.covered[marker] = []
+        self.update(marker)
+
+    def remove(self, marker: Marker) -> None:
+        """
+        Removes marker from the grid
+        """
+        for cell in self.covered.pop(marker):
+            self.cells[cell].discard(marker)
+            if not self.cells[cell]:
+                del self.cells[cell]
+        del self.order[marker]
+
+    def update(self, marker: Marker) -> None:
+        """
+        Has to be called after the segment of marker changed (see Marker.commit)
+        """
+        old_cells = set(self.covered[marker])
+        new_cells = self.cells_of(marker.startpoint, marker.endpoint)
+        for cell in old_cells.difference(new_cells):
+            self.cells[cell].discard(marker)
+            if not self.cells[cell]:
+                del self.cells[cell]
+        for cell in new_cells:
+            self.cells.setdefault(cell, set()).add(marker)
+        self.covered[marker] = new_cells
+
+    def clear(self) -> None:
+        """
+        Removes all markers
+        """
+        self.cells.clear()
+        self.covered.clear()
+        self.order.clear()
+
+    def query(self, start: Tuple[float, float], end: Tuple[float, float]) -> List[Marker]:
+        """
+        Returns the markers which might intersect the segment (start -> end), in insertion order
+        """
+        left, bottom = floor(min(start[0], end[0]) / self.cell_size), floor(min(start[1], end[1]) / self.cell_size)
+        right, top = floor(max(start[0], end[0]) / self.cell_size), floor(max(start[1], end[1]) / self.cell_size)
+        candidates = set()
+        for column in range(left, right + 1):
+            for row in range(bottom, top + 1):
+                candidates.update(self.cells.get((column, row), ()))
+        return sorted(candidates, key=self.order.__getitem__)
+
+    def hit(self, start: Tuple[float, float], end: Tuple[float, float]) -> Optional[Marker]:
+        """
+        Returns the first marker (in insertion order) which the segment (start -> end) touches, else None
+        """
+        for marker in self.query(start, end):
+            if marker.line_touch(start, end):
+                return marker
+        return None
+
+
+class Placement_Grid:
+    """
+    Uniform grid over the bounding boxes of the objects which were already placed while generating a world
+    (locations and houses), so a new candidate only has to be tested against its neighbours.
+    """
+    def __init__(self, cell_size: float):
+        """
+        Initializes the Placement_Grid class
+        :param cell_size: edge length of a cell (e.g. the diameter of the biggest object)
+        """
+        self.cell_size = cell_size
+        self.cells: Dict[Tuple[int, int], List[Any]] = {}
+        self.counter = 0
+
+    def __repr__(self):
+        return f"Placement_Grid with {self.counter} objects in {len(self.cells)} cells of size {self.cell_size}"
+
+    def __len__(self):
+        return self.counter
+
+    def cells_of(self, center: Tuple[float, float], extent: float) -> List[Tuple[int, int]]:
+        """
+        Returns all cells which the box with the given center and half edge length touches
+        """
+        left, bottom = floor((center[0] - extent) / self.cell_size), floor((center[1] - extent) / self.cell_size)
+        right, top = floor((center[0] + extent) / self.cell_size), floor((center[1] + extent) / self.cell_size)
+        return [(x, y) for x in range(left, right + 1) for y in range(bottom, top + 1)]
+
+    def add(self, shape: Any, extent: float) -> None:
+        """
+        Adds shape (a Circle or a Square with center) whose bounding box has the half edge length extent
+        """
+        self.counter += 1
+        for cell in self.cells_of(shape.center, extent):
+            self.cells.setdefault(cell, []).append(shape)
+
+    def near(self, center: Tuple[float, float], extent: float) -> List[Any]:
+        """
+        Returns the shapes whose bounding boxes might touch the box with the given center and half edge length
+        """
+        result = {}  # insertion ordered set
+        for cell in self.cells_of(center, extent):
+            for shape in self.cells.get(cell, ()):
+                result[shape] = None
+        return list(result)
+
+
+class KD_Tree:
+    """
+    Static 2-d tree over points (built once in O(n log n)). Points can be removed, which keeps nearest neighbour
+    queries over the remaining points fast (e.g. for planning routes through the kids' houses).
+    """
+    def __init__(self, points: Sequence[Tuple[float, float]]):
+        """
+        Initializes the KD_Tree class
+        :param points: the points, they are referred to by their index
+        """
+        self.points = list(points)
+        self.order: List[int] = list(range(len(self.points)))  # the node of a subtree range is its middle
+        self.axis: List[int] = [0] * len(self.points)
+        self.alive: List[int] = [0] * len(self.points)  # remaining points in the subtree of each node
+        self.removed: List[bool] = [False] * len(self.points)
+        self._build(0, len(self.points), 0)
+        self.position: List[int] = [0] * len(self.points)  # node of every point
+        for node, index in enumerate(self.order):
+            self.position[index] = node
+
+    def __repr__(self):
+        return f"KD_Tree with {len(self)} of {len(self.points)} points"
+
+    def __len__(self):
+        return self.alive[len(self.points) // 2] if self.points else 0
+
+    def _build(self, low: int, high: int, depth: int) -> None:
+        """
+        Builds the subtree of the nodes low ... high - 1
+        """
+        if low >= high:
+            return
+        axis = depth % 2
+        self.order[low:high] = sorted(self.order[low:high], key=lambda index: self.points[index][axis])
+        middle = (low + high) // 2
+        self.axis[middle] = axis
+        self.alive[middle] = high - low
+        self._build(low, middle, depth + 1)
+        self._build(middle + 1, high, depth + 1)
+
+    def remove(self, index: int) -> None:
+        """
+        Removes the point with the given index in O(log n)
+        """
+        if self.removed[index]:
+            return
+        self.removed[index] = True
+        node, low, high = self.position[index], 0, len(self.points)
+        while True:
+            middle = (low + high) // 2
+            self.alive[middle] -= 1
+            if node == middle:
+                return
+            if node < middle:
+                high = middle
+            else:
+                low = middle + 1
+
+    def nearest(self, point: Tuple[float, float], count: int = 1) -> List[int]:
+        """
+        Returns the indices of the count remaining points which are closest to point (closest first)
+        """
+        best: List[Tuple[float, int]] = []  # max-heap of (-squared distance, index)
+        stack = [(0, len(self.points), 0.)]  # subtrees with the squared distance to their half plane
+        while stack:
+            low, high, bound = stack.pop()
+            if low >= high or (len(best) == count and bound >= -best[0][0]):
+                continue
+            middle = (low + high) // 2
+            if not self.alive[middle]:
+                continue
+            index = self.order[middle]
+            candidate = self.points[index]
+            if not self.removed[index]:
+                x, y = candidate[0] - point[0], candidate[1] - point[1]
+                distance = x * x + y * y
+                if len(best) < count:
+                    heapq.heappush(best, (-distance, index))
+                elif distance < -best[0][0]:
+                    heapq.heapreplace(best, (-distance, index))
+            axis = self.axis[middle]
+            offset = point[axis] - candidate[axis]
+            near, far = ((low, middle), (middle + 1, high)) if offset < 0 else ((middle + 1, high), (low, middle))
+            stack.append((*far, max(bound, offset * offset)))  # the other side might contain closer points
+            stack.append((*near, bound))  # visited first
+        return [index for _, index in sorted(best, reverse=True)]
+
+    def nearest_last(self, point: Tuple[float, float]) -> Optional[int]:
+        """
+        Returns the index of the remaining point closest to point, comparing the distances like euclidean_norm does.
+        Of equally close points the one with the largest index is returned, like a scan over the points in the order
+        of their indices which keeps a candidate if its distance is <= the best one.
+        """
+        best_distance, best = inf, None
+        stack = [(0, len(self.points), 0.)]  # subtrees with the squared distance to their half plane
+        while stack:
+            low, high, bound = stack.pop()
+            if low >= high or sqrt(bound) > best_distance:  # equally close points still have to be visited
+                continue
+            middle = (low + high) // 2
+            if not self.alive[middle]:
+                continue
+            index = self.order[middle]
+            candidate = self.points[index]
+            if not self.removed[index]:
+                distance = euclidean_norm((candidate[0] - point[0], candidate[1] - point[1]))
+                if distance < best_distance or (distance == best_distance and index > best):
+                    best_distance, best = distance, index
+            axis = self.axis[middle]
+            offset = point[axis] - candidate[axis]
+            near, far = ((low, middle), (middle + 1, high)) if offset < 0 else ((middle + 1, high), (low, middle))
+            stack.append((*far, max(bound, offset * offset)))  # the other side might contain closer points
+            stack.append((*near, bound))  # visited first
+        return best
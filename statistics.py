@@ -7,6 +7,7 @@ Collects data and writes output to a file
 __all__ = ("Statistics",)
 
 import csv
+import os
 import time
 from typing import *
 
@@ -93,10 +94,11 @@ class Statistics:
     """
     Class to handle statistics for the ressource hunt
     """
-    def __init__(self, my_world: World):
+    def __init__(self, my_world: World, filename: str = None):
         """
         Initializes statistics class and opens output file.
         :param my_world: the world we collect data from
+        :param filename: path of the output file, by default a timestamped file in the working directory
         """
         self.world = my_world
         self.deers = []
@@ -104,7 +106,9 @@ class Statistics:
         self.time = 0
 
         # initialize output file        
-        filename = time.strftime("%Y-%m-%d_%H-%M-%S_Hunt_Stats.csv")
+        if filename is None:
+            # the process id keeps runs that start in the same second from overwriting each other
+            filename = time.strftime("%Y-%m-%d_%H-%M-%S") + f"_{os.getpid()}_Hunt_Stats.csv"
         self.file = open(filename, mode="w")
         self.writer = csv.writer(self.file, delimiter=";", lineterminator="\n")
 
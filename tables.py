@@ -0,0 +1,306 @@
+"""
+Array-backed tables for the entities of which a world has very many: the kids and their houses. Every column is
+an array of the array module (or a list for Python objects). The World keeps only the row indices of its kids
+(world.kids) and houses (world.kids_houses), and a Kid_Path holds the rows of its kids and reads the columns in the
+hot loops of the deers. Thus a million kids need neither a million objects nor a million center tuples. Where the
+API of House and Kid is needed (e.g. in the GUI), the rows are accessed through small proxies with __slots__. The
+batch predicates of the House_Table test a whole table at once (vectorized if NumPy is installed, see the batch
+predicates of geometry.py).
+Author: Maximilian Janisch
+"""
+
+__all__ = ("Table", "House_Table", "House_Row", "Kid_Table", "Kid_Row", "Kid_Path")
+
+import random
+from array import array
+from typing import *  # library for type hints
+
+try:
+    import numpy as np
+except ImportError:  # the batch predicates loop in Python without NumPy
+    np = None
+
+from distribution_classes import *
+from geometry import *
+from helper_functions import *
+
+
+def _column(name: str, convert: type = None) -> property:
+    """
+    Property for the value of a proxy in the column name of its table
+    :param name: name of the column
+    :param convert: type of the value if the column stores it differently (e.g. bool in a column of bytes)
+    """
+    def fget(self):
+        value = getattr(self.table, name)[self.row]
+        return convert(value) if convert else value
+
+    def fset(self, value):
+        getattr(self.table, name)[self.row] = value
+
+    return property(fget, fset)
+
+
+class Table:
+    """
+    Columns of equal length. columns maps the name of every column to the type code of its array
+    ("o" for a list of Python objects), the columns are attributes of the table.
+    """
+    columns: Dict[str, str] = {}
+
+    def __init__(self):
+        """
+        Initializes an empty table
+        """
+        for name, typecode in self.columns.items():
+            setattr(self, name, [] if typecode == "o" else array(typecode))
+        self.length = 0
+
+    def __repr__(self):
+        return f"{type(self).__name__} with {self.length} rows"
+
+    def __len__(self):
+        return self.length
+
+    def append(self, *values) -> int:
+        """
+        Appends a row
+        :param values: one value per column, in the order of columns
+        :return: index of the row
+        """
+        for name, value in zip(self.columns, values):
+            getattr(self, name).append(value)
+        self.length += 1
+        return self.length - 1
+
+    def vector(self, name: str) -> "np.ndarray":
+        """
+        Returns a column as a NumPy array (a copy, the arrays of the table have to stay resizable)
+        """
+        column = getattr(self, name)
+        if isinstance(column, list):
+            return np.array(column, dtype=object)
+        return np.frombuffer(column, dtype=column.typecode).copy()
+
+
+class House_Row:
+    """
+    A row of a House_Table with the API of House (the houses do not move, so center and size are read-only)
+    """
+    __slots__ = ("table", "row")
+
+    def __init__(self, table: "House_Table", row: int):
+        self.table = table
+        self.row = row
+
+    @property
+    def center(self) -> Tuple[float, float]:
+        return self.table.x[self.row], self.table.y[self.row]
+
+    @property
+    def size(self) -> float:
+        return self.table.size[self.row]
+
+    left_boundary = Square.left_boundary
+    right_boundary = Square.right_boundary
+    top_boundary = Square.top_boundary
+    bottom_boundary = Square.bottom_boundary
+    __repr__ = Square.__repr__
+    point_in_square = Square.point_in_square
+    overlap_square = Square.overlap_square
+
+
+class House_Table(Table):
+    """
+    Table of houses (centers and edge lengths)
+    """
+    columns = {"x": "d", "y": "d", "size": "d"}
+
+    def __getitem__(self, row: int) -> House_Row:
+        if not 0 <= row < self.length:
+            raise IndexError(f"{self} has no row {row}")
+        return House_Row(self, row)
+
+    def __iter__(self) -> Iterator[House_Row]:
+        return (House_Row(self, row) for row in range(self.length))
+
+    def add(self, center: Tuple[float, float], size: float) -> House_Row:
+        """
+        Appends a house
+        :param center: center of the house
+        :param size: edge length of the house
+        :return: the new house
+        """
+        return House_Row(self, self.append(center[0], center[1], size))
+
+    def centers(self) -> "np.ndarray":
+        """
+        Returns the centers of all houses as a NumPy array of shape (rows, 2)
+        """
+        return np.column_stack((self.vector("x"), self.vector("y")))
+
+    def containing(self, point: Tuple[float, float]) -> List[int]:
+        """
+        Batched House.point_in_square: returns the rows of the houses which contain point
+        """
+        if np is None:
+            return [row for row in range(self.length)
+                    if max_norm((point[0] - self.x[row], point[1] - self.y[row])) <= self.size[row] / 2]
+        return points_in_squares([point], self.centers(), self.vector("size"))[1].tolist()
+
+    def overlapping_square(self, square: Square) -> List[int]:
+        """
+        Batched House.overlap_square: returns the rows of the houses which overlap square
+        """
+        (x, y), size = square.center, square.size
+        if np is None:
+            return [row for row in range(self.length)
+                    if max_norm((self.x[row] - x, self.y[row] - y)) <= (self.size[row] + size) / 2]
+        return squares_overlap_squares(self.centers(), self.vector("size"), [square.center], [size])[0].tolist()
+
+    def overlapping_circle(self, circle: Circle) -> List[int]:
+        """
+        Batched Circle.overlap_square: returns the rows of the houses which circle overlaps
+        """
+        if np is None:
+            return [row for row in range(self.length) if circle.overlap_square(House_Row(self, row))]
+        return circles_overlap_squares([circle.center], [circle.radius], self.centers(),
+                                       self.vector("size"))[1].tolist()
+
+
+class Kid_Row:
+    """
+    A row of a Kid_Table with the API of Kid
+    """
+    __slots__ = ("table", "row")
+
+    def __init__(self, table: "Kid_Table", row: int):
+        self.table = table
+        self.row = row
+
+    kid_grade = _column("kid_grade")
+    name = _column("name")
+    received = _column("received", bool)
+    index = _column("index")
+    toy = _column("toy")
+
+    @property
+    def house(self) -> House_Row:
+        return House_Row(self.table.houses, self.table.house[self.row])
+
+    __repr__ = Kid.__repr__
+    __int__ = Kid.__int__
+    __eq__ = Kid.__eq__
+    __lt__ = Kid.__lt__
+    __gt__ = Kid.__gt__
+    __ne__ = Kid.__ne__
+    __le__ = Kid.__le__
+    __ge__ = Kid.__ge__
+    assign_toy = Kid.assign_toy
+    give_toy = Kid.give_toy
+    got_toy = Kid.got_toy
+
+
+class Kid_Table(Table):
+    """
+    Table of kids, their houses are rows of a House_Table
+    """
+    columns = {"kid_grade": "b", "name": "o", "house": "q", "received": "B", "index": "q", "toy": "o"}
+
+    def __init__(self, houses: House_Table):
+        """
+        Initializes the Kid_Table class
+        :param houses: the table of the houses of the kids
+        """
+        super().__init__()
+        self.houses = houses
+
+    def __getitem__(self, row: int) -> Kid_Row:
+        if not 0 <= row < self.length:
+            raise IndexError(f"{self} has no row {row}")
+        return Kid_Row(self, row)
+
+    def rows(self, indices: Iterable[int]) -> Iterator[Kid_Row]:
+        """
+        Returns the proxies of the rows indices (one after the other, e.g. for the GUI)
+        """
+        return (Kid_Row(self, row) for row in indices)
+
+    def add(self, index: int, name: str, house: int, rng: random.Random = random) -> int:
+        """
+        Appends a kid, draws the same numbers from rng as Kid.__init__
+        :param index: numbering of the kids
+        :param name: name of the kid
+        :param house: the row of the house the kid lives in (in self.houses)
+        :param rng: pseudo-random stream to draw from
+        :return: the row of the new kid
+        """
+        if not 0 <= house < len(self.houses):
+            raise ValueError(f"{self.houses} has no row {house}")
+        return self.append(rng.randint(1, 6), name, house, False, index, None)
+
+
+class Kid_Path(Distribution_Path):
+    """
+    Distribution_Path through rows of a Kid_Table: kids holds the rows of the kids, and the queries of the deers read
+    the columns of the tables directly (without proxies or center tuples of the houses)
+    """
+
+    def __init__(self, table: Kid_Table, kids: Iterable[int]):
+        """
+        Initializes the Kid_Path class
+        :param table: the table of the kids
+        :param kids: the rows of the kids in the order of the path
+        """
+        super().__init__(array("q", kids))
+        self.table = table
+
+    def __repr__(self):
+        return f"Path with {self.left_to_distribute()} toys left to distribute to the kids in rows {list(self.kids)}"
+
+    def get_kids(self, start: int = 0, stop: int = None) -> List[Kid_Row]:
+        return list(self.table.rows(self.kids[start:stop]))
+
+    def advance(self) -> None:
+        received, kids = self.table.received, self.kids
+        while self.cursor < len(kids) and received[kids[self.cursor]]:
+            self.cursor += 1
+
+    def next_row(self) -> int:
+        """
+        Returns the row of the next kid without toy
+        """
+        self.advance()
+        if self.cursor == len(self.kids):
+            raise IndexError("Kid_Path.next_row, no more unhappy kids:-)")
+        return self.kids[self.cursor]
+
+    def get_next_kid(self) -> Kid_Row:
+        return Kid_Row(self.table, self.next_row())
+
+    def first_center(self) -> Tuple[float, float]:
+        houses = self.table.houses
+        house = self.table.house[self.kids[0]]
+        return houses.x[house], houses.y[house]
+
+    def next_center(self) -> Tuple[float, float]:
+        houses = self.table.houses
+        house = self.table.house[self.next_row()]
+        return houses.x[house], houses.y[house]
+
+    def next_house_contains(self, point: Tuple[float, float]) -> bool:
+        houses = self.table.houses
+        house = self.table.house[self.next_row()]
+        return max_norm((point[0] - houses.x[house], point[1] - houses.y[house])) <= houses.size[house] / 2
+
+    def length(self, home: Tuple[float, float]) -> float:
+        houses, house = self.table.houses, self.table.house
+        stops = [home] + [(houses.x[house[row]], houses.y[house[row]]) for row in self.kids] + [home]
+        return sum(euclidean_norm((stops[i + 1][0] - stops[i][0], stops[i + 1][1] - stops[i][1]))
+                   for i in range(len(stops) - 1))
+
+    def deliver(self) -> Kid_Row:
+        row = self.next_row()
+        self.table.received[row] = True
+        self.cursor += 1
+        return Kid_Row(self.table, row)
@@ -0,0 +1,30 @@
+"""
+Aggregates of a world which are kept up to date as the events happen, so the engine can check in O(1) whether
+a phase is over.
+Author: Maximilian Janisch
+"""
+
+__all__ = ("Tally",)
+
+from typing import *  # library for type hints
+
+
+class Tally:
+    """
+    Counters of a world. The deers update them when they load, deposit, rest, stop resting or finish a path,
+    the engine when a deer picks up a resource or a resource location is depleted.
+    """
+    def __init__(self):
+        """
+        Initializes the Tally class
+        """
+        self.emptied_resources: Set[str] = set()  # names of the resources with at least one depleted location
+        self.loaded_deers = 0  # deers which carry a positive amount of a resource
+        self.inactive_deers = 0  # deers which rest in Santa's house
+        self.finished_paths = 0  # distribution paths on which every kid received its toy
+        self.pickups = 0  # resources picked up from the locations (the GUI redraws the locations when it changes)
+        self.farthest_steps: Optional[int] = None  # upper bound for the steps of the farthest deer to get home
+
+    def __repr__(self):
+        return f"Tally with {len(self.emptied_resources)} emptied resources | {self.loaded_deers} loaded deers " \
+               f"| {self.inactive_deers} inactive deers | {self.finished_paths} finished paths"